@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Compares loading rows with an execute loop and with copy_in against a local
+Postgres::
+
+    python benchmarks/bench_copy.py --database test_hermes --rows 100000
+"""
+from argparse import ArgumentParser
+from timeit import default_timer
+import sys
+
+from hermes.connectors import PostgresConnector
+
+
+_TABLE = 'hermes_bench_copy'
+
+
+def rows(count):
+    for i in xrange(count):
+        yield i, 'document {}'.format(i), i * 0.5
+
+
+def execute_loop(connector, count):
+    cursor = connector.pg_cursor
+    for row in rows(count):
+        cursor.execute(
+            'INSERT INTO {} VALUES (%s, %s, %s);'.format(_TABLE), row
+        )
+
+
+def copy_in(connector, count):
+    connector.copy_in(_TABLE, rows(count))
+
+
+def copy_out(connector, count):
+    for _ in connector.copy_out('SELECT * FROM {}'.format(_TABLE)):
+        pass
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', default='test_hermes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--rows', type=int, default=20000)
+    options = parser.parse_args(argv)
+
+    connector = PostgresConnector(
+        {'database': options.database, 'host': options.host}
+    )
+    cursor = connector.pg_cursor
+    try:
+        for method in (execute_loop, copy_in, copy_out):
+            if method is not copy_out:
+                cursor.execute('DROP TABLE IF EXISTS {};'.format(_TABLE))
+                cursor.execute(
+                    'CREATE TABLE {} (id int, name text, score float);'
+                    .format(_TABLE)
+                )
+            started = default_timer()
+            method(connector, options.rows)
+            elapsed = default_timer() - started
+            sys.stdout.write('{:<14} {:>8.3f}s {:>10.0f} rows/s\n'.format(
+                method.__name__, elapsed, options.rows / elapsed
+            ))
+    finally:
+        cursor.execute('DROP TABLE IF EXISTS {};'.format(_TABLE))
+        connector.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Compares fetching rows through DictCursor and CompactCursor against a local
+Postgres::
+
+    python benchmarks/bench_rows.py --database test_hermes --rows 1000000
+"""
+from argparse import ArgumentParser
+from contextlib import closing
+from timeit import default_timer
+import gc
+import sys
+
+from psycopg2.extras import DictCursor
+
+from hermes.connectors import PostgresConnector
+from hermes.cursors import CompactCursor
+
+
+_QUERY = (
+    'SELECT i AS id, md5(i::text) AS name, i * 2 AS score, now() AS updated '
+    'FROM generate_series(1, %s) AS i;'
+)
+
+
+def fetch(connector, cursor_factory, rows):
+    """
+    :return: A tuple of (seconds taken to fetch and read every row, the
+        approximate size in bytes of the fetched row objects).
+    """
+    gc.collect()
+    with closing(connector.pg_connection.cursor(
+            cursor_factory=cursor_factory)) as cursor:
+        started = default_timer()
+        cursor.execute(_QUERY, (rows, ))
+        result = cursor.fetchall()
+        for row in result:
+            row['name']
+        elapsed = default_timer() - started
+        size = sum(sys.getsizeof(row) for row in result)
+    return elapsed, size
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', default='test_hermes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args(argv)
+
+    connector = PostgresConnector(
+        {'database': options.database, 'host': options.host}
+    )
+    try:
+        for cursor_factory in (DictCursor, CompactCursor):
+            results = [fetch(connector, cursor_factory, options.rows)
+                       for _ in xrange(options.repeat)]
+            elapsed, size = min(results)
+            sys.stdout.write(
+                '{:<14} {:>8.3f}s {:>10.0f} rows/s {:>8.1f} MiB\n'.format(
+                    cursor_factory.__name__, elapsed,
+                    options.rows / elapsed, size / 1048576.0
+                )
+            )
+    finally:
+        connector.disconnect()
+
+
+if __name__ == '__main__':
+    main()
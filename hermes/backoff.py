@@ -0,0 +1,135 @@
+"""
+Backoff policies deciding how long to wait before retrying after a failure.
+"""
+from random import uniform
+from time import sleep, time
+
+from hermes.exceptions import InvalidConfigurationException
+
+
+# The longest single sleep before checking whether to stop waiting
+_SLEEP_SLICE = 0.5
+
+
+def interruptible_sleep(seconds, interrupted=None):
+    """
+    Sleeps in short slices so a stop signal does not have to wait out a
+    long backoff.
+
+    :param seconds: The number of seconds to sleep for.
+    :param interrupted: A function returning True once the sleep should
+        end early. If None, the sleep is never cut short.
+    :return: True if the full time was slept, False if interrupted.
+    """
+    deadline = time() + seconds
+    while True:
+        if interrupted is not None and interrupted():
+            return False
+        remaining = deadline - time()
+        if remaining <= 0:
+            return True
+        sleep(min(remaining, _SLEEP_SLICE))
+
+
+class AbstractBackoff(object):
+    """
+    Abstract backoff policy. A policy is told of each failure through
+    :func:`~failed`, which returns the number of seconds to wait before the
+    next attempt, and of recovery through :func:`~reset`.
+    """
+
+    def __init__(self, base=1, limit=16, reset_after=60):
+        """
+        :param base: The number of seconds to wait after the first failure.
+        :param limit: The maximum number of seconds to wait.
+        :param reset_after: The number of seconds without a failure after
+            which the policy starts from ``base`` again, as though it had
+            been reset. If None, only :func:`~reset` does so.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            ``base`` is not positive or ``limit`` is less than ``base``.
+        """
+        if base <= 0:
+            raise InvalidConfigurationException(
+                "The base delay must be positive"
+            )
+        if limit < base:
+            raise InvalidConfigurationException(
+                "The delay limit must not be less than the base delay"
+            )
+        self.base = base
+        self.limit = limit
+        self.reset_after = reset_after
+
+        self.attempts = 0
+        self.delay = None
+        self._failed_at = None
+
+    def next_delay(self):
+        """
+        An abstract method that must be overridden by subclasses.
+
+        :return: The number of seconds to wait after failure number
+            :attr:`attempts`. :attr:`delay` holds the previous wait, or None
+            after the first failure.
+        """
+        raise NotImplementedError("Subclasses MUST override the "
+                                  "'next_delay' method")
+
+    def failed(self):
+        """
+        Records a failure.
+
+        :return: The number of seconds to wait before the next attempt.
+        """
+        now = time()
+        if (self.reset_after is not None and self._failed_at is not None and
+                now - self._failed_at >= self.reset_after):
+            self.reset()
+
+        self.attempts += 1
+        self.delay = self.next_delay()
+        # Measured from the end of the wait, so time spent retrying counts
+        # as time without a failure
+        self._failed_at = now + self.delay
+        return self.delay
+
+    def reset(self):
+        """
+        Records a success, so the next failure waits ``base`` seconds again.
+        """
+        self.attempts = 0
+        self.delay = None
+        self._failed_at = None
+
+    def wait(self, interrupted=None):
+        """
+        Records a failure and waits before the next attempt.
+
+        :param interrupted: See :func:`~interruptible_sleep`.
+        :return: True if the full time was waited, False if interrupted.
+        """
+        return interruptible_sleep(self.failed(), interrupted)
+
+
+class ExponentialBackoff(AbstractBackoff):
+    """
+    Doubles the wait after each consecutive failure, up to ``limit``
+    seconds.
+    """
+
+    def next_delay(self):
+        return min(self.base * 2 ** (self.attempts - 1), self.limit)
+
+
+class DecorrelatedJitterBackoff(AbstractBackoff):
+    """
+    Waits a random time between ``base`` and three times the previous wait,
+    up to ``limit`` seconds. The wait still grows with consecutive failures,
+    but processes which failed together, such as when Postgres restarts,
+    spread their retries out instead of reconnecting in lockstep.
+    """
+
+    def next_delay(self):
+        previous = self.delay if self.delay is not None else self.base
+        return min(uniform(self.base, previous * 3), self.limit)
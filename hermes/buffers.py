@@ -0,0 +1,154 @@
+"""
+Buffers which hold back writes so repeated updates are written once.
+"""
+from collections import OrderedDict
+from time import time
+
+from hermes.exceptions import InvalidConfigurationException
+from hermes.triggers import DeadlineTrigger
+
+
+class WriteBehindBuffer(object):
+    """
+    Folds successive updates to the same key into one, and writes only the
+    merged state of each key when the buffer is flushed. A document changed
+    fifty times within a flush window is then written once.
+
+    The buffer flushes itself once it holds ``max_keys`` keys, which bounds
+    its memory, and, when scheduled on a Component, once its oldest update
+    is ``max_age`` seconds old.
+    """
+
+    def __init__(self, write, merge=None, max_keys=1000, max_age=1):
+        """
+        Buffering a processor's writes is done like so::
+
+            class Processor(Component):
+                def __init__(self, *args, **kwargs):
+                    super(Processor, self).__init__(*args, **kwargs)
+                    self.buffer = WriteBehindBuffer(self.index_documents)
+                    self.buffer.schedule(self)
+
+                def execute(self, pre_exec_value):
+                    for document in self.changed_documents():
+                        self.buffer.put(document['id'], document)
+
+                def index_documents(self, entries):
+                    ...
+
+        :param write: A function called with the list of ``(key, value)``
+            pairs to write, in the order each key was first updated.
+        :param merge: A function called with a key's buffered value and an
+            update to it, returning the merged value. If None, the last
+            update wins.
+        :param max_keys: The number of buffered keys which will cause
+            :func:`~flush` to be called automatically.
+        :param max_age: The number of seconds an update may be buffered for
+            once the buffer is scheduled. If None, age is not considered.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            ``max_keys`` is less than one.
+        """
+        if max_keys < 1:
+            raise InvalidConfigurationException(
+                "A buffer must hold at least one key"
+            )
+        self._write = write
+        self._merge = merge
+        self._max_keys = max_keys
+        self._max_age = max_age
+        self._entries = OrderedDict()
+        self._buffered_since = None
+
+        self.updates = 0
+        self.writes = 0
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        """
+        :return: A dictionary of buffer statistics. ``merge_ratio`` is the
+            number of updates received per value written.
+        """
+        return {
+            'keys': len(self._entries),
+            'updates': self.updates,
+            'writes': self.writes,
+            'flushes': self.flushes,
+            'merge_ratio': (
+                float(self.updates) / self.writes if self.writes else 0.0
+            ),
+        }
+
+    def schedule(self, component):
+        """
+        Schedules the buffer to flush from the Component's loop once its
+        oldest update is ``max_age`` seconds old.
+
+        :param component: A :class:`~hermes.components.Component` object,
+            which has not been started yet.
+        """
+        if self._max_age is not None:
+            component.schedule(DeadlineTrigger(self._flush_deadline),
+                               self.flush_expired)
+
+    def put(self, key, value):
+        """
+        Buffers an update, merging it into any buffered value for the key
+        and flushing the buffer if it is full.
+
+        :param key: The key, such as a primary key, the update applies to.
+        :param value: The updated value.
+        """
+        self.updates += 1
+        if key in self._entries:
+            if self._merge is not None:
+                value = self._merge(self._entries[key], value)
+            self._entries[key] = value
+            return
+
+        if not self._entries:
+            self._buffered_since = time()
+        self._entries[key] = value
+        if len(self._entries) >= self._max_keys:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the merged value of every buffered key. If the write raises,
+        the entries stay buffered.
+
+        :return: The number of values written.
+        """
+        if not self._entries:
+            return 0
+
+        entries = self._entries.items()
+        self._write(entries)
+
+        self._entries = OrderedDict()
+        self._buffered_since = None
+        self.writes += len(entries)
+        self.flushes += 1
+        return len(entries)
+
+    def flush_expired(self):
+        """
+        Flushes the buffer if its oldest update is ``max_age`` seconds old.
+
+        :return: The number of values written.
+        """
+        if (self._buffered_since is not None and
+                time() - self._buffered_since >= self._max_age):
+            return self.flush()
+        return 0
+
+    def _flush_deadline(self, now):
+        """
+        :return: The time the oldest update reaches ``max_age``, or
+            ``max_age`` from now if the buffer is empty.
+        """
+        return (self._buffered_since or now) + self._max_age
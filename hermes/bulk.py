@@ -0,0 +1,229 @@
+"""
+Streaming encoders and decoders for Postgres' COPY text format, used by
+:func:`~hermes.connectors.PostgresConnector.copy_in` and
+:func:`~hermes.connectors.PostgresConnector.copy_out`.
+"""
+from datetime import date, time
+from decimal import Decimal
+from Queue import Queue
+from threading import Thread
+from uuid import UUID
+import math
+import re
+
+
+_NULL = '\\N'
+_ESCAPES = {
+    '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r',
+    '\b': '\\b', '\f': '\\f', '\v': '\\v',
+}
+_UNESCAPES = dict((escaped[1], char) for char, escaped in _ESCAPES.items())
+_ESCAPE_RE = re.compile(r'[\\\t\n\r\b\f\v]')
+_UNESCAPE_RE = re.compile(r'\\(.)')
+_ARRAY_ESCAPE_RE = re.compile(r'["\\]')
+# Values whose str() is already a literal Postgres reads back unchanged
+_LITERAL_TYPES = (int, long, Decimal, date, time, UUID)
+_DONE = object()
+
+
+def encode_value(value):
+    """
+    :return: A value as a field of a COPY text format row. Lists and tuples
+        are encoded as Postgres arrays.
+    :raises: TypeError if the value's type has no COPY text encoding.
+    """
+    if value is None:
+        return _NULL
+    return _ESCAPE_RE.sub(lambda match: _ESCAPES[match.group()],
+                          _encode_literal(value))
+
+
+def _encode_literal(value):
+    """
+    :return: A non-NULL value as the literal Postgres reads, before COPY
+        escaping.
+    """
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float):
+        return _encode_float(value)
+    if isinstance(value, (list, tuple)):
+        return _encode_array(value)
+    if isinstance(value, _LITERAL_TYPES):
+        return str(value)
+    raise TypeError(
+        'Cannot encode a value of type {} for COPY'.format(
+            type(value).__name__
+        )
+    )
+
+
+def _encode_float(value):
+    # str() rounds to 12 significant digits; repr() round-trips
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    return repr(value)
+
+
+def _encode_array(values):
+    """
+    :return: A sequence as a Postgres array literal. Nested sequences
+        become nested arrays.
+    """
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append('NULL')
+        elif isinstance(value, (list, tuple)):
+            elements.append(_encode_array(value))
+        else:
+            elements.append('"{}"'.format(_ARRAY_ESCAPE_RE.sub(
+                lambda match: '\\' + match.group(), _encode_literal(value)
+            )))
+    return '{' + ','.join(elements) + '}'
+
+
+def encode_row(row):
+    """
+    :return: A sequence of values as a COPY text format line.
+    """
+    return '\t'.join([encode_value(value) for value in row]) + '\n'
+
+
+def decode_value(field):
+    """
+    :return: A field of a COPY text format row as a string, or None if it
+        is NULL.
+    """
+    if field == _NULL:
+        return None
+    if '\\' not in field:
+        return field
+    return _UNESCAPE_RE.sub(
+        lambda match: _UNESCAPES.get(match.group(1), match.group(1)), field
+    )
+
+
+def decode_row(line):
+    """
+    :return: A COPY text format line, without its newline, as a list of
+        strings and Nones.
+    """
+    return [decode_value(field) for field in line.split('\t')]
+
+
+class CopyInStream(object):
+    """
+    A file-like object which encodes rows as they are read, so a COPY FROM
+    never holds more than a single read's worth of encoded rows.
+    """
+
+    def __init__(self, rows):
+        """
+        :param rows: An iterable of row sequences.
+        """
+        self._rows = iter(rows)
+        self._buffer = ''
+        self.rows_read = 0
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        for row in self._rows:
+            line = encode_row(row)
+            chunks.append(line)
+            length += len(line)
+            self.rows_read += 1
+            if 0 <= size <= length:
+                break
+
+        data = ''.join(chunks)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+class CopyOutStream(object):
+    """
+    An iterator over chunks of rows written by a COPY TO STDOUT, which runs
+    in a background thread. At most ``max_pending`` writes are held in
+    memory; the COPY waits while the consumer catches up.
+    """
+
+    def __init__(self, cursor, sql, chunk_size=1000, max_pending=64):
+        """
+        :param cursor: The cursor to run the COPY with.
+        :param sql: A ``COPY ... TO STDOUT`` statement.
+        :param chunk_size: The number of rows per yielded chunk.
+        :param max_pending: The number of writes to buffer.
+        """
+        self._cursor = cursor
+        self._sql = sql
+        self._chunk_size = chunk_size
+        self._queue = Queue(max_pending)
+        self._closed = False
+        self._done = False
+        self._error = None
+        self._thread = Thread(target=self._copy, name='hermes-copy-out')
+        self._thread.daemon = True
+
+    def write(self, data):
+        if not self._closed:
+            self._queue.put(data)
+
+    def _copy(self):
+        try:
+            self._cursor.copy_expert(self._sql, self)
+        except Exception as e:
+            if not self._closed:
+                self._error = e
+        finally:
+            self._queue.put(_DONE)
+
+    def __iter__(self):
+        self._thread.start()
+        try:
+            chunk, pending = [], ''
+            data = self._queue.get()
+            while data is not _DONE:
+                lines = (pending + data).split('\n')
+                pending = lines.pop()
+                chunk.extend(decode_row(line) for line in lines)
+                while len(chunk) >= self._chunk_size:
+                    yield chunk[:self._chunk_size]
+                    chunk = chunk[self._chunk_size:]
+                data = self._queue.get()
+            self._done = True
+
+            if self._error is not None:
+                raise self._error
+            if chunk:
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stops buffering writes and waits for the COPY to finish. The rest of
+        its output is discarded.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.ident is None:
+            return
+        if not self._done:
+            self._cursor.connection.cancel()
+            while self._queue.get() is not _DONE:
+                pass
+        self._thread.join()
@@ -0,0 +1,209 @@
+from collections import OrderedDict
+from time import time
+import sys
+
+from psycopg2 import InterfaceError, OperationalError
+
+from hermes.connectors import PostgresConnector
+
+
+#: An invalidation payload which empties the whole cache.
+INVALIDATE_ALL = '*'
+
+
+class QueryCache(object):
+    """
+    An in-process cache of query results, kept coherent across processes
+    by invalidation notifications. Entries are evicted when they are older
+    than ``ttl`` seconds and, least recently used first, when there are more
+    than ``max_entries`` of them.
+
+    Results can be tagged when they are fetched. A notification on the
+    cache's channel invalidates every result with its payload as a tag, or
+    the whole cache if the payload is empty or ``*``. A trigger such as the
+    following keeps results tagged with a table name fresh::
+
+        CREATE FUNCTION invalidate_cache() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('query_cache', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER invalidate_cache
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON languages
+            FOR EACH STATEMENT EXECUTE PROCEDURE invalidate_cache();
+    """
+
+    def __init__(self, pg_connector, channel=None, ttl=300,
+                 max_entries=1024):
+        """
+        Caching the results of a query is done like so::
+
+            cache = QueryCache(pg_connector, channel='query_cache')
+
+            languages = cache.fetchall(
+                'SELECT * FROM languages WHERE code = %s;', ('en', ),
+                tags=('languages', )
+            )
+
+        Returned rows are shared between callers and must not be modified.
+
+        :param pg_connector: The :class:`~hermes.connectors.PostgresConnector`
+            to run queries with.
+        :param channel: The channel to listen for invalidations on. A
+            separate connection is opened to listen with. If None, entries
+            only expire.
+        :param ttl: The number of seconds an entry is valid for.
+        :param max_entries: The maximum number of cached results.
+        """
+        self.pg_connector = pg_connector
+        self.channel = channel
+
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._listen_connector = None
+        self._listening = False
+        if channel:
+            self._listen_connector = PostgresConnector(pg_connector.dsn)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.memory_bytes = 0
+
+    @property
+    def stats(self):
+        """
+        :return: A dictionary of cache statistics. ``memory_bytes`` is an
+            estimate of the memory used by cached rows.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'memory_bytes': self.memory_bytes,
+        }
+
+    def fetchall(self, query, params=None, tags=()):
+        """
+        :param query: The query to run.
+        :param params: The parameters of the query, if any.
+        :param tags: Invalidation tags to attach to the result.
+        :return: The list of rows returned by the query, from the cache if
+            it holds a valid result.
+        """
+        self.poll_invalidations()
+
+        cursor = self.pg_connector.pg_cursor
+        key = cursor.mogrify(query, params)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time():
+                # Move the entry to the most recently used end
+                del self._entries[key]
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            self._remove(key)
+
+        self.misses += 1
+        cursor.execute(key)
+        rows = cursor.fetchall()
+        self._add(key, rows, tags)
+        return rows
+
+    def poll_invalidations(self):
+        """
+        Applies any invalidation notifications which have arrived. If the
+        listening connection was lost, notifications may have been missed,
+        so the cache is cleared.
+        """
+        if self._listen_connector is None:
+            return
+
+        try:
+            if not self._listening:
+                self._listen_connector.listen(self.channel)
+                self._listening = True
+                return
+            notifies = self._listen_connector.poll_notifications()
+        except (OperationalError, InterfaceError):
+            self._listen_connector.disconnect()
+            self._listening = False
+            self.clear()
+            return
+
+        for notify in notifies:
+            self.invalidate(notify.payload or None)
+
+    def invalidate(self, tag=None):
+        """
+        Removes every result with the given tag from the cache.
+
+        :param tag: The tag to invalidate. If None or ``*``, the cache is
+            cleared.
+        """
+        self.invalidations += 1
+        if tag is None or tag == INVALIDATE_ALL:
+            self.clear()
+            return
+
+        for key in list(self._tags.get(tag, ())):
+            self._remove(key)
+
+    def clear(self):
+        """
+        Removes every result from the cache.
+        """
+        self._entries.clear()
+        self._tags.clear()
+        self.memory_bytes = 0
+
+    def close(self):
+        """
+        Clears the cache and closes the listening connection.
+        """
+        self.clear()
+        if self._listen_connector is not None:
+            self._listen_connector.disconnect()
+            self._listening = False
+
+    def _add(self, key, rows, tags):
+        size = _estimate_size(rows)
+        self._entries[key] = (time() + self._ttl, rows, size, tags)
+        self.memory_bytes += size
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self._max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size, tags = self._entries.pop(key)
+        self.memory_bytes -= size
+        for tag in tags:
+            keys = self._tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+
+def _estimate_size(rows):
+    """
+    :return: The shallow size in bytes of a list of rows and their values.
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
@@ -1,21 +1,35 @@
 # -*- coding: utf-8 -*-
 from Queue import Empty
+from collections import deque
+from errno import EINTR
+from fcntl import fcntl, F_GETFL, F_SETFL
+from multiprocessing import Value
 from multiprocessing.process import Process
 from multiprocessing.queues import Queue
 import select
-from signal import signal, SIGCHLD, SIGINT, SIGTERM
-from time import sleep
+from random import uniform
+from signal import signal, SIGCHLD, SIGINT, SIGKILL, SIGTERM
+from time import time
 import os
 
 from psycopg2 import OperationalError
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
-from hermes.components import Component
+from hermes.backoff import DecorrelatedJitterBackoff
+from hermes.components import Component, TimerComponent
 from hermes.connectors import PostgresConnector
+from hermes.errors import ErrorEvent, ErrorRates
 from hermes.exceptions import InvalidConfigurationException
 from hermes.log import LoggerMixin
-from hermes.strategies import TERMINATE
+from hermes.pipelines import Pipeline
+from hermes.strategies import BACKOFF, TERMINATE
+
+
+# Seconds between checks on components with an execute_timeout
+_WATCHDOG_INTERVAL = 1
+# Failed role checks retried before giving up
+_ROLE_CHECK_RETRIES = 6
 
 
 class Client(LoggerMixin, Process, FileSystemEventHandler):
@@ -31,7 +45,11 @@ class Client(LoggerMixin, Process, FileSystemEventHandler):
         3. Listen for file-system events and acts accordingly.
     """
 
-    def __init__(self, dsn, watch_path=None, failover_files=None):
+    def __init__(self, dsn, watch_path=None, failover_files=None,
+                 max_restarts=5, restart_window=60, restart_delay=1,
+                 restart_delay_limit=32, restart_escalation=TERMINATE,
+                 backoff=None, role_check_interval=None,
+                 error_rate_window=60):
         """
         To make the client listen for Postgres 'recovery.conf, recovery.done'
         events::
@@ -78,6 +96,32 @@ class Client(LoggerMixin, Process, FileSystemEventHandler):
             then file monitoring is disabled.
         :param failover_files: A list of files which, when modified, will
             cause the client to call :func:`~execute_role_based_procedure`
+        :param max_restarts: The number of times a component which exits
+            without reporting an error may be restarted within
+            ``restart_window`` seconds.
+        :param restart_window: See ``max_restarts``.
+        :param restart_delay: The number of seconds before a component's
+            first restart within the window. The delay doubles with each
+            further restart, and is jittered.
+        :param restart_delay_limit: The maximum number of seconds before a
+            restart.
+        :param restart_escalation: What to do with a component which
+            exceeds its restart budget.
+            :data:`~hermes.strategies.TERMINATE` shuts the client down,
+            :data:`~hermes.strategies.BACKOFF` restarts the component once
+            the window allows it.
+        :param backoff: A :class:`~hermes.backoff.AbstractBackoff` object
+            deciding how long to wait between role checks while Postgres
+            cannot be reached. Defaults to a
+            :class:`~hermes.backoff.DecorrelatedJitterBackoff` up to 32
+            seconds.
+        :param role_check_interval: The number of seconds between routine
+            calls to :func:`~execute_role_based_procedure`, which catch a
+            failover without a directory watcher. If None, the role is only
+            checked on start, on failover file changes and when a component
+            reports an error.
+        :param error_rate_window: The number of seconds over which
+            :attr:`error_rates` works out each component's error rate.
         """
         super(Client, self).__init__()
 
@@ -85,17 +129,70 @@ class Client(LoggerMixin, Process, FileSystemEventHandler):
 
         self._processor = None
         self._listener = None
+        self._pipeline = None
 
         self._watch_path = watch_path
         self._failover_files = failover_files
         self.master_pg_conn = PostgresConnector(dsn)
 
         self._should_run = False
-        self._child_interrupted = False
-        self._exception_raised = False
+        self._exit_requested = False
+        self._children_exited = False
+        # Signal handlers and the observer thread only set a flag and write
+        # to this pipe, and the main loop does the work
+        self._wakeup_pipe = None
+        # Components stopped on purpose are not restarted when they exit
+        self._standby = False
 
         self._exit_queue = Queue(1)
 
+        self._role_check_interval = role_check_interval
+        self._role_check_due = None
+
+        # Kept by the Client's own process, for :func:`~on_error` to use
+        self.error_rates = ErrorRates(window=error_rate_window)
+
+        self._max_restarts = max_restarts
+        self._restart_window = restart_window
+        self._restart_delay = restart_delay
+        self._restart_delay_limit = restart_delay_limit
+        self._restart_escalation = restart_escalation
+        if backoff is None:
+            backoff = DecorrelatedJitterBackoff(limit=32)
+        self.backoff = backoff
+        # Per component, the times of its restarts within the window, and
+        # when a pending restart is due
+        self._restart_history = {}
+        self._pending_restarts = {}
+
+        # Shared so the Client's statistics can be read from its parent
+        self._stalls = Value('i', 0, lock=False)
+        self._stalled_seconds = Value('d', 0, lock=False)
+        self._restarts = Value('i', 0, lock=False)
+        self._restart_delay_seconds = Value('d', 0, lock=False)
+        self._budgets_exceeded = Value('i', 0, lock=False)
+        self._errors = Value('i', 0, lock=False)
+
+    @property
+    def stats(self):
+        """
+        :return: A dictionary of supervision statistics. ``stalls`` counts
+            the components killed for overrunning their ``execute_timeout``
+            and ``stalled_seconds`` the time they had been executing for.
+            ``restarts`` counts the restarts of components which exited,
+            ``restart_delay_seconds`` the time they were delayed by and
+            ``budgets_exceeded`` how often the restart budget ran out.
+            ``errors`` counts the errors the components reported.
+        """
+        return {
+            'stalls': self._stalls.value,
+            'stalled_seconds': self._stalled_seconds.value,
+            'restarts': self._restarts.value,
+            'restart_delay_seconds': self._restart_delay_seconds.value,
+            'budgets_exceeded': self._budgets_exceeded.value,
+            'errors': self._errors.value,
+        }
+
     def add_processor(self, processor):
         """
         :param processor: A :class:`~hermes.components.Component` object which
@@ -128,6 +225,21 @@ class Client(LoggerMixin, Process, FileSystemEventHandler):
             )
         self._listener = listener
 
+    def add_pipeline(self, pipeline):
+        """
+        :param pipeline: A :class:`~hermes.pipelines.Pipeline` object which
+            will receive notifications in place of a processor.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            the provided pipeline is not a
+            :class:`~hermes.pipelines.Pipeline`
+        """
+        if not isinstance(pipeline, Pipeline):
+            raise InvalidConfigurationException(
+                "Pipeline must of type Pipeline"
+            )
+        self._pipeline = pipeline
+
     def _validate_components(self):
         """
         Checks through a set of validation procedures to ensure the client is
@@ -135,13 +247,27 @@ class Client(LoggerMixin, Process, FileSystemEventHandler):
 
         :raises: :class:`~hermes.exceptions.InvalidConfigurationException`
         """
-        if not self._processor:
+        if self._pipeline:
+            if self._processor:
+                raise InvalidConfigurationException(
+                    "A processor and pipeline cannot both be defined"
+                )
+            if not self._pipeline.components:
+                raise InvalidConfigurationException(
+                    "A pipeline must have at least one stage"
+                )
+        elif not self._processor:
             raise InvalidConfigurationException("A processor must be defined")
 
         if not self._listener:
+            # A processor driven by its triggers alone needs no listener
+            if (isinstance(self._processor, TimerComponent) and
+                    self._processor.notification_pipe is None):
+                return
             raise InvalidConfigurationException("A listener must be defined")
 
-        if self._processor.error_queue is not self._listener.error_queue:
+        processor = self._processor or self._pipeline
+        if processor.error_queue is not self._listener.error_queue:
             raise InvalidConfigurationException(
                 "A processor and listener's error queue must be the same"
             )
@@ -159,12 +285,24 @@ class Client(LoggerMixin, Process, FileSystemEventHandler):
 
     def run(self):
         """
-        Performs a :func:`~select.select` on the components' error queue.
-        When a notification is detected, the client will log the message and
-        then calculate if the Postgres server is still a Master -  if not, the
-        components are shutdown.
+        Runs an event loop which performs a :func:`~select.select` on the
+        exit queue, the components' error queue and a self-pipe woken by
+        signals. When an error is reported, the client will log the message
+        and then calculate if the Postgres server is still a Master - if
+        not, the components are shutdown.
+
+        Components with an ``execute_timeout`` are checked every second, and
+        killed if they have overrun it. Their exit restarts them.
+
+        Components which exit are restarted after a delay, within a restart
+        budget, so one which dies on start does not make the client fork in
+        a tight loop.
+
+        Role checks and restarts are run from the loop, never from a signal
+        handler, so waiting on one does not hold up the others.
         """
         super(Client, self).run()
+        self._wakeup_pipe = self._open_wakeup_pipe()
         self._start_observer()
 
         signal(SIGCHLD, self._handle_sigchld)
@@ -173,46 +311,294 @@ class Client(LoggerMixin, Process, FileSystemEventHandler):
 
         self.execute_role_based_procedure()
         while self._should_run:
-            self._exception_raised = self._child_interrupted = False
+            self._run_once()
+
+    def _run_once(self):
+        """
+        Waits for the next event or timer, then handles everything which is
+        due.
+        """
+        exit_pipe = self._exit_queue._reader
+        pipes = [exit_pipe]
+        if self._wakeup_pipe is not None:
+            pipes.append(self._wakeup_pipe[0])
+        error_queue = self._error_queue()
+        if error_queue is not None and hasattr(error_queue, '_reader'):
+            pipes.append(error_queue._reader)
+
+        try:
+            ready_pipes, _, _ = select.select(
+                pipes, (), (), self._loop_timeout()
+            )
+        except select.error as e:
+            # A signal's wakeup byte is read on the next pass
+            if not e.args or e.args[0] != EINTR:
+                self._should_run = False
+            return
+
+        if self._wakeup_pipe is not None and \
+                self._wakeup_pipe[0] in ready_pipes:
+            self._drain_wakeup_pipe()
+
+        if self._exit_requested or exit_pipe in ready_pipes:
+            self._shutdown()
+            return
+
+        errors_reported = self._handle_errors()
+        if not self._should_run:
+            return
+
+        if self._children_exited:
+            self._children_exited = False
+            # Exits which reported an error are left to the role check
+            if not errors_reported:
+                self._schedule_restarts()
+
+        self._kill_stalled_components()
+        self._run_due_restarts()
+        if self._role_check_due is not None and \
+                self._role_check_due <= time():
+            self.execute_role_based_procedure()
+
+    def _loop_timeout(self):
+        """
+        :return: The number of seconds until the next timer of the main loop
+            is due, or None if there are none.
+        """
+        deadlines = list(self._pending_restarts.itervalues())
+        if self._role_check_due is not None:
+            deadlines.append(self._role_check_due)
+
+        timeout = None
+        if deadlines:
+            timeout = max(min(deadlines) - time(), 0)
+        if any(component.execute_timeout is not None
+               for component in self._components()):
+            timeout = _WATCHDOG_INTERVAL if timeout is None else \
+                min(timeout, _WATCHDOG_INTERVAL)
+        return timeout
+
+    def _error_queue(self):
+        """
+        :return: The error queue shared by the components, or None if there
+            are no components.
+        """
+        processor = self._processor or self._pipeline
+        if processor is None:
+            return None
+        return processor.error_queue
+
+    def _handle_errors(self):
+        """
+        Drains the components' error queue, recording every error reported.
+        An unexpected error which stopped its component shuts the client
+        down, and an expected one asks for a role check.
+
+        :return: True if any component stopped on an error.
+        """
+        error_queue = self._error_queue()
+        stopped = False
+        while error_queue is not None and self._should_run:
             try:
-                exit_pipe = self._exit_queue._reader
+                event = ErrorEvent.coerce(error_queue.get_nowait())
+            except Empty:
+                break
 
-                ready_pipes, _, _ = select.select(
-                    (exit_pipe, ), (), ()
+            self.error_rates.record(event)
+            self._errors.value += 1
+            self.on_error(event)
+            if not event.terminal or not self._should_run:
+                continue
+
+            stopped = True
+            if not event.expected:
+                self.log.critical(
+                    'An unexpected error was raised in {} - '
+                    'shutting down'.format(event.key)
                 )
+                self._shutdown()
+            elif event.action == TERMINATE:
+                self._role_check_due = 0
+        return stopped
 
-                if exit_pipe in ready_pipes:
-                    self.terminate()
+    def on_error(self, event):
+        """
+        Called from the main loop for every error a component reports,
+        after it is added to :attr:`error_rates`. Can be safely overridden
+        by callers, for example to shut down once a component's error rate
+        passes a threshold.
 
-            except select.error:
-                if not self._child_interrupted and not self._exception_raised:
-                    self._should_run = False
+        :param event: An :class:`~hermes.errors.ErrorEvent`.
+        """
+        self.log.warning(
+            '{} (pid {}) raised {}{}: {}'.format(
+                event.key, event.pid, event.exception,
+                ' [{}]'.format(event.sqlstate) if event.sqlstate else '',
+                event.message
+            )
+        )
 
-    def _start_components(self, restart=False):
+    def _open_wakeup_pipe(self):
         """
-        Starts the Processor and Listener if the client is not running
+        :return: The (read, write) file descriptors of a non-blocking pipe
+            used to wake the main loop.
         """
-        if not self._processor.is_alive():
-            if restart and self._processor.ident:
-                self._processor.join()
-            self._processor.start()
+        read_fd, write_fd = os.pipe()
+        for fd in (read_fd, write_fd):
+            fcntl(fd, F_SETFL, fcntl(fd, F_GETFL) | os.O_NONBLOCK)
+        return read_fd, write_fd
 
-        if not self._listener.is_alive():
-            if restart and self._listener.ident:
-                self._listener.join()
-            self._listener.start()
+    def _drain_wakeup_pipe(self):
+        """
+        Reads every pending wakeup byte, so one pass handles them all.
+        """
+        try:
+            while os.read(self._wakeup_pipe[0], 4096):
+                pass
+        except OSError:
+            pass
+
+    def _wake(self):
+        """
+        Wakes the main loop. Safe to call from signal handlers and other
+        threads.
+        """
+        if self._wakeup_pipe is None:
+            return
+        try:
+            os.write(self._wakeup_pipe[1], '\0')
+        except OSError:
+            # The pipe is full, so the loop is due to wake anyway
+            pass
+
+    def request_role_check(self):
+        """
+        Asks the main loop to call :func:`~execute_role_based_procedure` as
+        soon as it can. Safe to call from signal handlers and other threads.
+        """
+        self._role_check_due = 0
+        self._wake()
+
+    def _components(self):
+        """
+        :return: The supervised components, from the listener downstream.
+        """
+        components = [self._listener, self._processor]
+        if self._pipeline:
+            components.extend(self._pipeline.components)
+        return [component for component in components if component]
+
+    def _start_components(self, restart=False):
+        """
+        Starts the Processor, any pipeline stages and the Listener if the
+        client is not running, downstream components first
+        """
+        self._standby = False
+        for component in reversed(self._components()):
+            self._pending_restarts.pop(component, None)
+            if not component.is_alive():
+                if restart and component.ident:
+                    component.join()
+                component.start()
 
     def _stop_components(self):
         """
-        Stops the Processor and Listener if the client is running
+        Stops the Listener, Processor and any pipeline stages if the client
+        is running
+        """
+        self._standby = True
+        self._pending_restarts.clear()
+        for component in self._components():
+            if component.ident and component.is_alive():
+                component.terminate()
+                component.join()
+
+    def _schedule_restarts(self):
         """
-        if self._listener and self._listener.ident and self._listener.is_alive():
-            self._listener.terminate()
-            self._listener.join()
+        Schedules a restart of every component which has exited, delayed
+        exponentially by the number of its recent restarts. A component out
+        of restart budget is escalated instead.
+        """
+        if self._standby:
+            return
+
+        now = time()
+        for component in self._components():
+            if component.is_alive() or component in self._pending_restarts:
+                continue
+
+            history = self._restart_history.setdefault(component, deque())
+            while history and history[0] <= now - self._restart_window:
+                history.popleft()
 
-        if self._processor and self._processor.ident and self._processor.is_alive():
-            self._processor.terminate()
-            self._processor.join()
+            if len(history) >= self._max_restarts:
+                self._budgets_exceeded.value += 1
+                if self._restart_escalation != BACKOFF:
+                    self.log.critical(
+                        'Component {} exceeded its restart budget - '
+                        'shutting down'.format(component.ident)
+                    )
+                    self._shutdown()
+                    return
+                # Restart once the oldest restart leaves the window
+                delay = history[0] + self._restart_window - now
+                self.log.warning(
+                    'Component {} exceeded its restart budget'.format(
+                        component.ident
+                    )
+                )
+            else:
+                delay = min(self._restart_delay * 2 ** len(history),
+                            self._restart_delay_limit)
+                delay = uniform(delay / 2.0, delay)
+
+            self.log.warning(
+                'Restarting component {} in {:.1f} seconds'.format(
+                    component.ident, delay
+                )
+            )
+            history.append(now + delay)
+            self._pending_restarts[component] = now + delay
+            self._restarts.value += 1
+            self._restart_delay_seconds.value += delay
+
+    def _run_due_restarts(self):
+        """
+        Restarts the components whose scheduled restart is due.
+        """
+        now = time()
+        for component, due in self._pending_restarts.items():
+            if due > now:
+                continue
+            del self._pending_restarts[component]
+            if not component.is_alive():
+                if component.ident:
+                    component.join()
+                component.start()
+
+    def _kill_stalled_components(self):
+        """
+        Kills every running component which has been executing for longer
+        than its ``execute_timeout``. A stuck component may not respond to
+        SIGTERM, so SIGKILL is sent.
+        """
+        for component in self._components():
+            if component.execute_timeout is None or not component.ident:
+                continue
+
+            busy_time = component.busy_time()
+            if busy_time > component.execute_timeout and \
+                    component.is_alive():
+                self.log.critical(
+                    'Component {} has been executing for {:.1f} seconds, '
+                    'killing it'.format(component.ident, busy_time)
+                )
+                self._stalls.value += 1
+                self._stalled_seconds.value += busy_time
+                try:
+                    os.kill(component.ident, SIGKILL)
+                except OSError:
+                    pass
 
     def _start_observer(self):
         """
@@ -243,80 +629,73 @@ class Client(LoggerMixin, Process, FileSystemEventHandler):
         """
         file_name = event.src_path.split('/')[-1]
         if file_name in self._failover_files:
-            self.execute_role_based_procedure()
+            self.request_role_check()
 
     def execute_role_based_procedure(self):
         """
         Starts or stops components based on the role (Master/Slave) of the
         Postgres host.
 
-        Implements a `binary exponential backoff
-        <http://en.wikipedia.org/wiki/Exponential_backoff
-        #Binary_exponential_backoff_.2F_truncated_exponential_backoff>`_
-        up to 32 seconds if it encounters a FATAL connection error.
+        If it encounters a FATAL connection error, the components are
+        stopped and another check is scheduled, as the client's backoff
+        policy decides, giving up after six retries. The main loop carries
+        on in the meantime.
+
+        :raises: :class:`~psycopg2.OperationalError` once the retries are
+            used up.
         """
-        backoff = 0
-        while True:
-            try:
-                server_is_master = self.master_pg_conn.is_server_master()
-                if server_is_master:
-                    self.log.warning('Server is a master, starting components')
-                    self._start_components(restart=True)
-                else:
-                    self.log.warning('Server is a slave, stopping components')
-                    self._stop_components()
-                break
-            except OperationalError as e:
-                self._stop_components()
+        self._role_check_due = None
+        try:
+            server_is_master = self.master_pg_conn.is_server_master()
+        except OperationalError:
+            self._stop_components()
+
+            self.log.warning(
+                'Cannot connect to the DB, maybe it has been shutdown?',
+                exc_info=True
+            )
 
-                self.log.warning(
-                    'Cannot connect to the DB, maybe it has been shutdown?',
-                    exc_info=True
-                )
+            if self.backoff.attempts >= _ROLE_CHECK_RETRIES:
+                self.backoff.reset()
+                raise
+            self._role_check_due = time() + self.backoff.failed()
+            return
 
-                if backoff:  # pragma: no cover
-                    backoff <<= 1
-                    if backoff > 32:
-                        raise e
-                else:
-                    backoff = 1
-                sleep(backoff)
+        if server_is_master:
+            self.log.warning('Server is a master, starting components')
+            self._start_components(restart=True)
+        else:
+            self.log.warning('Server is a slave, stopping components')
+            self._stop_components()
+        self.backoff.reset()
+
+        if self._role_check_interval is not None:
+            self._role_check_due = time() + self._role_check_interval
 
     def _handle_sigchld(self, sig, frame):
         """
         A child process dying, and the client not shutting down, indicates
-        a process has been shut down by some external caller.
+        a process has been shut down by some external caller, or has failed.
 
-        We must check both the processor and listener for 'liveness' and
-        start those which have failed.
+        The main loop is woken to check the error queue, and to schedule
+        restarts of the components which have exited.
         """
-        if sig == SIGCHLD and self._should_run and not self._exception_raised:
-            try:
-                expected, action = self._processor.error_queue.get_nowait()
-                self._exception_raised = True
-                if expected:
-                    if action == TERMINATE:
-                        self.execute_role_based_procedure()
-                else:
-                    self.log.critical(
-                        'An unexpected error was raised - shutting down'
-                    )
-                    self._shutdown()
-            except Empty:
-                self._child_interrupted = True
-                self._start_components(restart=True)
+        if sig == SIGCHLD and self._should_run:
+            self._children_exited = True
+            self._wake()
 
     def _handle_terminate(self, sig, frame):
         """
         Handles SIGINT and SIGTERM signals.
 
         If called from another process then puts to the exit queue, else
-        calls _shutdown.
+        wakes the main loop to call _shutdown.
         """
         if self.ident != os.getpid():
             self._exit_queue.put_nowait(True)
         else:
-            self._shutdown()
+            self._exit_requested = True
+            self._wake()
 
     def _shutdown(self):
         """
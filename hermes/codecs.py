@@ -0,0 +1,115 @@
+"""
+Codecs used to encode and decode notification payloads.
+"""
+from base64 import b64decode, b64encode
+import json
+
+try:
+    import ujson as fast_json
+except ImportError:  # pragma: no cover
+    fast_json = json
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+from hermes.exceptions import (
+    InvalidConfigurationException, PayloadDecodeException
+)
+
+
+class AbstractCodec(object):
+    """
+    Abstract codec for notification payloads.
+    """
+
+    def encode(self, value):
+        """
+        An abstract method that must be overridden by subclasses.
+
+        Must return a payload string representing the value.
+        """
+        raise NotImplementedError("Subclasses MUST override the "
+                                  "'encode' method")
+
+    def decode(self, payload):
+        """
+        An abstract method that must be overridden by subclasses.
+
+        :raises: :class:`~hermes.exceptions.PayloadDecodeException` if the
+            payload is malformed.
+        """
+        raise NotImplementedError("Subclasses MUST override the "
+                                  "'decode' method")
+
+    def decode_batch(self, payloads):
+        """
+        Decodes a list of payloads. Subclasses may override this where
+        decoding many payloads at once is cheaper.
+
+        :raises: :class:`~hermes.exceptions.PayloadDecodeException` if any
+            payload is malformed.
+        """
+        return [self.decode(payload) for payload in payloads]
+
+
+class RawCodec(AbstractCodec):
+    """
+    Passes payloads through untouched.
+    """
+
+    def encode(self, value):
+        return value
+
+    def decode(self, payload):
+        return payload
+
+    def decode_batch(self, payloads):
+        return payloads
+
+
+class JsonCodec(AbstractCodec):
+    """
+    Encodes payloads as JSON, using `ujson <https://pypi.python.org/pypi
+    /ujson>`_ when it is installed.
+    """
+
+    def __init__(self, json_module=fast_json):
+        """
+        :param json_module: A module providing ``dumps`` and ``loads``
+            which raise ValueError on malformed input.
+        """
+        self._json = json_module
+
+    def encode(self, value):
+        return self._json.dumps(value)
+
+    def decode(self, payload):
+        try:
+            return self._json.loads(payload)
+        except ValueError as e:
+            raise PayloadDecodeException(payload, e)
+
+
+class MsgpackCodec(AbstractCodec):
+    """
+    Encodes payloads with `msgpack <https://pypi.python.org/pypi/msgpack>`_.
+    As notification payloads must be text, the packed bytes are base64
+    encoded.
+    """
+
+    def __init__(self):
+        if msgpack is None:
+            raise InvalidConfigurationException(
+                "The 'msgpack' package is required to use MsgpackCodec"
+            )
+
+    def encode(self, value):
+        return b64encode(msgpack.packb(value))
+
+    def decode(self, payload):
+        try:
+            return msgpack.unpackb(b64decode(payload))
+        except Exception as e:
+            raise PayloadDecodeException(payload, e)
@@ -1,10 +1,17 @@
-from multiprocessing import Process
+from functools import partial
+from heapq import heappop, heappush
+from itertools import count
+from multiprocessing import Process, Value
 import select
 from signal import signal, SIGTERM, SIGINT
-from time import sleep
+from time import time
 
+from hermes.backoff import DecorrelatedJitterBackoff, interruptible_sleep
+from hermes.errors import ErrorEvent
+from hermes.exceptions import InvalidConfigurationException
 from hermes.log import LoggerMixin
 from hermes import strategies
+from hermes.triggers import FixedRateTrigger
 
 
 _LOG_PID = 'Started with PID:{}'
@@ -44,7 +51,8 @@ class Component(LoggerMixin, Process):
     """
 
     def __init__(self, notification_pipe, error_strategy,
-                 error_queue, backoff_limit=16):
+                 error_queue, backoff_limit=16, idle_timeout=None,
+                 tick_interval=None, execute_timeout=None, backoff=None):
         """
         The Component class adds a foundation for you to build a
         fully-fledged processor or listener. You can add/modify as much
@@ -58,7 +66,24 @@ class Component(LoggerMixin, Process):
         :param error_queue: A :class:`~multiprocessing.Queue`-like object
             to inform the :class:`~hermes.client.Client` through.
         :param backoff_limit: The maximum number of seconds to backoff a
-            Component until it resets.
+            Component for, when no ``backoff`` policy is given.
+        :param idle_timeout: The number of seconds to wait for a
+            notification before calling :func:`~on_idle`. If None, waits
+            indefinitely.
+        :param tick_interval: The number of seconds between calls to
+            :func:`~on_tick`, whether or not notifications are arriving.
+            If None, :func:`~on_tick` is never called.
+        :param execute_timeout: The number of seconds the Component may
+            spend handling a notification, idle call or scheduled task
+            before its :class:`~hermes.client.Client` kills and restarts it.
+            If None, it may take as long as it likes.
+        :param backoff: A :class:`~hermes.backoff.AbstractBackoff` object
+            deciding how long to wait when the error strategy backs off.
+            Defaults to a :class:`~hermes.backoff.DecorrelatedJitterBackoff`
+            up to ``backoff_limit`` seconds.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            ``tick_interval`` is not positive.
         """
         self.error_strategy = error_strategy
         self.error_queue = error_queue
@@ -66,8 +91,26 @@ class Component(LoggerMixin, Process):
 
         self._should_run = False
         self._backoff_limit = backoff_limit
-
-        self.__backoff_time__ = 0
+        self._idle_timeout = idle_timeout
+        self._tick_trigger = None
+        if tick_interval is not None:
+            self._tick_trigger = FixedRateTrigger(tick_interval)
+        self._periodic_tasks = []
+        # Built once per process, so it survives errors which restart the
+        # loop
+        self._schedule = None
+        self.execute_timeout = execute_timeout
+        # Shared with the supervising Client, 0 while waiting on select
+        self._busy_since = Value('d', 0, lock=False)
+        # Chosen on first start and kept, so restarts keep the same name
+        self._process_name = None
+        # Set after starting, pausing or an exception, until the error
+        # strategy hears of success
+        self._recovering = False
+
+        if backoff is None:
+            backoff = DecorrelatedJitterBackoff(limit=backoff_limit)
+        self.backoff = backoff
 
     def pre_execute(self):
         """
@@ -95,6 +138,47 @@ class Component(LoggerMixin, Process):
         """
         pass  # pragma: no cover
 
+    def on_idle(self):
+        """
+        Called when no notification has arrived within ``idle_timeout``
+        seconds. Can be safely overridden by callers.
+        """
+        pass  # pragma: no cover
+
+    def on_tick(self):
+        """
+        Called every ``tick_interval`` seconds. Can be safely overridden by
+        callers, for example to flush a partial batch on a deadline.
+        """
+        pass  # pragma: no cover
+
+    def schedule(self, trigger, func):
+        """
+        Schedules a function to be called from the Component's loop, in
+        between notifications, whenever the trigger fires.
+
+        Tasks should be scheduled before the Component is started. Their
+        schedule carries on when the loop restarts after an error, but
+        starts afresh when the Component's process is restarted.
+
+        :param trigger: A :class:`~hermes.triggers.AbstractTrigger` object.
+        :param func: A function taking no arguments.
+        """
+        self._periodic_tasks.append((trigger, func))
+
+    def schedule_periodic(self, interval, func):
+        """
+        Schedules a function to be called every ``interval`` seconds from
+        the Component's loop, in between notifications. Calls which fall
+        behind are skipped rather than run in a burst.
+
+        Tasks should be scheduled before the Component is started.
+
+        :param interval: The number of seconds between calls.
+        :param func: A function taking no arguments.
+        """
+        self.schedule(FixedRateTrigger(interval), func)
+
     def set_up(self):
         """
         Called before execute methods and only once per iteration.
@@ -116,8 +200,11 @@ class Component(LoggerMixin, Process):
         """
         Initialises the process, sets it to daemonic and starts.
         """
-        super(Component, self).__init__()
+        super(Component, self).__init__(name=self._process_name)
+        self._process_name = self.name
         self.daemon = True
+        self._busy_since.value = 0
+        self._schedule = None
         super(Component, self).start()
 
     def run(self):
@@ -129,14 +216,25 @@ class Component(LoggerMixin, Process):
         super(Component, self).run()
         self.log.debug(_LOG_PID.format(self.pid))
         self._should_run = True
+        # The first work is reported, as the error strategy may be waiting
+        # on it, such as a circuit breaker letting this process try
+        self._recovering = True
         while self._should_run:
+            if self._pause():
+                continue
             try:
                 self.set_up()
                 self._execute()
             except select.error:
                 break
             except Exception, e:
+                occurred_at = time()
+                self._recovering = True
                 expected, action = self.error_strategy.handle_exception(e)
+                # Every error is reported, so the Client can track rates
+                self.error_queue.put(ErrorEvent.from_exception(
+                    self, e, expected, action, occurred_at
+                ))
                 if action == strategies.CONTINUE:
                     self.log.warning(_HANDLED_EXCEPTION, exc_info=True)
                     continue
@@ -148,7 +246,6 @@ class Component(LoggerMixin, Process):
                 else:
                     self.log.critical(_UNHANDLED_EXCEPTION, exc_info=True)
 
-                self.error_queue.put((expected, action))
                 self._should_run = False
             finally:
                 self.tear_down()
@@ -156,18 +253,116 @@ class Component(LoggerMixin, Process):
     def _execute(self):
         """
         Loops through select -> post_exec(execute(pre_execute)) until
-        terminate is called or an exception is raised.
+        terminate is called or an exception is raised, calling on_idle
+        after idle_timeout seconds without a notification and running
+        periodic tasks as they fall due.
         """
+        if self._schedule is None:
+            self._schedule = self._start_schedule()
+        schedule = self._schedule
+        pipes = ()
+        if self.notification_pipe is not None:
+            pipes = (self.notification_pipe, )
+
+        last_active = time()
         while self._should_run:
-            ready_pipes, _, _ = select.select(
-                (self.notification_pipe, ), (), ()
-            )
+            timeout = None
+            if self._idle_timeout is not None:
+                timeout = max(last_active + self._idle_timeout - time(), 0)
+            if schedule:
+                wait = max(schedule[0][0] - time(), 0)
+                timeout = wait if timeout is None else min(timeout, wait)
+
+            ready_pipes, _, _ = select.select(pipes, (), (), timeout)
+
+            self._busy_since.value = time()
+            try:
+                worked = False
+                if pipes and self.notification_pipe in ready_pipes:
+                    self.log.debug('Received notification, running execute')
+                    self.post_execute(self.execute(self.pre_execute()))
+                    last_active = time()
+                    worked = True
+                elif (self._idle_timeout is not None and
+                        time() - last_active >= self._idle_timeout):
+                    self.on_idle()
+                    last_active = time()
+                    worked = True
+
+                if schedule and self._run_due_tasks(schedule):
+                    worked = True
+
+                if worked and self._recovering:
+                    self._recovering = False
+                    self.backoff.reset()
+                    self.error_strategy.handle_success()
+            finally:
+                self._busy_since.value = 0
+
+        # A stopped Component starts from the base delay if started again
+        self.backoff.reset()
+
+    def _start_schedule(self):
+        """
+        :return: A heap of (fire time, sequence, due time, trigger, function)
+            entries for the scheduled tasks and ticks.
+        """
+        tasks = list(self._periodic_tasks)
+        if self._tick_trigger is not None:
+            tasks.append((self._tick_trigger, self.on_tick))
+
+        now = time()
+        schedule = []
+        sequence = count()
+        for trigger, func in tasks:
+            due = trigger.next_due(None, now)
+            heappush(schedule, (
+                trigger.fire_time(due), next(sequence), due, trigger, func
+            ))
+        return schedule
+
+    def _run_due_tasks(self, schedule):
+        """
+        Runs every task in the schedule which is due, once, and asks its
+        trigger when it is next due. A task which raises is rescheduled
+        too, and those not yet run are left due, so none are lost from the
+        schedule.
+
+        :return: The number of tasks run.
+        """
+        now = time()
+        due_tasks = []
+        while schedule and schedule[0][0] <= now:
+            due_tasks.append(heappop(schedule))
 
-            if self.notification_pipe in ready_pipes:
-                self.log.debug('Received notification, running execute')
-                self.post_execute(self.execute(self.pre_execute()))
+        run = 0
+        try:
+            for _, sequence, due, trigger, func in due_tasks:
+                run += 1
+                try:
+                    func()
+                finally:
+                    due = trigger.next_due(due, time())
+                    fire_time = trigger.fire_time(due)
+                    heappush(schedule, (fire_time, sequence, due, trigger,
+                                        func))
+        finally:
+            for task in due_tasks[run:]:
+                heappush(schedule, task)
+        return run
+
+    def busy_time(self):
+        """
+        Can be called from the supervising process.
 
-        self.__backoff_time__ = 0
+        :return: The number of seconds the Component has spent handling
+            the current notification, idle call or scheduled tasks, or 0
+            while it is waiting for one.
+        """
+        busy_since = self._busy_since.value
+        if not busy_since:
+            return 0
+        return max(time() - busy_since, 0)
 
     def is_alive(self):
         """
@@ -200,22 +395,39 @@ class Component(LoggerMixin, Process):
         except AttributeError:
             return None
 
+    pid = ident
+
     def _backoff(self):
         """
-        Backs off up to the provided backoff_limit.
+        Backs off for as long as the backoff policy decides, or until the
+        Component is asked to stop.
         """
-        msg = _BACKOFF_EXCEPTION.format(self.__backoff_time__)
-        self.log.warning(msg, exc_info=True)
+        delay = self.backoff.failed()
+        self.log.warning(_BACKOFF_EXCEPTION.format(round(delay, 1)),
+                         exc_info=True)
 
-        if self.__backoff_time__:
-            self.__backoff_time__ <<= 1
-            if self.__backoff_time__ > self._backoff_limit:
-                self.__backoff_time__ = 1
-        else:
-            self.__backoff_time__ = 1
+        if interruptible_sleep(delay, lambda: not self._should_run):
+            self.log.warning('Retrying...')
 
-        sleep(self.__backoff_time__)
-        self.log.warning('Retrying...')
+    def _pause(self):
+        """
+        Pauses for as long as the error strategy asks, or until the
+        Component is asked to stop.
+
+        :return: True if the Component paused.
+        """
+        pause_time = self.error_strategy.pause_time()
+        if not pause_time:
+            return False
+
+        self.log.warning(
+            'Pausing {:.1f} seconds as the error strategy asks'.format(
+                pause_time
+            )
+        )
+        interruptible_sleep(pause_time, lambda: not self._should_run)
+        self._recovering = True
+        return True
 
     def _handle_stop_signal(self, sig, frame):
         """
@@ -223,3 +435,69 @@ class Component(LoggerMixin, Process):
         flag to False.
         """
         self._should_run = False
+
+
+class TimerComponent(Component):
+    """
+    A Component whose :func:`~execute` runs whenever one of its triggers
+    fires, and also on notifications if given a notification pipe. It is
+    supervised, handles errors and backs off exactly like any other
+    Component, so it can be given to a :class:`~hermes.client.Client` as
+    its processor.
+
+    While :func:`~execute` runs, :attr:`trigger` holds the
+    :class:`~hermes.triggers.AbstractTrigger` that fired, or None if a
+    notification arrived.
+    """
+
+    def __init__(self, triggers, error_strategy, error_queue,
+                 notification_pipe=None, backoff_limit=16,
+                 execute_timeout=None, backoff=None):
+        """
+        To reconcile every night at 3am, and whenever a listener signals::
+
+            from hermes.triggers import CronTrigger
+
+            processor = Reconciler(
+                [CronTrigger('0 3 * * *', jitter=60)],
+                CommonErrorStrategy(), error_queue,
+                notification_pipe=notif_queue._reader
+            )
+
+        :param triggers: A list of :class:`~hermes.triggers.AbstractTrigger`
+            objects.
+        :param error_strategy: See :class:`~Component`.
+        :param error_queue: See :class:`~Component`.
+        :param notification_pipe: The :class:`~multiprocessing.Pipe`-like
+            object to perform :func:`~select.select` on. If None, the
+            Component is driven by its triggers alone.
+        :param backoff_limit: See :class:`~Component`.
+        :param execute_timeout: See :class:`~Component`.
+        :param backoff: See :class:`~Component`.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            there is neither a trigger nor a notification pipe.
+        """
+        if not triggers and notification_pipe is None:
+            raise InvalidConfigurationException(
+                "A TimerComponent needs a trigger or a notification pipe"
+            )
+        super(TimerComponent, self).__init__(
+            notification_pipe, error_strategy, error_queue,
+            backoff_limit=backoff_limit, execute_timeout=execute_timeout,
+            backoff=backoff
+        )
+        self.trigger = None
+        for trigger in triggers:
+            self.schedule(trigger, partial(self._fire, trigger))
+
+    def _fire(self, trigger):
+        """
+        Runs post_exec(execute(pre_execute)) on behalf of a trigger.
+        """
+        self.log.debug('Trigger fired, running execute')
+        self.trigger = trigger
+        try:
+            self.post_execute(self.execute(self.pre_execute()))
+        finally:
+            self.trigger = None
@@ -1,17 +1,44 @@
+from collections import deque, OrderedDict
 from contextlib import closing
+from itertools import count
+from time import time
+import os
+import re
+import select
+import socket
+import sys
 
 import psycopg2
+from psycopg2 import Error, InterfaceError
+from psycopg2.errorcodes import INVALID_SQL_STATEMENT_NAME
+from psycopg2.extensions import POLL_OK, POLL_READ, POLL_WRITE
 from psycopg2.extras import DictCursor
 
+from hermes.bulk import CopyInStream, CopyOutStream
+
+
+_stream_ids = count()
+# Connections inherited from a parent process. They are never closed, as
+# closing one would also terminate the parent's session.
+_inherited_connections = []
+_PLACEHOLDER_RE = re.compile(r'%(?:\((\w+)\))?s|%%')
+_TCP_USER_TIMEOUT = getattr(socket, 'TCP_USER_TIMEOUT', 18)
+
 
 class PostgresConnector(object):
     """
     Postgres-talking connection wrapper. A thin wrapper to encapsulate the
     complexity of creating, re-creating, and disconnecting from a Postgres
     database.
+
+    Connections are only opened when first used and belong to the process
+    which opened them. A connector copied into a child process by ``fork``
+    opens a new connection there, leaving the parent's untouched.
     """
 
-    def __init__(self, dsn, cursor_factory=DictCursor):
+    def __init__(self, dsn, cursor_factory=DictCursor,
+                 prepared_cache_size=100, keepalive=None,
+                 statement_timeout=None):
         """
         Creating a PostgresConnector is done like so::
 
@@ -31,12 +58,40 @@ class PostgresConnector(object):
 
         :param dsn: A Postgres-compatible DSN dictionary
         :param cursor_factory: A callable :class:`~psycopg2.extensions.cursor`
-            subclass
+            subclass. :class:`~hermes.cursors.CompactCursor` is cheaper than
+            DictCursor when reading many rows.
+        :param prepared_cache_size: The maximum number of statements
+            :func:`~execute_prepared` keeps prepared on the connection.
+        :param keepalive: A tuple of (idle, interval, count) seconds. If set,
+            TCP keepalives are sent after ``idle`` seconds without traffic
+            and then every ``interval`` seconds, and the connection fails
+            after ``count`` unanswered probes. On Linux, a connection with
+            data unacknowledged for as long also fails.
+        :param statement_timeout: The number of seconds after which Postgres
+            cancels a statement, raising
+            :class:`~psycopg2.extensions.QueryCanceledError`. If None, the
+            server's setting applies.
         """
         self._dsn = dsn
         self._pg_conn = None
         self._pg_cursor = None
         self._cursor_factory = cursor_factory
+        self._pid = None
+        self._keepalive = keepalive
+        self._statement_timeout = statement_timeout
+
+        self._prepared_cache_size = prepared_cache_size
+        self._prepared = OrderedDict()
+        self._prepared_ids = count()
+        self.prepared_hits = 0
+        self.prepared_misses = 0
+
+    @property
+    def dsn(self):
+        """
+        :return: The DSN dictionary provided in the constructor.
+        """
+        return self._dsn
 
     @property
     def pg_connection(self):
@@ -50,10 +105,11 @@ class PostgresConnector(object):
 
         :return: A :class:`~psycopg2.extensions.connection` object
         """
+        self._discard_inherited()
         if self._pg_conn is None or self._pg_conn.closed:
-            self._pg_conn = psycopg2.connect(
-                cursor_factory=self._cursor_factory, **self._dsn
-            )
+            self._prepared.clear()
+            self._pg_conn = self._connect(cursor_factory=self._cursor_factory)
+            self._pid = os.getpid()
             self._pg_conn.set_isolation_level(
                 psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
             )
@@ -69,15 +125,276 @@ class PostgresConnector(object):
             subclass as defined by the cursor_factory passed to the
             constructor
         """
+        self._discard_inherited()
         if not self._pg_cursor or self._pg_cursor.closed:
             self._pg_cursor = self.pg_connection.cursor()
         return self._pg_cursor
 
+    def _connect(self, **kwargs):
+        """
+        :return: A new :class:`~psycopg2.extensions.connection`, with TCP
+            keepalives and a statement timeout configured if requested.
+        """
+        kwargs.update(self._dsn)
+        if self._statement_timeout is not None:
+            option = '-c statement_timeout={}'.format(
+                int(self._statement_timeout * 1000)
+            )
+            kwargs['options'] = ' '.join(
+                filter(None, (kwargs.get('options'), option))
+            )
+        if self._keepalive:
+            idle, interval, count = self._keepalive
+            kwargs.update(keepalives=1, keepalives_idle=idle,
+                          keepalives_interval=interval,
+                          keepalives_count=count)
+
+        connection = psycopg2.connect(**kwargs)
+        if self._keepalive and sys.platform.startswith('linux'):
+            try:
+                sock = socket.fromfd(connection.fileno(), socket.AF_INET,
+                                     socket.SOCK_STREAM)
+                try:
+                    sock.setsockopt(socket.IPPROTO_TCP, _TCP_USER_TIMEOUT,
+                                    (idle + interval * count) * 1000)
+                finally:
+                    sock.close()
+            except socket.error:
+                # Not a TCP connection, such as a Unix domain socket
+                pass
+        return connection
+
+    def _discard_inherited(self):
+        """
+        Forgets a connection opened by another process, so a new one is
+        opened by this process.
+        """
+        if self._pg_conn is not None and self._pid != os.getpid():
+            _inherited_connections.append(self._pg_conn)
+            self._pg_conn = None
+            self._pg_cursor = None
+            self._prepared.clear()
+
+    def listen(self, channel):
+        """
+        Starts listening for notifications on a channel.
+
+        :param channel: The name of the channel.
+        """
+        self.pg_cursor.execute('LISTEN {};'.format(channel))
+
+    def poll_notifications(self):
+        """
+        Reads any notifications which have arrived, without blocking.
+
+        :return: A list of :class:`~psycopg2.extensions.Notify` objects, in
+            the order they were received.
+        """
+        connection = self.pg_connection
+        connection.poll()
+        notifies = list(connection.notifies)
+        del connection.notifies[:]
+        return notifies
+
+    def execute_prepared(self, query, params=None, cursor=None):
+        """
+        Executes a query as a server-side prepared statement, so it is only
+        parsed and planned the first time it is run on a connection::
+
+            cursor = connector.execute_prepared(
+                'SELECT * FROM documents WHERE id = %(id)s;', {'id': 1}
+            )
+            document = cursor.fetchone()
+
+        Prepared statements are kept in a least-recently-used cache of
+        ``prepared_cache_size`` queries, which is emptied on reconnecting
+        and on :func:`~disconnect`. ``prepared_hits`` and
+        ``prepared_misses`` count cache lookups.
+
+        :param query: The query to run, with psycopg2-style placeholders.
+        :param params: The parameters of the query, if any.
+        :param cursor: The cursor to execute on. Defaults to
+            :func:`~pg_cursor`.
+        :return: The cursor the query was executed on.
+        """
+        # Look up the connection first, as reconnecting empties the cache
+        self.pg_connection
+        if cursor is None:
+            cursor = self.pg_cursor
+        if not self._prepared_cache_size:
+            cursor.execute(query, params)
+            return cursor
+
+        try:
+            name, param_names = self._prepare(query, cursor)
+            self._execute_statement(name, param_names, params, cursor)
+        except psycopg2.ProgrammingError as e:
+            # The statement was deallocated behind our back, for instance
+            # by DISCARD ALL, so prepare it again
+            if e.pgcode != INVALID_SQL_STATEMENT_NAME:
+                raise
+            self._prepared.clear()
+            name, param_names = self._prepare(query, cursor)
+            self._execute_statement(name, param_names, params, cursor)
+        return cursor
+
+    def _prepare(self, query, cursor):
+        """
+        :return: A tuple of the prepared statement's name and the names of
+            its parameters (None if positional), preparing it if it is not
+            already cached.
+        """
+        try:
+            statement = self._prepared.pop(query)
+            self.prepared_hits += 1
+        except KeyError:
+            self.prepared_misses += 1
+            statement = self._create_statement(query, cursor)
+
+        self._prepared[query] = statement
+        while len(self._prepared) > self._prepared_cache_size:
+            evicted, _ = self._prepared.popitem(last=False)[1]
+            cursor.execute('DEALLOCATE {};'.format(evicted))
+        return statement
+
+    def _create_statement(self, query, cursor):
+        param_names = []
+
+        def replace(match):
+            if match.group() == '%%':
+                return '%'
+            param_names.append(match.group(1))
+            return '${}'.format(len(param_names))
+
+        sql = _PLACEHOLDER_RE.sub(replace, query).rstrip().rstrip(';')
+        name = 'hermes_{}'.format(next(self._prepared_ids))
+        cursor.execute('PREPARE {} AS {};'.format(name, sql))
+
+        if param_names and param_names[0] is not None:
+            return name, tuple(param_names)
+        return name, None
+
+    def _execute_statement(self, name, param_names, params, cursor):
+        if param_names is not None:
+            params = [params[param_name] for param_name in param_names]
+        if params:
+            cursor.execute('EXECUTE {} ({});'.format(
+                name, ', '.join(['%s'] * len(params))
+            ), params)
+        else:
+            cursor.execute('EXECUTE {};'.format(name))
+
+    def stream(self, query, params=None, itersize=2000, batches=False,
+               cursor_factory=None):
+        """
+        Runs a query through a named, server-side cursor and yields its
+        results, fetching ``itersize`` rows per round trip so memory use
+        stays flat regardless of the size of the result::
+
+            for row in connector.stream('SELECT * FROM documents;'):
+                index(row)
+
+        Named cursors only exist within a transaction, so the connection
+        leaves autocommit mode until the generator is exhausted or closed.
+        Other queries made on this connector in the meantime are part of
+        that transaction.
+
+        :param query: The query to run.
+        :param params: The parameters of the query, if any.
+        :param itersize: The number of rows to fetch per round trip.
+        :param batches: If True, yields lists of up to ``itersize`` rows
+            instead of single rows.
+        :param cursor_factory: A :class:`~psycopg2.extensions.cursor`
+            subclass to use instead of the connector's cursor_factory.
+        """
+        connection = self.pg_connection
+        autocommit = connection.autocommit
+        connection.autocommit = False
+        try:
+            cursor = connection.cursor(
+                'hermes_stream_{}'.format(next(_stream_ids)),
+                cursor_factory=cursor_factory or self._cursor_factory
+            )
+            cursor.itersize = itersize
+            with closing(cursor):
+                cursor.execute(query, params)
+                if batches:
+                    rows = cursor.fetchmany(itersize)
+                    while rows:
+                        yield rows
+                        rows = cursor.fetchmany(itersize)
+                else:
+                    for row in cursor:
+                        yield row
+        except BaseException:
+            if not connection.closed:
+                connection.rollback()
+            raise
+        else:
+            connection.commit()
+        finally:
+            if not connection.closed:
+                connection.autocommit = autocommit
+
+    def copy_in(self, table, rows, columns=None, buffer_size=65536):
+        """
+        Loads rows into a table with ``COPY ... FROM STDIN``. Rows are
+        encoded as Postgres reads them, so any iterable - including a
+        generator - can be loaded without building the whole input::
+
+            connector.copy_in(
+                'documents', ((i, 'name') for i in xrange(1000000)),
+                columns=('id', 'name')
+            )
+
+        :param table: The name of the table to load into.
+        :param rows: An iterable of row sequences. None is loaded as NULL,
+            and lists and tuples as arrays.
+        :param columns: The names of the columns values are given for, if
+            not every column in order.
+        :param buffer_size: The number of bytes sent per write.
+        :return: The number of rows loaded.
+        :raises: TypeError if a value's type has no COPY text encoding.
+        """
+        if columns:
+            table = '{} ({})'.format(table, ', '.join(columns))
+        stream = CopyInStream(rows)
+        self.pg_cursor.copy_expert(
+            'COPY {} FROM STDIN;'.format(table), stream, size=buffer_size
+        )
+        return stream.rows_read
+
+    def copy_out(self, query, params=None, chunk_size=1000):
+        """
+        Runs a query with ``COPY (...) TO STDOUT`` and yields its rows in
+        chunks as they arrive. Values are yielded as the strings Postgres
+        outputs them as, with NULLs as None::
+
+            for rows in connector.copy_out('SELECT id, name FROM documents'):
+                index(rows)
+
+        The COPY runs on a separate connection, so this connector remains
+        usable while the chunks are consumed.
+
+        :param query: The SELECT query to export.
+        :param params: The parameters of the query, if any.
+        :param chunk_size: The number of rows per yielded list.
+        """
+        with closing(self._connect()) as connection:
+            with closing(connection.cursor()) as cursor:
+                sql = 'COPY ({}) TO STDOUT;'.format(
+                    cursor.mogrify(query, params).rstrip().rstrip(';')
+                )
+                stream = CopyOutStream(cursor, sql, chunk_size)
+                for chunk in stream:
+                    yield chunk
+
     def disconnect(self):
         """
         Disconnects from the Postgres instance unless it is already
         disconnected.
         """
+        self._discard_inherited()
         try:
             self._pg_cursor.close()
         except AttributeError:
@@ -85,6 +402,7 @@ class PostgresConnector(object):
         finally:
             self._pg_cursor = None
 
+        self._prepared.clear()
         try:
             self._pg_conn.close()
         except AttributeError:
@@ -102,3 +420,253 @@ class PostgresConnector(object):
             with closing(conn.cursor()) as cursor:
                 cursor.execute('SELECT pg_is_in_recovery();')
                 return not cursor.fetchone()[0]
+
+
+class AsyncQuery(object):
+    """
+    A query submitted to an :class:`~AsyncPostgresConnector`.
+    """
+
+    def __init__(self, query, params=None):
+        self.query = query
+        self.params = params
+        self.done = False
+        self.rows = None
+        self.error = None
+
+    def result(self):
+        """
+        :return: The rows returned by the query, or None if it returned no
+            rows.
+        :raises: The error raised by the query, if any.
+        """
+        if self.error is not None:
+            raise self.error
+        return self.rows
+
+
+class AsyncPostgresConnector(object):
+    """
+    Runs independent queries concurrently over a small pool of asynchronous
+    connections, so a set of queries takes roughly as long as the slowest
+    one rather than the sum of them all.
+    """
+
+    def __init__(self, dsn, max_connections=4, cursor_factory=DictCursor):
+        """
+        Running queries concurrently is done like so::
+
+            connector = AsyncPostgresConnector(dsn, max_connections=4)
+
+            languages, projects = connector.run_all([
+                'SELECT * FROM languages;',
+                ('SELECT * FROM projects WHERE id = %s;', (project_id, )),
+            ])
+
+        Waiting for results happens in a :func:`~select.select`, as in
+        :class:`~hermes.components.Component`, so a stop signal interrupts
+        it with a :class:`~select.error`. Components which multiplex other
+        file descriptors can wait on :func:`~waiting` themselves and call
+        :func:`~poll` when any are ready.
+
+        :param dsn: A Postgres-compatible DSN dictionary
+        :param max_connections: The maximum number of queries to run at once.
+        :param cursor_factory: A callable :class:`~psycopg2.extensions.cursor`
+            subclass
+        """
+        self._dsn = dsn
+        self._max_connections = max_connections
+        self._cursor_factory = cursor_factory
+
+        self._idle = []
+        self._busy = {}
+        self._states = {}
+        self._queued = deque()
+        self._pid = os.getpid()
+
+    def submit(self, query, params=None):
+        """
+        Queues a query, starting it if a connection is free.
+
+        :return: An :class:`~AsyncQuery` which is done once the query has
+            finished.
+        """
+        if self._pid != os.getpid():
+            # Forget the parent process' connections and queries
+            _inherited_connections.extend(self._idle)
+            _inherited_connections.extend(self._busy)
+            self._idle = []
+            self._busy = {}
+            self._states = {}
+            self._queued = deque()
+            self._pid = os.getpid()
+
+        async_query = AsyncQuery(query, params)
+        self._queued.append(async_query)
+        self._dispatch()
+        return async_query
+
+    def run_all(self, queries, timeout=None):
+        """
+        Runs queries concurrently and waits for all of them to finish.
+
+        :param queries: A list of query strings or (query, params) tuples.
+        :param timeout: The maximum number of seconds to wait, or None.
+        :return: A list of each query's rows, in the order given.
+        :raises: The first error raised by a query, in the order given.
+        """
+        submitted = []
+        for query in queries:
+            if isinstance(query, basestring):
+                query = (query, )
+            submitted.append(self.submit(*query))
+        self.gather(submitted, timeout)
+        return [async_query.result() for async_query in submitted]
+
+    def gather(self, queries=None, timeout=None):
+        """
+        Waits for queries to finish.
+
+        :param queries: The :class:`~AsyncQuery` objects to wait for.
+            Defaults to every pending query.
+        :param timeout: The maximum number of seconds to wait, or None.
+        :return: True if the queries finished, False on timeout.
+        """
+        deadline = None if timeout is None else time() + timeout
+        while True:
+            if queries is None:
+                pending = self._busy or self._queued
+            else:
+                pending = not all(query.done for query in queries)
+            if not pending:
+                return True
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    return False
+            self.wait(remaining)
+
+    def waiting(self):
+        """
+        :return: A tuple of the connections waiting to read and the
+            connections waiting to write, in the form taken by
+            :func:`~select.select`.
+        """
+        readers = [conn for conn, state in self._states.iteritems()
+                   if state == POLL_READ]
+        writers = [conn for conn, state in self._states.iteritems()
+                   if state == POLL_WRITE]
+        return readers, writers
+
+    def wait(self, timeout=None):
+        """
+        Selects on every busy connection and polls those which are ready.
+        """
+        readers, writers = self.waiting()
+        if not readers and not writers:
+            return
+        ready_readers, ready_writers, _ = select.select(
+            readers, writers, (), timeout
+        )
+        self.poll(ready_readers + ready_writers)
+
+    def poll(self, connections):
+        """
+        Advances the given connections, completing their queries when
+        they finish.
+        """
+        for connection in connections:
+            self._poll(connection)
+        self._dispatch()
+
+    def close(self):
+        """
+        Closes every connection. Unfinished queries fail with an
+        :class:`~psycopg2.InterfaceError`.
+        """
+        for connection, (_, async_query) in self._busy.items():
+            if async_query is not None:
+                self._finish(async_query,
+                             error=InterfaceError('connection closed'))
+            connection.close()
+        for async_query in self._queued:
+            self._finish(async_query,
+                         error=InterfaceError('connection closed'))
+        for connection in self._idle:
+            connection.close()
+
+        self._idle = []
+        self._busy.clear()
+        self._states.clear()
+        self._queued.clear()
+
+    def _dispatch(self):
+        """
+        Starts queued queries on idle connections, opening connections up
+        to max_connections while there are more queries than connections.
+        """
+        while self._queued and self._idle:
+            connection = self._idle.pop()
+            async_query = self._queued.popleft()
+            try:
+                cursor = connection.cursor()
+                cursor.execute(async_query.query, async_query.params)
+            except Error as e:
+                self._finish(async_query, error=e)
+                self._release(connection)
+                continue
+            self._busy[connection] = (cursor, async_query)
+            self._poll(connection)
+
+        connecting = sum(1 for _, async_query in self._busy.itervalues()
+                         if async_query is None)
+        while (len(self._queued) > connecting and
+               len(self._idle) + len(self._busy) < self._max_connections):
+            connection = psycopg2.connect(
+                cursor_factory=self._cursor_factory, async=1, **self._dsn
+            )
+            self._busy[connection] = (None, None)
+            connecting += 1
+            self._poll(connection)
+
+    def _poll(self, connection):
+        cursor, async_query = self._busy[connection]
+        try:
+            state = connection.poll()
+        except Error as e:
+            del self._busy[connection]
+            self._states.pop(connection, None)
+            if async_query is not None:
+                self._finish(async_query, error=e)
+            self._release(connection)
+            return
+
+        if state != POLL_OK:
+            self._states[connection] = state
+            return
+
+        del self._busy[connection]
+        self._states.pop(connection, None)
+        if async_query is not None:
+            try:
+                rows = cursor.fetchall() if cursor.description else None
+            except Error as e:
+                self._finish(async_query, error=e)
+            else:
+                self._finish(async_query, rows=rows)
+            finally:
+                cursor.close()
+        self._release(connection)
+        self._dispatch()
+
+    def _release(self, connection):
+        if connection.closed:
+            return
+        self._idle.append(connection)
+
+    def _finish(self, async_query, rows=None, error=None):
+        async_query.rows = rows
+        async_query.error = error
+        async_query.done = True
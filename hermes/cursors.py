@@ -0,0 +1,159 @@
+"""
+Cursors which can be passed as a ``cursor_factory`` to
+:class:`~hermes.connectors.PostgresConnector` or psycopg2 directly.
+"""
+from keyword import iskeyword
+from operator import itemgetter
+
+from psycopg2.extensions import cursor as _cursor
+
+
+_MAX_ROW_CLASSES = 256
+_row_classes = {}
+
+
+class CompactRow(tuple):
+    """
+    An immutable row which shares its column index with every other row of
+    the same query. Columns can be read by position, by name and, where the
+    name is a valid identifier, as attributes::
+
+        row[0] == row['id'] == row.id
+    """
+    __slots__ = ()
+
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def get(self, name, default=None):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._fields)
+
+    def items(self):
+        return zip(self._fields, self)
+
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+
+    def __repr__(self):
+        return 'Row({})'.format(', '.join(
+            '{}={!r}'.format(name, value)
+            for name, value in zip(self._fields, self)
+        ))
+
+    def __reduce__(self):
+        # Row classes are created on the fly, so are looked up by their
+        # fields when unpickled
+        return _rebuild_row, (self._fields, tuple(self))
+
+
+def _rebuild_row(fields, values):
+    return _get_row_class(fields)(values)
+
+
+def get_row_class(description):
+    """
+    :param description: A DB-API cursor description.
+    :return: A :class:`~CompactRow` subclass for rows of the described
+        query. Classes are cached by column names.
+    """
+    return _get_row_class(tuple(column[0] for column in description))
+
+
+def _get_row_class(fields):
+    try:
+        return _row_classes[fields]
+    except KeyError:
+        pass
+
+    namespace = {
+        '__slots__': (),
+        '_fields': fields,
+        '_index': dict((name, i) for i, name in enumerate(fields)),
+    }
+    for i, name in enumerate(fields):
+        if (not name.startswith('_') and not iskeyword(name)
+                and name.replace('_', 'a').isalnum() and not name[0].isdigit()
+                and not hasattr(CompactRow, name)):
+            namespace[name] = property(itemgetter(i))
+
+    if len(_row_classes) >= _MAX_ROW_CLASSES:
+        _row_classes.clear()
+    row_class = _row_classes[fields] = type('Row', (CompactRow, ), namespace)
+    return row_class
+
+
+class CompactCursor(_cursor):
+    """
+    A cursor returning :class:`~CompactRow` rows. Unlike
+    :class:`~psycopg2.extras.DictCursor`, which builds a mutable row object
+    per row in Python, rows are tuples whose class is built once per query.
+
+    To use it for a single query::
+
+        with closing(connector.pg_connection.cursor(
+                cursor_factory=CompactCursor)) as cursor:
+            cursor.execute('SELECT id, name FROM documents;')
+            for row in cursor:
+                print row.id, row['name']
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CompactCursor, self).__init__(*args, **kwargs)
+        self._row_class = None
+
+    def execute(self, query, vars=None):
+        self._row_class = None
+        return super(CompactCursor, self).execute(query, vars)
+
+    def callproc(self, procname, vars=None):
+        self._row_class = None
+        return super(CompactCursor, self).callproc(procname, vars)
+
+    def _get_row_class(self):
+        if self._row_class is None:
+            self._row_class = get_row_class(self.description)
+        return self._row_class
+
+    def fetchone(self):
+        row = super(CompactCursor, self).fetchone()
+        if row is None:
+            return None
+        return self._get_row_class()(row)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            rows = super(CompactCursor, self).fetchmany()
+        else:
+            rows = super(CompactCursor, self).fetchmany(size)
+        if not rows:
+            return rows
+        return map(self._get_row_class(), rows)
+
+    def fetchall(self):
+        rows = super(CompactCursor, self).fetchall()
+        if not rows:
+            return rows
+        return map(self._get_row_class(), rows)
+
+    def __iter__(self):
+        # The base cursor's __iter__ returns self, so rows are fetched here
+        # instead, itersize at a time as it would for a named cursor
+        fetchmany = super(CompactCursor, self).fetchmany
+        while True:
+            rows = fetchmany(self.itersize)
+            if not rows:
+                return
+            row_class = self._get_row_class()
+            for row in rows:
+                yield row_class(row)
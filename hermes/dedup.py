@@ -0,0 +1,282 @@
+"""
+Deduplication of events delivered at least once.
+"""
+from collections import OrderedDict
+from contextlib import closing
+from hashlib import md5
+from math import ceil, log
+import struct
+from time import time
+
+
+_UPSERT_SQL = (
+    'INSERT INTO {} (event_id) '
+    'SELECT DISTINCT unnest(%s::text[]) '
+    'ON CONFLICT (event_id) DO NOTHING;'
+)
+_SELECT_SQL = 'SELECT event_id FROM {} WHERE event_id = ANY(%s);'
+_RECENT_SQL = (
+    'SELECT event_id FROM {} '
+    "WHERE created_at >= now() - %s * interval '1 second';"
+)
+
+
+def _key(event_id):
+    """
+    :return: The event id as a byte string.
+    """
+    if isinstance(event_id, unicode):
+        return event_id.encode('utf-8')
+    return str(event_id)
+
+
+class _BloomFilter(object):
+    """
+    A fixed-size Bloom filter over strings.
+    """
+
+    def __init__(self, capacity, error_rate):
+        bits = int(ceil(-capacity * log(error_rate) / log(2) ** 2))
+        self._bits = bytearray((bits + 7) // 8)
+        self._size = len(self._bits) * 8
+        self._hashes = max(1, int(round(self._size / float(capacity) *
+                                        log(2))))
+
+    def _positions(self, key):
+        # Double hashing: position i is (h1 + i * h2) mod size
+        h1, h2 = struct.unpack('<QQ', md5(key).digest())
+        return [(h1 + i * h2) % self._size for i in xrange(self._hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class Deduplicator(object):
+    """
+    Records the ids of handled events so redelivered events can be skipped.
+
+    Lookups are O(1) and made in memory: an exact LRU of the most recently
+    handled ids, then a Bloom filter remembering every id handled within
+    the last ``window`` seconds. Only an id the Bloom filter may have seen
+    needs checking against the dedup table, and all such ids of a batch
+    are checked in one query. Handled ids are written to the table in bulk.
+
+    Without a table, an id which has left the LRU is judged by the Bloom
+    filter alone, so about ``error_rate`` of new events are mistaken for
+    duplicates. With one, the Bloom filter is loaded with the ids handled
+    within the last window when first used, so events redelivered to a
+    restarted process are still skipped.
+    """
+
+    def __init__(self, pg_connector=None, table=None, max_entries=100000,
+                 window=3600, capacity=1000000, error_rate=0.001,
+                 batch_size=500):
+        """
+        Skipping redelivered events within a processor is done like so::
+
+            dedup = Deduplicator(pg_connector, table='hermes_dedup')
+            dedup.create_table()
+
+            events = dict((event['id'], event) for event in batch)
+            for event_id in dedup.filter(events.keys()):
+                handle(events[event_id])
+                dedup.mark(event_id)
+            dedup.flush()
+
+        The table requires Postgres 9.5+.
+
+        :param pg_connector: A :class:`~hermes.connectors.PostgresConnector`
+            object. Only needed with a table.
+        :param table: The name of the dedup table. If None, handled ids are
+            only remembered in memory.
+        :param max_entries: The number of ids the LRU holds.
+        :param window: The number of seconds the Bloom filter remembers an
+            id for, at least.
+        :param capacity: The number of ids expected within a window.
+        :param error_rate: The Bloom filter's false positive rate once
+            ``capacity`` ids have been added.
+        :param batch_size: The number of marked ids which will cause
+            :func:`~flush` to be called automatically.
+        """
+        self.pg_connector = pg_connector
+        self.table = table
+
+        self._max_entries = max_entries
+        self._window = window
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._batch_size = batch_size
+
+        self._recent = OrderedDict()
+        self._current = _BloomFilter(capacity, error_rate)
+        self._previous = _BloomFilter(capacity, error_rate)
+        self._rotated_at = time()
+        self._pending = []
+        self._loaded = False
+
+        self.duplicates = 0
+        self.table_lookups = 0
+
+    @property
+    def stats(self):
+        """
+        :return: A dictionary of deduplication statistics.
+        """
+        return {
+            'entries': len(self._recent),
+            'duplicates': self.duplicates,
+            'table_lookups': self.table_lookups,
+            'pending': len(self._pending),
+        }
+
+    def create_table(self):
+        """
+        Creates the dedup table, unless it already exists.
+        """
+        self.pg_connector.pg_cursor.execute(
+            'CREATE TABLE IF NOT EXISTS {} ('
+            'event_id text PRIMARY KEY, '
+            'created_at timestamptz NOT NULL DEFAULT now());'.format(
+                self.table
+            )
+        )
+
+    def seen(self, event_id):
+        """
+        :param event_id: The id of an event.
+        :return: True if the event has been handled already.
+        """
+        return not self.filter([event_id])
+
+    def filter(self, event_ids):
+        """
+        :param event_ids: A list of event ids.
+        :return: A list of the ids which have not been handled, in the
+            order given and without repeats, after at most one query.
+        """
+        self._rotate()
+        if self.table and not self._loaded:
+            self._load()
+
+        ids = OrderedDict()
+        for event_id in event_ids:
+            ids.setdefault(_key(event_id), event_id)
+
+        handled = set()
+        maybe = []
+        for key in ids:
+            if key in self._recent:
+                # Move the id to the most recently used end
+                self._recent[key] = self._recent.pop(key)
+                handled.add(key)
+            elif key in self._current or key in self._previous:
+                maybe.append(key)
+
+        if maybe and self.table:
+            pending = set(self._pending)
+            handled.update(key for key in maybe if key in pending)
+            unknown = [key for key in maybe if key not in pending]
+            if unknown:
+                handled.update(self._handled_in_table(unknown))
+        else:
+            handled.update(maybe)
+
+        self.duplicates += len(handled)
+        return [
+            event_id for key, event_id in ids.iteritems()
+            if key not in handled
+        ]
+
+    def mark(self, *event_ids):
+        """
+        Records events as handled, flushing them to the table if enough
+        are pending.
+
+        :param event_ids: The ids of the handled events.
+        """
+        self._rotate()
+        for event_id in event_ids:
+            key = _key(event_id)
+            self._recent.pop(key, None)
+            self._recent[key] = True
+            self._current.add(key)
+            if self.table:
+                self._pending.append(key)
+
+        while len(self._recent) > self._max_entries:
+            self._recent.popitem(last=False)
+
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending handled ids to the table in a single upsert.
+
+        :return: The number of ids written.
+        """
+        if not self._pending:
+            return 0
+
+        self.pg_connector.pg_cursor.execute(
+            _UPSERT_SQL.format(self.table), (self._pending, )
+        )
+        written = len(self._pending)
+        self._pending = []
+        return written
+
+    def purge(self, older_than='1 day'):
+        """
+        Deletes ids from the table. Events redelivered after their id is
+        purged are handled again.
+
+        :param older_than: A Postgres interval string. Rows created before
+            this long ago are deleted.
+        """
+        self.pg_connector.pg_cursor.execute(
+            'DELETE FROM {} WHERE created_at < now() - %s::interval;'.format(
+                self.table
+            ),
+            (older_than, )
+        )
+
+    def _load(self):
+        """
+        Adds the ids handled within the last window to the Bloom filter.
+        """
+        with closing(self.pg_connector.pg_connection.cursor()) as cursor:
+            cursor.execute(_RECENT_SQL.format(self.table), (self._window, ))
+            for row in cursor:
+                self._current.add(_key(row[0]))
+        self._loaded = True
+
+    def _handled_in_table(self, event_ids):
+        """
+        :return: The set of the given ids found in the table.
+        """
+        self.table_lookups += 1
+        with closing(self.pg_connector.pg_connection.cursor()) as cursor:
+            cursor.execute(_SELECT_SQL.format(self.table), (event_ids, ))
+            # Ids may be read back as unicode, while the keys are UTF-8
+            return set(_key(row[0]) for row in cursor.fetchall())
+
+    def _rotate(self):
+        """
+        Starts a new Bloom filter generation every ``window`` seconds,
+        forgetting the ids of the generation before last.
+        """
+        now = time()
+        if now - self._rotated_at >= self._window:
+            self._previous = self._current
+            if now - self._rotated_at >= 2 * self._window:
+                self._previous = _BloomFilter(self._capacity,
+                                              self._error_rate)
+            self._current = _BloomFilter(self._capacity, self._error_rate)
+            self._rotated_at = now
@@ -0,0 +1,199 @@
+"""
+Error events reported by Components, and the statistics the Client keeps on
+them.
+"""
+from collections import deque
+from time import time
+
+from hermes import strategies
+
+
+class ErrorEvent(object):
+    """
+    Describes an exception raised within a Component. Components put one
+    onto their error queue for every exception their error strategy
+    handles.
+    """
+
+    def __init__(self, component, pid, exception, message, expected, action,
+                 sqlstate=None, occurred_at=None, reported_at=None,
+                 name=None):
+        """
+        :param component: The name of the Component's class.
+        :param pid: The process id of the Component.
+        :param exception: The name of the exception's class.
+        :param message: The exception's message.
+        :param expected: Whether the error strategy expected the exception.
+        :param action: The action the error strategy decided on.
+        :param sqlstate: The Postgres SQLSTATE code of the exception, if it
+            has one.
+        :param occurred_at: The time the exception was caught.
+        :param reported_at: The time the event was put onto the error
+            queue.
+        :param name: The name of the Component's process, which tells apart
+            Components of the same class and stays the same when one is
+            restarted.
+        """
+        self.component = component
+        self.pid = pid
+        self.exception = exception
+        self.message = message
+        self.expected = expected
+        self.action = action
+        self.sqlstate = sqlstate
+        self.occurred_at = occurred_at
+        self.reported_at = reported_at
+        self.name = name
+
+    def __repr__(self):
+        return (
+            '<ErrorEvent component={} name={} pid={} exception={} '
+            'sqlstate={} action={}>'.format(
+                self.component, self.name, self.pid, self.exception,
+                self.sqlstate, self.action
+            )
+        )
+
+    @classmethod
+    def from_exception(cls, component, exception, expected, action,
+                       occurred_at=None):
+        """
+        :param component: The :class:`~hermes.components.Component` which
+            caught the exception.
+        :param exception: The exception.
+        :param expected: See :class:`~ErrorEvent`.
+        :param action: See :class:`~ErrorEvent`.
+        :param occurred_at: See :class:`~ErrorEvent`. Defaults to now.
+        :return: An :class:`~ErrorEvent` describing the exception.
+        """
+        now = time()
+        return cls(
+            type(component).__name__, component.pid,
+            type(exception).__name__, _message(exception), expected, action,
+            sqlstate=getattr(exception, 'pgcode', None),
+            occurred_at=occurred_at or now, reported_at=now,
+            # Components only have a name once started
+            name=getattr(component, 'name', None)
+        )
+
+    @classmethod
+    def coerce(cls, error):
+        """
+        :param error: An :class:`~ErrorEvent`, or an ``(expected, action)``
+            tuple as reported by older Components.
+        :return: An :class:`~ErrorEvent`.
+        """
+        if isinstance(error, cls):
+            return error
+        expected, action = error
+        return cls(None, None, None, None, expected, action)
+
+    @property
+    def key(self):
+        """
+        :return: The name of the Component which reported the event, or the
+            name of its class for events without one.
+        """
+        return self.name or self.component
+
+    @property
+    def terminal(self):
+        """
+        :return: True if the Component stopped on the exception, rather
+            than continuing or backing off.
+        """
+        return self.action not in (strategies.CONTINUE, strategies.BACKOFF)
+
+
+def _message(exception):
+    """
+    :return: The exception's message as a string, with unicode messages
+        encoded as UTF-8, or its repr if neither can be worked out.
+    """
+    try:
+        return str(exception)
+    except UnicodeError:
+        pass
+    try:
+        return unicode(exception).encode('utf-8', 'replace')
+    except Exception:
+        return repr(exception)
+
+
+class ErrorRates(object):
+    """
+    Counts the errors reported by each Component, both in total and within
+    a rolling window, from which error rates are worked out. Components are
+    told apart by :attr:`ErrorEvent.key`, so each worker of a pipeline stage
+    is counted on its own.
+    """
+
+    def __init__(self, window=60):
+        """
+        :param window: The number of seconds errors are counted within to
+            work out a rate.
+        """
+        self.window = window
+        self._recent = {}
+        self._totals = {}
+        self._last = {}
+
+    def record(self, event):
+        """
+        :param event: An :class:`~ErrorEvent`.
+        """
+        component = event.key
+        self._recent.setdefault(component, deque()).append(
+            event.occurred_at or time()
+        )
+        self._totals[component] = self._totals.get(component, 0) + 1
+        self._last[component] = event
+        self._expire(component, time())
+
+    def count(self, component):
+        """
+        :param component: The :attr:`~ErrorEvent.key` of a Component.
+        :return: The number of errors it reported within the window.
+        """
+        if component not in self._recent:
+            return 0
+        self._expire(component, time())
+        return len(self._recent[component])
+
+    def rate(self, component):
+        """
+        :param component: The :attr:`~ErrorEvent.key` of a Component.
+        :return: The number of errors per second it reported within the
+            window.
+        """
+        return self.count(component) / float(self.window)
+
+    @property
+    def stats(self):
+        """
+        :return: A dictionary of error statistics per Component, keyed by
+            :attr:`~ErrorEvent.key`. ``errors`` counts every error reported,
+            ``recent`` those within the window and ``rate`` is ``recent``
+            per second, while ``component`` is the name of its class.
+        """
+        stats = {}
+        for component, total in self._totals.iteritems():
+            last = self._last[component]
+            stats[component] = {
+                'component': last.component,
+                'errors': total,
+                'recent': self.count(component),
+                'rate': self.rate(component),
+                'last_exception': last.exception,
+                'last_sqlstate': last.sqlstate,
+                'last_occurred_at': last.occurred_at,
+            }
+        return stats
+
+    def _expire(self, component, now):
+        """
+        Forgets the component's errors which have left the window.
+        """
+        recent = self._recent[component]
+        while recent and recent[0] <= now - self.window:
+            recent.popleft()
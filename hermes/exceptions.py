@@ -5,3 +5,45 @@ Contains all exceptions thrown by Hermes.
 
 class InvalidConfigurationException(Exception):
     pass
+
+
+class PayloadDecodeException(Exception):
+    """
+    Raised by a :class:`~hermes.codecs.AbstractCodec` when a payload cannot
+    be decoded.
+    """
+
+    def __init__(self, payload, error):
+        super(PayloadDecodeException, self).__init__(
+            'Could not decode payload: {}'.format(error)
+        )
+        self.payload = payload
+        self.error = error
+
+
+class ConnectionLostException(Exception):
+    """
+    Raised when a connection to Postgres is found to be dead, for instance
+    by a failed heartbeat.
+    """
+
+    def __init__(self, error):
+        super(ConnectionLostException, self).__init__(
+            'Lost connection to Postgres: {}'.format(error)
+        )
+        self.error = error
+
+
+class BulkRequestException(Exception):
+    """
+    Raised by a :class:`~hermes.sinks.HttpBulkSink` when a bulk request
+    fails as a whole, either on the connection or with an error status.
+    """
+
+    def __init__(self, error, status=None, body=None):
+        super(BulkRequestException, self).__init__(
+            'Bulk request failed: {}'.format(error)
+        )
+        self.error = error
+        self.status = status
+        self.body = body
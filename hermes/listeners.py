@@ -1,6 +1,19 @@
 from Queue import Full
+from contextlib import closing
+
+from psycopg2 import InterfaceError, OperationalError
 
 from components import Component
+from hermes.errors import ErrorEvent
+from publishers import resolve_spilled_payloads
+from hermes.exceptions import (
+    ConnectionLostException, InvalidConfigurationException,
+    PayloadDecodeException
+)
+from hermes import strategies
+
+
+_DROPPED_PAYLOAD = 'Dropped a payload which could not be decoded'
 
 
 class PostgresNotificationListener(Component):
@@ -10,7 +23,9 @@ class PostgresNotificationListener(Component):
     """
 
     def __init__(self, pg_connector, notif_channel, notif_queue,
-                 error_strategy, error_queue, fire_on_start=True):
+                 error_strategy, error_queue, fire_on_start=True,
+                 forward_payloads=False, spill_table=None, codec=None,
+                 batch=False, heartbeat_interval=None):
         """
         :param pg_connector: A :class:`~hermes.connectors.PostgresConnector`
             object
@@ -22,14 +37,48 @@ class PostgresNotificationListener(Component):
             :class:`~hermes.strategies.CommonErrorStrategy` subclass
         :param error_queue: A :class:`~multiprocessing.Queue` to be used for
             error events.
+        :param fire_on_start: If True, puts True onto the notification queue
+            when the listener starts.
+        :param forward_payloads: If True, puts each notification's payload
+            onto the notification queue, blocking while the queue is full.
+            Otherwise True is put, and dropped if the queue is full.
+        :param spill_table: The spill table of a
+            :class:`~hermes.publishers.NotificationPublisher`. If set,
+            forwarded payloads which reference spilled rows are resolved.
+        :param codec: A :class:`~hermes.codecs.AbstractCodec` used to decode
+            forwarded payloads. Payloads which cannot be decoded are dropped
+            and reported on the error queue, without restarting the
+            listener.
+        :param batch: If True, all payloads received by a single poll are
+            put onto the notification queue as one list.
+        :param heartbeat_interval: If set, a heartbeat query is run after
+            this many seconds without a notification. A dead connection
+            then raises :class:`~hermes.exceptions.ConnectionLostException`
+            rather than leaving the listener waiting forever. Pair it with
+            the connector's ``keepalive`` option to bound how long the
+            heartbeat itself can hang.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            a codec or batching is requested without forwarding payloads.
         """
+        if (codec is not None or batch) and not forward_payloads:
+            raise InvalidConfigurationException(
+                "A codec and batching require forward_payloads"
+            )
+        # The connection is opened in set_up, within the listener's own
+        # process, rather than inherited from the one creating it
         super(PostgresNotificationListener, self).__init__(
-            pg_connector.pg_connection, error_strategy, error_queue
+            None, error_strategy, error_queue,
+            idle_timeout=heartbeat_interval
         )
         self._fire_on_start = fire_on_start
         self.notif_channel = notif_channel
         self.notif_queue = notif_queue
         self.pg_connector = pg_connector
+        self._forward_payloads = forward_payloads
+        self._spill_table = spill_table
+        self._codec = codec
+        self._batch = batch
 
     def set_up(self):
         super(PostgresNotificationListener, self).set_up()
@@ -45,7 +94,35 @@ class PostgresNotificationListener(Component):
             except Full:
                 pass
 
+    def on_idle(self):
+        """
+        Runs a heartbeat query on the listening connection.
+        """
+        try:
+            with closing(self.notification_pipe.cursor()) as cursor:
+                cursor.execute('SELECT 1;')
+        except (InterfaceError, OperationalError) as e:
+            raise ConnectionLostException(e)
+
+        # Notifications read along with the heartbeat's result will not
+        # make the connection selectable again
+        if self.notification_pipe.notifies:
+            self.post_execute(self.execute(self.pre_execute()))
+
     def execute(self, pre_exec_value):
+        try:
+            self._read_notifications()
+        except (InterfaceError, OperationalError) as e:
+            if self.notification_pipe is not None and \
+                    self.notification_pipe.closed:
+                raise ConnectionLostException(e)
+            raise
+
+    def _read_notifications(self):
+        if self._forward_payloads:
+            self._forward_notifications()
+            return
+
         self.pg_connector.pg_connection.poll()
         while self.pg_connector.pg_connection.notifies:
             self.pg_connector.pg_connection.notifies.pop()
@@ -54,6 +131,55 @@ class PostgresNotificationListener(Component):
             except Full:
                 pass
 
+    def _forward_notifications(self):
+        """
+        Puts the payloads of all pending notifications onto the queue, in
+        the order they were received.
+        """
+        payloads = [
+            notify.payload
+            for notify in self.pg_connector.poll_notifications()
+        ]
+
+        if self._spill_table:
+            payloads = resolve_spilled_payloads(
+                self.pg_connector, self._spill_table, payloads
+            )
+
+        if self._codec is not None:
+            payloads = self._decode(payloads)
+
+        if self._batch:
+            if payloads:
+                self.notif_queue.put(payloads)
+        else:
+            for payload in payloads:
+                self.notif_queue.put(payload)
+
+    def _decode(self, payloads):
+        """
+        Decodes all payloads with a single call to the codec, falling back
+        to decoding them one at a time to isolate any malformed payloads.
+        """
+        try:
+            return self._codec.decode_batch(payloads)
+        except PayloadDecodeException:
+            pass
+
+        decoded = []
+        for payload in payloads:
+            try:
+                decoded.append(self._codec.decode(payload))
+            except PayloadDecodeException as e:
+                # Handled here rather than by the error strategy, so the
+                # other payloads are still forwarded and the error is only
+                # counted once
+                self.log.warning(_DROPPED_PAYLOAD, exc_info=True)
+                self.error_queue.put(ErrorEvent.from_exception(
+                    self, e, True, strategies.CONTINUE
+                ))
+        return decoded
+
     def tear_down(self):
         super(PostgresNotificationListener, self).tear_down()
         self.pg_connector.disconnect()
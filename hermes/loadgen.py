@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+A command-line NOTIFY load generator used to size listener deployments.
+
+Emits ``pg_notify`` calls at a target rate from one or more worker processes
+and reports the achieved send rate once finished::
+
+    hermes-loadgen --database example_db --rate 5000 --payload-size 256 \\
+        --channels 4 --batch-size 50 --concurrency 2 --duration 30
+"""
+from argparse import ArgumentParser
+from itertools import count
+from multiprocessing import Process, Queue
+from time import sleep, time
+import sys
+
+from hermes.connectors import PostgresConnector
+from hermes.publishers import NotificationPublisher
+
+
+_REPORT = (
+    'Sent {sent} notifications in {elapsed:.2f}s '
+    '({rate:.1f}/s, target {target})\n'
+)
+
+
+def build_parser():
+    """
+    :return: The :class:`~argparse.ArgumentParser` for the load generator.
+    """
+    parser = ArgumentParser(
+        description='Emit Postgres notifications at a target rate.'
+    )
+    parser.add_argument('--database', default='postgres')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--user', default=None)
+    parser.add_argument('--password', default=None)
+    parser.add_argument(
+        '-r', '--rate', type=float, default=1000,
+        help='Total notifications per second, 0 for unlimited'
+    )
+    parser.add_argument(
+        '-s', '--payload-size', type=int, default=32,
+        help='Size of each payload in bytes'
+    )
+    parser.add_argument(
+        '-c', '--channels', type=int, default=1,
+        help='Number of channels to fan notifications out to'
+    )
+    parser.add_argument(
+        '--channel-prefix', default='hermes_load',
+        help='Channels are named <prefix>_<n>'
+    )
+    parser.add_argument(
+        '-b', '--batch-size', type=int, default=1,
+        help='Notifications sent per transaction'
+    )
+    parser.add_argument(
+        '-j', '--concurrency', type=int, default=1,
+        help='Number of sending processes'
+    )
+    parser.add_argument(
+        '-d', '--duration', type=float, default=10,
+        help='Seconds to run for'
+    )
+    parser.add_argument(
+        '-n', '--count', type=int, default=None,
+        help='Stop after this many notifications in total'
+    )
+    return parser
+
+
+def make_payload(sequence, size):
+    """
+    Builds a payload of exactly ``size`` bytes (or the length of the
+    sequence prefix, if larger). Payloads must be unique, as Postgres folds
+    identical notifications sent within a single transaction.
+
+    :param sequence: A unique, per-worker sequence string.
+    :param size: The desired payload size in bytes.
+    """
+    prefix = '{}:'.format(sequence)
+    return prefix + 'x' * max(size - len(prefix), 0)
+
+
+def send_notifications(dsn, options, worker_no, result_queue):
+    """
+    Sends notifications in batches of ``options.batch_size`` at this
+    worker's share of the target rate, then puts a ``(sent, elapsed)`` tuple
+    on the result queue.
+
+    Batches are scheduled against the start time rather than the previous
+    send, so a slow round trip is caught up on instead of lowering the rate.
+    """
+    connector = PostgresConnector(dsn)
+    publisher = NotificationPublisher(
+        connector, batch_size=options.batch_size, spill_table=None
+    )
+    channels = [
+        '{}_{}'.format(options.channel_prefix, channel_no)
+        for channel_no in xrange(options.channels)
+    ]
+    limit = None
+    if options.count is not None:
+        limit = options.count // options.concurrency
+        if worker_no < options.count % options.concurrency:
+            limit += 1
+
+    worker_rate = options.rate / float(options.concurrency)
+    sequence = count()
+    sent = 0
+    started = time()
+    deadline = started + options.duration
+
+    try:
+        while time() < deadline and (limit is None or sent < limit):
+            batch_size = options.batch_size
+            if limit is not None:
+                batch_size = min(batch_size, limit - sent)
+
+            for _ in xrange(batch_size):
+                seq_no = next(sequence)
+                publisher.publish(
+                    channels[seq_no % len(channels)],
+                    make_payload('{}-{}'.format(worker_no, seq_no),
+                                 options.payload_size)
+                )
+            publisher.flush()
+            sent += batch_size
+
+            if worker_rate > 0:
+                wait = started + sent / worker_rate - time()
+                if wait > 0:
+                    sleep(wait)
+    finally:
+        result_queue.put((sent, time() - started))
+        connector.disconnect()
+
+
+def main(argv=None):
+    """
+    Entry point for the ``hermes-loadgen`` command.
+    """
+    options = build_parser().parse_args(argv)
+    dsn = {'database': options.database,
+           'host': options.host,
+           'port': options.port}
+    if options.user:
+        dsn['user'] = options.user
+    if options.password:
+        dsn['password'] = options.password
+
+    result_queue = Queue()
+    workers = [
+        Process(target=send_notifications,
+                args=(dsn, options, worker_no, result_queue))
+        for worker_no in xrange(options.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+
+    results = [result_queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    sent = sum(worker_sent for worker_sent, _ in results)
+    elapsed = max(worker_elapsed for _, worker_elapsed in results)
+    sys.stdout.write(_REPORT.format(
+        sent=sent, elapsed=elapsed, rate=sent / elapsed if elapsed else 0.0,
+        target=options.rate or 'unlimited'
+    ))
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
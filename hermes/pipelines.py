@@ -0,0 +1,182 @@
+"""
+Multi-stage pipelines of Components connected by bounded queues.
+"""
+from Queue import Empty, Full
+from multiprocessing.queues import Queue
+from time import time
+
+from hermes.components import Component
+from hermes.exceptions import InvalidConfigurationException
+
+
+# Seconds a blocked put waits before checking the Stage should still run
+_PUT_TIMEOUT = 1
+
+
+class Stage(Component):
+    """
+    A Component which takes items from an input queue, one per
+    notification, passes each to :func:`~process` and puts the result onto
+    its output queue. Callers must implement :func:`~process`.
+
+    The output queue is bounded, so a Stage blocks while the next one is
+    behind. That backpressure travels up the pipeline to the listener.
+    """
+
+    def __init__(self, input_queue, output_queue, error_strategy,
+                 error_queue, backoff_limit=16, execute_timeout=None,
+                 backoff=None):
+        """
+        :param input_queue: The :class:`~multiprocessing.Queue` to take
+            items from.
+        :param output_queue: The :class:`~multiprocessing.Queue` to put
+            results onto, or None for the last stage of a pipeline.
+        :param error_strategy: See :class:`~hermes.components.Component`.
+        :param error_queue: See :class:`~hermes.components.Component`.
+        :param backoff_limit: See :class:`~hermes.components.Component`.
+        :param execute_timeout: See :class:`~hermes.components.Component`.
+        :param backoff: See :class:`~hermes.components.Component`.
+        """
+        super(Stage, self).__init__(
+            input_queue._reader, error_strategy, error_queue,
+            backoff_limit=backoff_limit, execute_timeout=execute_timeout,
+            backoff=backoff
+        )
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+
+    def process(self, item):
+        """
+        Must be overridden by callers.
+
+        :param item: An item taken from the input queue.
+        :return: The item to pass on to the next stage, or None to pass
+            nothing on.
+        """
+        raise NotImplementedError(
+            "Subclasses MUST override the 'process' method"
+        )
+
+    def execute(self, pre_exec_value):
+        # Workers of the same stage share the input queue, so another may
+        # have taken the item already
+        try:
+            item = self.input_queue.get_nowait()
+        except Empty:
+            return
+
+        result = self.process(item)
+        if result is not None and self.output_queue is not None:
+            self._put(result)
+
+    def _put(self, result):
+        """
+        Puts the result onto the output queue, blocking while it is full
+        unless the Stage is asked to stop.
+        """
+        # Waiting on the next stage is backpressure rather than a hang
+        busy_since = self._busy_since.value
+        blocked_at = time()
+        self._busy_since.value = 0
+        try:
+            while self._should_run:
+                try:
+                    self.output_queue.put(result, timeout=_PUT_TIMEOUT)
+                    return
+                except Full:
+                    continue
+        finally:
+            # The time spent blocked does not count towards the execute
+            # timeout once the Stage is busy again either
+            if busy_since:
+                busy_since += time() - blocked_at
+            self._busy_since.value = busy_since
+
+
+class Pipeline(object):
+    """
+    A chain of :class:`~Stage` objects, each stage running as one or more
+    worker processes. Stages are connected by bounded queues, so CPU-heavy
+    stages can overlap with I/O-heavy ones while a slow stage holds back
+    everything upstream of it.
+
+    A pipeline is given to a :class:`~hermes.client.Client` in place of a
+    processor, which then supervises every worker.
+    """
+
+    def __init__(self, input_queue, error_queue, queue_size=100):
+        """
+        To decode and enrich notifications in two processes while writing
+        them out in four::
+
+            pipeline = Pipeline(notif_queue, error_queue)
+            pipeline.add_stage(Enricher, CommonErrorStrategy(), workers=2)
+            pipeline.add_stage(Writer, CommonErrorStrategy(), workers=4,
+                               backoff_limit=32)
+
+            client.add_listener(listener)
+            client.add_pipeline(pipeline)
+
+        :param input_queue: The :class:`~multiprocessing.Queue` the first
+            stage takes items from, usually a listener's notification
+            queue.
+        :param error_queue: A :class:`~multiprocessing.Queue`-like object
+            shared by every stage to inform the
+            :class:`~hermes.client.Client` through.
+        :param queue_size: The maximum number of items waiting between two
+            stages.
+        """
+        self.input_queue = input_queue
+        self.error_queue = error_queue
+        self._queue_size = queue_size
+        self._stages = []
+        self._components = None
+
+    def add_stage(self, stage_class, error_strategy, workers=1, **kwargs):
+        """
+        Appends a stage to the end of the pipeline.
+
+        :param stage_class: A :class:`~Stage` subclass, constructed once per
+            worker.
+        :param error_strategy: See :class:`~hermes.components.Component`.
+        :param workers: The number of processes running the stage.
+        :param kwargs: Extra keyword arguments for ``stage_class``.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            the stage class is not a :class:`~Stage` or there are fewer than
+            one worker.
+        """
+        if not (isinstance(stage_class, type) and
+                issubclass(stage_class, Stage)):
+            raise InvalidConfigurationException(
+                "Stage class must be a subclass of Stage"
+            )
+        if workers < 1:
+            raise InvalidConfigurationException(
+                "A stage must have at least one worker"
+            )
+        self._stages.append((stage_class, error_strategy, workers, kwargs))
+        self._components = None
+
+    @property
+    def components(self):
+        """
+        :return: A list of the stage workers, from the first stage to the
+            last. They are constructed once, on first access.
+        """
+        if self._components is None:
+            self._components = []
+            input_queue = self.input_queue
+            for index, stage in enumerate(self._stages):
+                stage_class, error_strategy, workers, kwargs = stage
+                output_queue = None
+                if index < len(self._stages) - 1:
+                    output_queue = Queue(self._queue_size)
+
+                self._components.extend(
+                    stage_class(input_queue, output_queue, error_strategy,
+                                self.error_queue, **kwargs)
+                    for _ in xrange(workers)
+                )
+                input_queue = output_queue
+        return self._components
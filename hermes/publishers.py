@@ -0,0 +1,204 @@
+from contextlib import closing
+from uuid import uuid4
+
+
+#: Postgres rejects payloads of 8000 bytes or more.
+MAX_PAYLOAD_SIZE = 7999
+#: Prefix of a payload which references a row in the spill table.
+SPILL_PREFIX = 'hermes-spill:'
+
+_NOTIFY_SQL = (
+    'SELECT pg_notify(n.channel, n.payload) '
+    'FROM unnest(%s::text[], %s::text[]) AS n(channel, payload);'
+)
+_SPILL_SQL = (
+    'INSERT INTO {} (key, payload) '
+    'SELECT * FROM unnest(%s::text[], %s::text[]);'
+)
+
+
+class NotificationPublisher(object):
+    """
+    The sending counterpart to
+    :class:`~hermes.listeners.PostgresNotificationListener`. Buffers
+    notifications and sends them to Postgres in batches, one round trip and
+    one transaction per batch.
+
+    Payloads too large for ``NOTIFY`` are written to a spill table instead,
+    and a reference to the row is sent in their place. A listener created
+    with the same ``spill_table`` resolves these references transparently.
+    """
+
+    def __init__(self, pg_connector, batch_size=500,
+                 spill_table='hermes_notification_spill',
+                 max_payload_size=MAX_PAYLOAD_SIZE, codec=None):
+        """
+        Publishing notifications is done like so::
+
+            from hermes.connectors import PostgresConnector
+            from hermes.publishers import NotificationPublisher
+
+            publisher = NotificationPublisher(PostgresConnector(dsn))
+            publisher.create_spill_table()
+
+            with publisher:
+                for document in documents:
+                    publisher.publish('documents', document)
+
+        :param pg_connector: A :class:`~hermes.connectors.PostgresConnector`
+            object
+        :param batch_size: The number of buffered notifications which will
+            cause :func:`~flush` to be called automatically.
+        :param spill_table: The name of the table oversized payloads are
+            written to. If None, oversized payloads raise a ValueError.
+        :param max_payload_size: The size in bytes above which a payload is
+            spilled.
+        :param codec: A :class:`~hermes.codecs.AbstractCodec` used to encode
+            payloads. If None, payloads must be strings.
+        """
+        self.pg_connector = pg_connector
+        self.spill_table = spill_table
+
+        self._batch_size = batch_size
+        self._max_payload_size = max_payload_size
+        self._codec = codec
+        self._channels = []
+        self._payloads = []
+        self._spilled = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
+
+    def create_spill_table(self):
+        """
+        Creates the spill table, unless it already exists.
+        """
+        self.pg_connector.pg_cursor.execute(
+            'CREATE TABLE IF NOT EXISTS {} ('
+            'key text PRIMARY KEY, '
+            'payload text NOT NULL, '
+            'created_at timestamptz NOT NULL DEFAULT now());'.format(
+                self.spill_table
+            )
+        )
+
+    def publish(self, channel, payload=''):
+        """
+        Buffers a notification, flushing the buffer if it is full.
+
+        :param channel: The channel to notify.
+        :param payload: The payload to send.
+        """
+        if self._codec is not None:
+            payload = self._codec.encode(payload)
+
+        encoded = payload
+        if isinstance(payload, unicode):
+            encoded = payload.encode('utf-8')
+
+        if len(encoded) > self._max_payload_size:
+            if not self.spill_table:
+                raise ValueError(
+                    'Payload of {} bytes is too large to send'.format(
+                        len(encoded)
+                    )
+                )
+            key = uuid4().hex
+            self._spilled.append((key, payload))
+            payload = SPILL_PREFIX + key
+
+        self._channels.append(channel)
+        self._payloads.append(payload)
+
+        if len(self._payloads) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends all buffered notifications.
+
+        Spilled payloads and notifications are sent as a single multi-statement
+        query, which Postgres runs in one implicit transaction: listeners are
+        never notified of a spilled row that has not been committed.
+
+        :return: The number of notifications sent.
+        """
+        if not self._payloads:
+            return 0
+
+        cursor = self.pg_connector.pg_cursor
+        sql = cursor.mogrify(_NOTIFY_SQL, (self._channels, self._payloads))
+        if self._spilled:
+            keys, payloads = zip(*self._spilled)
+            spill_sql = _SPILL_SQL.format(self.spill_table)
+            sql = cursor.mogrify(
+                spill_sql, (list(keys), list(payloads))
+            ) + sql
+        cursor.execute(sql)
+
+        sent = len(self._payloads)
+        self.discard()
+        return sent
+
+    def discard(self):
+        """
+        Drops all buffered notifications without sending them.
+        """
+        self._channels = []
+        self._payloads = []
+        self._spilled = []
+
+    def purge_spilled(self, older_than='1 hour'):
+        """
+        Deletes spilled payloads. Rows are not deleted when read, as many
+        listeners may receive the same notification.
+
+        :param older_than: A Postgres interval string. Rows created before
+            this long ago are deleted.
+        """
+        self.pg_connector.pg_cursor.execute(
+            'DELETE FROM {} WHERE created_at < now() - %s::interval;'.format(
+                self.spill_table
+            ),
+            (older_than, )
+        )
+
+
+def resolve_spilled_payloads(pg_connector, spill_table, payloads):
+    """
+    Replaces spill references within a list of payloads with the spilled
+    payloads, fetching all of them in a single query.
+
+    :param pg_connector: A :class:`~hermes.connectors.PostgresConnector`
+        object
+    :param spill_table: The table the publisher spilled payloads to.
+    :param payloads: A list of notification payloads.
+    :return: A list of resolved payloads, in the order given.
+    """
+    keys = [
+        payload[len(SPILL_PREFIX):] for payload in payloads
+        if payload.startswith(SPILL_PREFIX)
+    ]
+    if not keys:
+        return payloads
+
+    with closing(pg_connector.pg_connection.cursor()) as cursor:
+        cursor.execute(
+            'SELECT key, payload FROM {} WHERE key = ANY(%s);'.format(
+                spill_table
+            ),
+            (keys, )
+        )
+        spilled = dict(cursor.fetchall())
+
+    return [
+        spilled.get(payload[len(SPILL_PREFIX):], payload)
+        if payload.startswith(SPILL_PREFIX) else payload
+        for payload in payloads
+    ]
@@ -0,0 +1,416 @@
+"""
+Sinks which write the items reaching the end of a pipeline in batches.
+"""
+from Queue import Empty, Queue
+from httplib import HTTPConnection, HTTPException, HTTPSConnection
+import json
+import select
+import socket
+import sys
+from threading import Thread
+from time import time
+from urlparse import urlsplit
+import zlib
+
+from hermes.codecs import JsonCodec
+from hermes.exceptions import (
+    BulkRequestException, InvalidConfigurationException
+)
+from hermes.pipelines import Stage
+from hermes.triggers import DeadlineTrigger
+
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class BatchingSink(Stage):
+    """
+    A :class:`~hermes.pipelines.Stage` which buffers the items it receives
+    and writes them in batches, flushing once a batch holds ``max_items``
+    items or ``max_bytes`` bytes, or its oldest item is ``max_age`` seconds
+    old. Callers must implement :func:`~write`.
+
+    Only one batch is ever in flight. If writing it raises, the exception
+    is passed to the error strategy and the same batch is written again
+    when the sink restarts, before anything else. Each batch is passed to
+    :func:`~acknowledge` only once it has been written.
+    """
+
+    def __init__(self, input_queue, output_queue, error_strategy,
+                 error_queue, max_items=500, max_bytes=None, max_age=1,
+                 pipelined=False, backoff_limit=16, execute_timeout=None,
+                 backoff=None):
+        """
+        :param input_queue: See :class:`~hermes.pipelines.Stage`.
+        :param output_queue: See :class:`~hermes.pipelines.Stage`. Written
+            batches are put onto it, if given.
+        :param error_strategy: See :class:`~hermes.components.Component`.
+        :param error_queue: See :class:`~hermes.components.Component`.
+        :param max_items: The number of items which triggers a flush.
+        :param max_bytes: The total :func:`~item_size` of buffered items
+            which triggers a flush. If None, size is not considered.
+        :param max_age: The number of seconds an item may wait before a
+            flush is triggered. If None, age is not considered.
+        :param pipelined: If True, a batch is written from a background
+            thread while the next one fills up.
+        :param backoff_limit: See :class:`~hermes.components.Component`.
+        :param execute_timeout: See :class:`~hermes.components.Component`.
+        :param backoff: See :class:`~hermes.components.Component`.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            ``max_items`` is less than one.
+        """
+        if max_items < 1:
+            raise InvalidConfigurationException(
+                "A batch must hold at least one item"
+            )
+        super(BatchingSink, self).__init__(
+            input_queue, output_queue, error_strategy, error_queue,
+            backoff_limit=backoff_limit, execute_timeout=execute_timeout,
+            backoff=backoff
+        )
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._pipelined = pipelined
+
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._buffered_since = None
+        self._in_flight = None
+        self._flush_thread = None
+        self._flush_error = None
+
+        if max_age is not None:
+            self.schedule(DeadlineTrigger(self._flush_deadline),
+                          self._flush_expired)
+
+    def write(self, batch):
+        """
+        Must be overridden by callers.
+
+        :param batch: A list of items to write to the target.
+        """
+        raise NotImplementedError(
+            "Subclasses MUST override the 'write' method"
+        )
+
+    def acknowledge(self, batch):
+        """
+        Called once a batch has been written. Can be safely overridden by
+        callers, for instance to mark the batch's rows as delivered.
+
+        By default, puts the batch onto the output queue, if there is one.
+
+        :param batch: The list of items which was written.
+        """
+        if self.output_queue is not None:
+            self._put(batch)
+
+    def item_size(self, item):
+        """
+        Can be safely overridden by callers.
+
+        :return: The number of bytes the item adds to a batch.
+        """
+        return len(item)
+
+    def process(self, item):
+        if not self._buffer:
+            self._buffered_since = time()
+        self._buffer.append(item)
+        if self._max_bytes is not None:
+            self._buffered_bytes += self.item_size(item)
+
+        if (len(self._buffer) >= self._max_items or
+                (self._max_bytes is not None and
+                 self._buffered_bytes >= self._max_bytes)):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered items, first waiting for (or retrying) the batch
+        already in flight.
+        """
+        self._finish_in_flight()
+        if not self._buffer:
+            return
+
+        self._in_flight = self._buffer
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._buffered_since = None
+
+        if self._pipelined:
+            self._flush_thread = Thread(target=self._write_in_background)
+            self._flush_thread.daemon = True
+            self._flush_thread.start()
+        else:
+            self._write_in_flight()
+
+    def set_up(self):
+        super(BatchingSink, self).set_up()
+        # A batch which failed before the restart is written first
+        self._finish_in_flight()
+
+    def _execute(self):
+        try:
+            super(BatchingSink, self)._execute()
+        except select.error:
+            # A stop signal interrupts select, so the sink is still flushed
+            # when one arrives while it waits
+            if self._should_run:
+                raise
+        # Only reached when the sink is stopped, rather than on an error
+        self.flush()
+        self._finish_in_flight()
+
+    def _flush_deadline(self, now):
+        """
+        :return: The time the oldest buffered item reaches ``max_age``, or
+            ``max_age`` from now if the buffer is empty.
+        """
+        return (self._buffered_since or now) + self._max_age
+
+    def _flush_expired(self):
+        """
+        Flushes the buffer if its oldest item has reached ``max_age``.
+        """
+        if (self._buffered_since is not None and
+                time() - self._buffered_since >= self._max_age):
+            self.flush()
+
+    def _finish_in_flight(self):
+        """
+        Waits for a background write to finish, re-raising its exception,
+        and retries the batch in flight if it has not been written.
+        """
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+
+            if self._flush_error is not None:
+                error, self._flush_error = self._flush_error, None
+                raise error[0], error[1], error[2]
+
+        if self._in_flight is not None:
+            self._write_in_flight()
+
+    def _write_in_flight(self):
+        self.write(self._in_flight)
+        batch, self._in_flight = self._in_flight, None
+        self.acknowledge(batch)
+
+    def _write_in_background(self):
+        try:
+            self._write_in_flight()
+        except Exception:
+            self._flush_error = sys.exc_info()
+
+
+class HttpBulkSink(BatchingSink):
+    """
+    A :class:`~BatchingSink` which POSTs each batch as a newline delimited
+    JSON body, in the style of the `Elasticsearch bulk API
+    <https://www.elastic.co/guide/en/elasticsearch/reference/current/
+    docs-bulk.html>`_, over persistent keep-alive connections.
+
+    A batch can be split into several requests which are sent concurrently,
+    each over its own connection. A request which fails as a whole raises
+    :class:`~hermes.exceptions.BulkRequestException`, so the batch is
+    retried. Items rejected individually by a bulk response are passed to
+    :func:`~on_item_error` instead.
+    """
+
+    def __init__(self, input_queue, output_queue, error_strategy,
+                 error_queue, url, codec=None, compress=False,
+                 concurrency=1, request_items=None, timeout=30,
+                 headers=None, **kwargs):
+        """
+        :param input_queue: See :class:`~hermes.pipelines.Stage`.
+        :param output_queue: See :class:`~hermes.pipelines.Stage`.
+        :param error_strategy: See :class:`~hermes.components.Component`.
+        :param error_queue: See :class:`~hermes.components.Component`.
+        :param url: The http or https URL to POST batches to, for example
+            ``'http://localhost:9200/_bulk'``.
+        :param codec: A :class:`~hermes.codecs.AbstractCodec` used to encode
+            each line of the body. Defaults to
+            :class:`~hermes.codecs.JsonCodec`.
+        :param compress: If True, request bodies are gzipped.
+        :param concurrency: The maximum number of requests in flight at
+            once, and so the number of connections kept open.
+        :param request_items: The maximum number of items sent in a single
+            request. If None, each batch is sent in one request.
+        :param timeout: The number of seconds to wait on a connection.
+        :param headers: A dictionary of extra request headers.
+        :param kwargs: See :class:`~BatchingSink`.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            the URL is not http or https, or concurrency is less than one.
+        """
+        super(HttpBulkSink, self).__init__(
+            input_queue, output_queue, error_strategy, error_queue, **kwargs
+        )
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise InvalidConfigurationException(
+                "Bulk URL must be http or https: {!r}".format(url)
+            )
+        if concurrency < 1:
+            raise InvalidConfigurationException(
+                "Concurrency must be at least one"
+            )
+
+        self._connection_class = (
+            HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        )
+        self._host = parts.netloc
+        self._path = parts.path or '/'
+        if parts.query:
+            self._path += '?' + parts.query
+
+        self._codec = codec or JsonCodec()
+        self._compress = compress
+        self._concurrency = concurrency
+        self._request_items = request_items
+        self._timeout = timeout
+
+        self._headers = {'Content-Type': 'application/x-ndjson'}
+        if compress:
+            self._headers['Content-Encoding'] = 'gzip'
+        self._headers.update(headers or {})
+
+        # Connections are opened on first use, within the sink's process
+        self._connections = [None] * concurrency
+
+    def lines(self, item):
+        """
+        Can be safely overridden by callers, for instance to precede each
+        document with a bulk action line.
+
+        :return: A list of the values making up the item's lines.
+        """
+        return [item]
+
+    def on_item_error(self, item, result):
+        """
+        Called for each item a bulk response reports as failed. Can be
+        safely overridden by callers, for instance to dead-letter the item.
+        With ``concurrency`` above one it may be called from several
+        threads at once.
+
+        By default, logs a warning.
+
+        :param item: The item which failed.
+        :param result: The item's entry in the bulk response.
+        """
+        self.log.warning('Bulk item rejected: {}'.format(result))
+
+    def write(self, batch):
+        size = self._request_items or len(batch)
+        chunks = [batch[i:i + size] for i in xrange(0, len(batch), size)]
+
+        if len(chunks) == 1 or self._concurrency == 1:
+            for chunk in chunks:
+                self._send(0, chunk)
+        else:
+            self._send_concurrently(chunks)
+
+    def tear_down(self):
+        super(HttpBulkSink, self).tear_down()
+        for index, connection in enumerate(self._connections):
+            if connection is not None:
+                connection.close()
+                self._connections[index] = None
+
+    def _send_concurrently(self, chunks):
+        """
+        Sends the chunks over up to ``concurrency`` connections at once,
+        raising the first exception encountered once all have finished.
+        """
+        pending = Queue()
+        for chunk in chunks:
+            pending.put(chunk)
+        errors = []
+
+        def send_pending(index):
+            while not errors:
+                try:
+                    chunk = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    self._send(index, chunk)
+                except Exception:
+                    errors.append(sys.exc_info())
+
+        threads = [
+            Thread(target=send_pending, args=(index, ))
+            for index in xrange(min(self._concurrency, len(chunks)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            error = errors[0]
+            raise error[0], error[1], error[2]
+
+    def _send(self, index, chunk):
+        """
+        POSTs a chunk over the index'th connection, retrying once on a new
+        connection in case the server closed the kept-alive one.
+        """
+        body = self._body(chunk)
+        for attempt in xrange(2):
+            if self._connections[index] is None:
+                self._connections[index] = self._connection_class(
+                    self._host, timeout=self._timeout
+                )
+            connection = self._connections[index]
+            try:
+                connection.request('POST', self._path, body, self._headers)
+                response = connection.getresponse()
+                response_body = response.read()
+                break
+            except (HTTPException, socket.error) as e:
+                connection.close()
+                self._connections[index] = None
+                if attempt:
+                    raise BulkRequestException(e)
+
+        if response.status >= 300:
+            raise BulkRequestException(
+                response.reason, response.status, response_body
+            )
+        self._check_items(chunk, response_body)
+
+    def _body(self, chunk):
+        encode = self._codec.encode
+        body = ''.join(
+            encode(line) + '\n' for item in chunk for line in self.lines(item)
+        )
+        if self._compress:
+            compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, _GZIP_WBITS
+            )
+            body = compressor.compress(body) + compressor.flush()
+        return body
+
+    def _check_items(self, chunk, response_body):
+        """
+        Passes each item a bulk response reports as failed to
+        :func:`~on_item_error`.
+        """
+        try:
+            result = json.loads(response_body)
+        except ValueError:
+            return
+        if not isinstance(result, dict) or not result.get('errors'):
+            return
+
+        for item, outcome in zip(chunk, result.get('items', ())):
+            for action in outcome.itervalues():
+                if action.get('status', 200) >= 300:
+                    self.on_item_error(item, outcome)
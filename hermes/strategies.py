@@ -1,5 +1,13 @@
+from multiprocessing import Array, Lock, Value
+from os import getpid
+from time import time
+
 from psycopg2 import InterfaceError, DatabaseError, OperationalError
 
+from hermes.exceptions import (
+    BulkRequestException, ConnectionLostException, PayloadDecodeException
+)
+
 
 CONTINUE, BACKOFF, TERMINATE = 1, 2, 3
 
@@ -19,27 +27,281 @@ class AbstractErrorStrategy(object):
         raise NotImplementedError("Subclasses MUST override the "
                                   "'handle_exception' method")
 
+    def handle_success(self):
+        """
+        Called when a Component first handles a notification, idle call or
+        scheduled task after starting, pausing or an exception. Can be
+        safely overridden by subclasses.
+        """
+        pass
+
+    def pause_time(self):
+        """
+        Called before a Component sets up, including after each exception
+        it continues or backs off from. Can be safely overridden by
+        subclasses.
+
+        :return: The number of seconds the Component should pause for
+            before trying again, or 0 if it may run.
+        """
+        return 0
+
 
 class CommonErrorStrategy(AbstractErrorStrategy):
     """
-    A common error strategy to deal with Postgres errors
+    A common error strategy to deal with Postgres errors. Payloads which
+    cannot be decoded are skipped, while lost connections and failed bulk
+    requests are backed off.
+
+    Postgres errors are classified by their SQLSTATE, most specific code
+    first and then its two-character class. Transient errors are retried
+    straight away or backed off rather than restarting the Component:
+    serialization failures and deadlocks are retried, while connection
+    errors, shutdowns, exhausted resources, lock timeouts and cancelled
+    statements are backed off. Decisions are cached per exception type
+    and SQLSTATE.
+    """
+
+    BACKOFFABLE_MESSAGE = ('terminated abnormally', 'libpq')
+
+    EXCEPTION_ACTIONS = (
+        (PayloadDecodeException, CONTINUE),
+        (ConnectionLostException, BACKOFF),
+        (BulkRequestException, BACKOFF),
+        (InterfaceError, TERMINATE),
+    )
+
+    SQLSTATE_ACTIONS = {
+        '08': BACKOFF,  # Connection exception
+        '40': CONTINUE,  # Transaction rollback, such as a deadlock
+        '53': BACKOFF,  # Insufficient resources
+        '55P03': BACKOFF,  # Lock not available
+        '57014': BACKOFF,  # Query canceled, such as by statement_timeout
+        '57P01': BACKOFF,  # Admin shutdown
+        '57P02': BACKOFF,  # Crash shutdown
+        '57P03': BACKOFF,  # Cannot connect now
+    }
+
+    def __init__(self, exception_actions=None, sqlstate_actions=None):
+        """
+        To back off on unique violations, and terminate on a custom
+        exception::
+
+            strategy = CommonErrorStrategy(
+                exception_actions=[(ReindexRequired, TERMINATE)],
+                sqlstate_actions={'23505': BACKOFF}
+            )
+
+        :param exception_actions: A list of ``(exception class, action)``
+            pairs, checked in order before :attr:`EXCEPTION_ACTIONS`.
+        :param sqlstate_actions: A dictionary of SQLSTATE codes or classes
+            to actions, which extends and overrides
+            :attr:`SQLSTATE_ACTIONS`.
+        """
+        self._exception_actions = (
+            tuple(exception_actions or ()) + self.EXCEPTION_ACTIONS
+        )
+        self._sqlstate_actions = dict(self.SQLSTATE_ACTIONS)
+        self._sqlstate_actions.update(sqlstate_actions or {})
+        self._decisions = {}
+
+    def handle_exception(self, error):
+        sqlstate = getattr(error, 'pgcode', None)
+        key = (type(error), sqlstate)
+        try:
+            decision = self._decisions[key]
+        except KeyError:
+            decision = self._decisions[key] = self._classify(
+                type(error), sqlstate
+            )
+        if decision is not None:
+            return decision
+
+        # A Postgres error the SQLSTATE says nothing about, such as a
+        # connection lost before the server could reply
+        msg = error.message or error.pgerror
+        if msg and any(m in msg for m in self.BACKOFFABLE_MESSAGE):
+            return True, BACKOFF
+        return True, TERMINATE
+
+    def _classify(self, error_class, sqlstate):
+        """
+        :return: The decision for an exception class and SQLSTATE, or None
+            if it depends on the exception's message.
+        """
+        for exception_class, action in self._exception_actions:
+            if issubclass(error_class, exception_class):
+                return True, action
+
+        if not issubclass(error_class, (DatabaseError, OperationalError)):
+            return False, TERMINATE
+
+        if sqlstate:
+            for code in (sqlstate, sqlstate[:2]):
+                if code in self._sqlstate_actions:
+                    return True, self._sqlstate_actions[code]
+        return None
+
+
+class CircuitBreakerStrategy(AbstractErrorStrategy):
+    """
+    Wraps another error strategy, and stops every Component sharing it
+    from running while a dependency is failing.
+
+    The breaker is closed while Components run normally. Once
+    ``failure_threshold`` failures are reported within ``window``
+    seconds, by any of the Components, it opens: failing Components
+    continue rather than back off, and all of them pause before setting up
+    again. After ``reset_timeout`` seconds it is half-open and lets one
+    Component try; success of that Component closes the breaker while
+    failure opens it again.
+
+    State is kept in shared memory, so the strategy must be created before
+    the Components using it are started.
     """
 
-    BACKOFFABLE_MESSAGE = ('teminated abonormally', 'libpq')
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    _STATE_NAMES = {CLOSED: 'closed', OPEN: 'open', HALF_OPEN: 'half-open'}
+
+    def __init__(self, strategy=None, failure_threshold=5, window=60,
+                 reset_timeout=30, buckets=10, trip_actions=(BACKOFF, )):
+        """
+        To pause every pipeline stage while Elasticsearch is unavailable::
+
+            breaker = CircuitBreakerStrategy(failure_threshold=10,
+                                             window=30)
+            pipeline.add_stage(Enricher, breaker, workers=2)
+            pipeline.add_stage(Writer, breaker, workers=4)
+
+        :param strategy: The :class:`~AbstractErrorStrategy` deciding how to
+            handle each exception. Defaults to a
+            :class:`~CommonErrorStrategy`.
+        :param failure_threshold: The number of failures within the window
+            which opens the breaker.
+        :param window: The number of seconds failures are counted within.
+        :param reset_timeout: The number of seconds the breaker stays open
+            before a Component may try again, and the longest one may try
+            for before another does.
+        :param buckets: The number of slices the window is counted in. More
+            make the window slide more smoothly.
+        :param trip_actions: The actions of ``strategy`` which count as a
+            failure of the dependency.
+        """
+        self.strategy = strategy or CommonErrorStrategy()
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.trip_actions = trip_actions
+
+        self._bucket_width = float(window) / buckets
+        self._bucket_epochs = Array('l', buckets, lock=False)
+        self._bucket_counts = Array('i', buckets, lock=False)
+        self._state = Value('i', self.CLOSED, lock=False)
+        # When the breaker opened, or until when a half-open try lasts
+        self._state_since = Value('d', 0, lock=False)
+        self._opens = Value('i', 0, lock=False)
+        # The pid of the Component granted the half-open try
+        self._trial_pid = Value('i', 0, lock=False)
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        """
+        :return: :attr:`CLOSED`, :attr:`OPEN` or :attr:`HALF_OPEN`.
+        """
+        return self._state.value
+
+    @property
+    def stats(self):
+        """
+        :return: A dictionary of the breaker's state, the failures within
+            the window and the number of times it has opened.
+        """
+        with self._lock:
+            failures = self._failures(time())
+        return {
+            'state': self._STATE_NAMES[self._state.value],
+            'failures': failures,
+            'opens': self._opens.value,
+        }
 
     def handle_exception(self, error):
-        if isinstance(error, InterfaceError):
-            return True, TERMINATE
+        expected, action = self.strategy.handle_exception(error)
+        if action not in self.trip_actions:
+            return expected, action
+
+        now = time()
+        with self._lock:
+            self._record_failure(now)
+            if self._state.value == self.HALF_OPEN or (
+                    self._state.value == self.CLOSED and
+                    self._failures(now) >= self.failure_threshold):
+                self._state.value = self.OPEN
+                self._state_since.value = now
+                self._opens.value += 1
+                self._trial_pid.value = 0
+            is_open = self._state.value == self.OPEN
+
+        if is_open:
+            # Pausing in pause_time takes the place of backing off
+            return expected, CONTINUE
+        return expected, action
+
+    def handle_success(self):
+        if self._state.value != self.HALF_OPEN:
+            return
+        with self._lock:
+            # Only the Component trying may close the breaker
+            if (self._state.value != self.HALF_OPEN or
+                    self._trial_pid.value != getpid()):
+                return
+            self._state.value = self.CLOSED
+            self._trial_pid.value = 0
+            for index in xrange(len(self._bucket_counts)):
+                self._bucket_counts[index] = 0
 
-        elif isinstance(error, (DatabaseError, OperationalError)):
-            msg = error.message or error.pgerror
-            in_message = False
-            if msg:
-                in_message = any(m in msg for m in self.BACKOFFABLE_MESSAGE)
+    def pause_time(self):
+        if self._state.value == self.CLOSED:
+            return 0
 
-            if in_message:
-                return True, BACKOFF
+        now = time()
+        with self._lock:
+            state = self._state.value
+            if state == self.OPEN:
+                retry_at = self._state_since.value + self.reset_timeout
+                if now < retry_at:
+                    return retry_at - now
+            elif state == self.HALF_OPEN:
+                if now < self._state_since.value:
+                    return self._state_since.value - now
             else:
-                return True, TERMINATE
+                return 0
 
-        return False, TERMINATE
+            # This Component tries, the others wait for its outcome
+            self._state.value = self.HALF_OPEN
+            self._state_since.value = now + self.reset_timeout
+            self._trial_pid.value = getpid()
+            return 0
+
+    def _record_failure(self, now):
+        """
+        Counts a failure in the bucket of the current time.
+        """
+        epoch = int(now // self._bucket_width)
+        index = epoch % len(self._bucket_counts)
+        if self._bucket_epochs[index] != epoch:
+            self._bucket_epochs[index] = epoch
+            self._bucket_counts[index] = 0
+        self._bucket_counts[index] += 1
+
+    def _failures(self, now):
+        """
+        :return: The number of failures counted within the window.
+        """
+        epoch = int(now // self._bucket_width)
+        buckets = len(self._bucket_counts)
+        return sum(
+            self._bucket_counts[index] for index in xrange(buckets)
+            if epoch - self._bucket_epochs[index] < buckets
+        )
@@ -0,0 +1,236 @@
+"""
+Triggers used to schedule time-based work within a Component.
+"""
+from datetime import datetime, timedelta
+from random import uniform
+from time import mktime
+
+from hermes.exceptions import InvalidConfigurationException
+
+
+class AbstractTrigger(object):
+    """
+    Abstract trigger which decides when scheduled work is next due.
+    """
+
+    def __init__(self, jitter=0):
+        """
+        :param jitter: The maximum number of seconds to randomly delay each
+            run by, to avoid many processes firing at once. Jitter never
+            accumulates into the schedule.
+        """
+        if jitter < 0:
+            raise InvalidConfigurationException("Jitter must not be negative")
+        self.jitter = jitter
+
+    def next_due(self, previous_due, now):
+        """
+        An abstract method that must be overridden by subclasses.
+
+        :param previous_due: The time the previous run was due, or None if
+            the trigger has not been scheduled yet.
+        :param now: The current time, taken after the previous run finished.
+        :return: The time, in seconds since the epoch, the next run is due.
+        """
+        raise NotImplementedError("Subclasses MUST override the "
+                                  "'next_due' method")
+
+    def fire_time(self, due):
+        """
+        :return: The time a run due at ``due`` should actually fire.
+        """
+        if self.jitter:
+            return due + uniform(0, self.jitter)
+        return due
+
+
+class FixedRateTrigger(AbstractTrigger):
+    """
+    Fires every ``interval`` seconds, measured from when each run was due
+    rather than when it finished so the schedule does not drift. Runs
+    which fall behind are skipped rather than fired in a burst.
+    """
+
+    def __init__(self, interval, jitter=0):
+        """
+        :param interval: The number of seconds between runs.
+        :param jitter: See :class:`~AbstractTrigger`.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            ``interval`` is not positive, as the Component would never wait.
+        """
+        super(FixedRateTrigger, self).__init__(jitter)
+        if interval <= 0:
+            raise InvalidConfigurationException("Interval must be positive")
+        self.interval = interval
+
+    def next_due(self, previous_due, now):
+        if previous_due is None:
+            return now + self.interval
+
+        due = previous_due + self.interval
+        if due <= now:
+            missed = (now - due) // self.interval + 1
+            due += missed * self.interval
+        return due
+
+
+class FixedDelayTrigger(AbstractTrigger):
+    """
+    Fires ``delay`` seconds after the previous run finished, so runs never
+    overlap however long they take.
+    """
+
+    def __init__(self, delay, jitter=0):
+        """
+        :param delay: The number of seconds between the end of one run and
+            the start of the next.
+        :param jitter: See :class:`~AbstractTrigger`.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            ``delay`` is not positive, as the Component would never wait.
+        """
+        super(FixedDelayTrigger, self).__init__(jitter)
+        if delay <= 0:
+            raise InvalidConfigurationException("Delay must be positive")
+        self.delay = delay
+
+    def next_due(self, previous_due, now):
+        return now + self.delay
+
+
+class DeadlineTrigger(AbstractTrigger):
+    """
+    Fires at a time decided by a function, which is asked again after each
+    run. Useful to flush a buffer when its oldest entry reaches a maximum
+    age, since runs of the trigger before then do nothing.
+    """
+
+    def __init__(self, deadline, jitter=0):
+        """
+        :param deadline: A function taking the current time and returning
+            the time the trigger is next due.
+        :param jitter: See :class:`~AbstractTrigger`.
+        """
+        super(DeadlineTrigger, self).__init__(jitter)
+        self._deadline = deadline
+
+    def next_due(self, previous_due, now):
+        return self._deadline(now)
+
+
+_CRON_FIELDS = (
+    # name, minimum, maximum
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day of month', 1, 31),
+    ('month', 1, 12),
+    ('day of week', 0, 7),
+)
+_CRON_SEARCH_YEARS = 5
+
+
+def _parse_cron_field(field, name, minimum, maximum):
+    """
+    Parses a single cron field, supporting ``*``, numbers, ``a-b`` ranges,
+    ``/step`` and comma separated lists.
+
+    :return: A frozenset of the matching values.
+    """
+    values = set()
+    for part in field.split(','):
+        spec, _, step = part.partition('/')
+        try:
+            step = int(step) if step else 1
+            if spec == '*':
+                start, end = minimum, maximum
+            elif '-' in spec:
+                start, end = [int(value) for value in spec.split('-', 1)]
+            else:
+                start = int(spec)
+                end = maximum if step > 1 else start
+        except ValueError:
+            raise InvalidConfigurationException(
+                "Invalid cron {} field: {!r}".format(name, field)
+            )
+
+        if step < 1 or not minimum <= start <= end <= maximum:
+            raise InvalidConfigurationException(
+                "Invalid cron {} field: {!r}".format(name, field)
+            )
+        values.update(xrange(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronTrigger(AbstractTrigger):
+    """
+    Fires on the minutes matched by a standard five field cron expression
+    (minute, hour, day of month, month and day of week, where Sunday is
+    either 0 or 7), in local time.
+
+    As with cron, when both the day of month and the day of week are
+    restricted a day matching either will fire.
+    """
+
+    def __init__(self, expression, jitter=0):
+        """
+        :param expression: A cron expression, for example ``'*/15 * * * *'``
+            to fire every quarter hour.
+        :param jitter: See :class:`~AbstractTrigger`.
+
+        :raises: :class:`~hermes.exceptions.InvalidConfigurationException` if
+            the expression cannot be parsed.
+        """
+        super(CronTrigger, self).__init__(jitter)
+        fields = expression.split()
+        if len(fields) != len(_CRON_FIELDS):
+            raise InvalidConfigurationException(
+                "Cron expressions must have {} fields: {!r}".format(
+                    len(_CRON_FIELDS), expression
+                )
+            )
+        self.expression = expression
+
+        (self._minutes, self._hours, self._days,
+         self._months, weekdays) = [
+            _parse_cron_field(field, *spec)
+            for field, spec in zip(fields, _CRON_FIELDS)
+        ]
+        # Cron counts Sunday as 0 or 7, datetime as 6 with Monday as 0
+        self._weekdays = frozenset((day - 1) % 7 for day in weekdays)
+        self._any_day = fields[2].startswith('*')
+        self._any_weekday = fields[4].startswith('*')
+
+    def next_due(self, previous_due, now):
+        moment = datetime.fromtimestamp(now).replace(second=0, microsecond=0)
+        moment += timedelta(minutes=1)
+        give_up = moment.year + _CRON_SEARCH_YEARS
+
+        while moment.year < give_up:
+            if moment.month not in self._months:
+                year, month = divmod(moment.month, 12)
+                moment = moment.replace(
+                    year=moment.year + year, month=month + 1, day=1,
+                    hour=0, minute=0
+                )
+            elif not self._matches_day(moment):
+                moment = moment.replace(hour=0, minute=0)
+                moment += timedelta(days=1)
+            elif moment.hour not in self._hours:
+                moment = moment.replace(minute=0)
+                moment += timedelta(hours=1)
+            elif moment.minute not in self._minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return mktime(moment.timetuple())
+
+        raise InvalidConfigurationException(
+            "Cron expression never fires: {!r}".format(self.expression)
+        )
+
+    def _matches_day(self, moment):
+        day = moment.day in self._days
+        weekday = moment.weekday() in self._weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
@@ -30,8 +30,17 @@ setup(
     url="https://github.com/transifex/hermes",
     install_requires=install_requires,
     tests_require=tests_require,
+    extras_require={
+        'msgpack': ['msgpack-python'],
+        'ujson': ['ujson'],
+    },
     dependency_links=tests_require,
     test_suite="test_hermes.run_tests.run_all",
+    entry_points={
+        'console_scripts': [
+            'hermes-loadgen = hermes.loadgen:main',
+        ],
+    },
     packages=find_packages(
         where='.',
         exclude=('test_hermes*', )
@@ -0,0 +1,85 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from mock import patch
+
+from hermes.backoff import (
+    AbstractBackoff, DecorrelatedJitterBackoff, ExponentialBackoff,
+    interruptible_sleep
+)
+from hermes.exceptions import InvalidConfigurationException
+
+
+class InterruptibleSleepTestCase(TestCase):
+    def test_sleeps_in_slices(self):
+        with patch('hermes.backoff.time', side_effect=[0, 0, 0.5, 1]):
+            with patch('hermes.backoff.sleep') as mock_sleep:
+                self.assertTrue(interruptible_sleep(1))
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_interrupted_sleep_returns_early(self):
+        with patch('hermes.backoff.sleep') as mock_sleep:
+            self.assertFalse(interruptible_sleep(10, lambda: True))
+        self.assertEqual(mock_sleep.call_count, 0)
+
+
+class AbstractBackoffTestCase(TestCase):
+    def test_raises_not_implemented(self):
+        self.assertRaises(NotImplementedError, AbstractBackoff().failed)
+
+    def test_invalid_delays_raise(self):
+        self.assertRaises(InvalidConfigurationException,
+                          AbstractBackoff, base=0)
+        self.assertRaises(InvalidConfigurationException,
+                          AbstractBackoff, base=4, limit=2)
+
+
+class ExponentialBackoffTestCase(TestCase):
+    def test_doubles_up_to_limit(self):
+        backoff = ExponentialBackoff(base=1, limit=8)
+        self.assertEqual([backoff.failed() for _ in xrange(5)],
+                         [1, 2, 4, 8, 8])
+        self.assertEqual(backoff.attempts, 5)
+
+    def test_reset_starts_from_base(self):
+        backoff = ExponentialBackoff()
+        backoff.failed()
+        backoff.failed()
+        backoff.reset()
+        self.assertEqual(backoff.failed(), 1)
+
+    def test_resets_after_quiet_period(self):
+        backoff = ExponentialBackoff(reset_after=60)
+        with patch('hermes.backoff.time', return_value=100):
+            backoff.failed()
+            backoff.failed()
+        # The second wait ended at 102
+        with patch('hermes.backoff.time', return_value=161):
+            self.assertEqual(backoff.failed(), 4)
+        with patch('hermes.backoff.time', return_value=300):
+            self.assertEqual(backoff.failed(), 1)
+
+    def test_wait_sleeps_for_the_delay(self):
+        with patch('hermes.backoff.interruptible_sleep') as mock_sleep:
+            mock_sleep.return_value = True
+            self.assertTrue(ExponentialBackoff().wait())
+        mock_sleep.assert_called_once_with(1, None)
+
+
+class DecorrelatedJitterBackoffTestCase(TestCase):
+    def test_delay_is_between_base_and_three_times_previous(self):
+        backoff = DecorrelatedJitterBackoff(base=1, limit=1000)
+        previous = 1
+        for _ in xrange(20):
+            delay = backoff.failed()
+            self.assertTrue(1 <= delay <= previous * 3)
+            previous = delay
+
+    def test_delay_is_capped(self):
+        backoff = DecorrelatedJitterBackoff(base=1, limit=4)
+        for _ in xrange(50):
+            self.assertTrue(backoff.failed() <= 4)
+
+    def test_delays_are_spread_out(self):
+        delays = set(DecorrelatedJitterBackoff().failed() for _ in xrange(10))
+        self.assertGreater(len(delays), 1)
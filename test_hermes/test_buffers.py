@@ -0,0 +1,89 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from hermes.buffers import WriteBehindBuffer
+from hermes.exceptions import InvalidConfigurationException
+
+
+class WriteBehindBufferTestCase(TestCase):
+    def setUp(self):
+        self.write = MagicMock()
+        self.buffer = WriteBehindBuffer(self.write, max_keys=3)
+
+    def test_max_keys_must_be_positive(self):
+        self.assertRaises(InvalidConfigurationException,
+                          WriteBehindBuffer, self.write, max_keys=0)
+
+    def test_last_write_wins(self):
+        self.buffer.put(1, 'a')
+        self.buffer.put(2, 'b')
+        self.buffer.put(1, 'c')
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.write.assert_called_once_with([(1, 'c'), (2, 'b')])
+
+    def test_merge_function(self):
+        self.buffer = WriteBehindBuffer(
+            self.write, merge=lambda old, new: dict(old, **new)
+        )
+        self.buffer.put(1, {'name': 'a'})
+        self.buffer.put(1, {'tags': ['b']})
+        self.buffer.flush()
+
+        self.write.assert_called_once_with(
+            [(1, {'name': 'a', 'tags': ['b']})]
+        )
+
+    def test_flushes_on_max_keys(self):
+        for key in (1, 1, 2, 2):
+            self.buffer.put(key, key)
+        self.assertEqual(self.write.call_count, 0)
+
+        self.buffer.put(3, 3)
+        self.write.assert_called_once_with([(1, 1), (2, 2), (3, 3)])
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_flush_without_updates_does_nothing(self):
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.write.call_count, 0)
+
+    def test_failed_write_keeps_entries(self):
+        self.write.side_effect = IOError
+        self.buffer.put(1, 'a')
+        self.assertRaises(IOError, self.buffer.flush)
+        self.assertEqual(len(self.buffer), 1)
+
+    def test_flushes_expired_updates(self):
+        with patch('hermes.buffers.time', return_value=100):
+            self.buffer.put(1, 'a')
+        with patch('hermes.buffers.time', return_value=100.5):
+            self.assertEqual(self.buffer.flush_expired(), 0)
+        with patch('hermes.buffers.time', return_value=101):
+            self.assertEqual(self.buffer.flush_expired(), 1)
+
+    def test_deadline_follows_oldest_update(self):
+        self.assertEqual(self.buffer._flush_deadline(100), 101)
+        with patch('hermes.buffers.time', return_value=50):
+            self.buffer.put(1, 'a')
+        self.assertEqual(self.buffer._flush_deadline(100), 51)
+
+    def test_schedule_on_component(self):
+        component = MagicMock()
+        self.buffer.schedule(component)
+        self.assertEqual(component.schedule.call_count, 1)
+
+        WriteBehindBuffer(self.write, max_age=None).schedule(component)
+        self.assertEqual(component.schedule.call_count, 1)
+
+    def test_merge_ratio(self):
+        self.assertEqual(self.buffer.stats['merge_ratio'], 0.0)
+        for _ in xrange(4):
+            self.buffer.put(1, 'a')
+        self.buffer.flush()
+
+        stats = self.buffer.stats
+        self.assertEqual(stats['updates'], 4)
+        self.assertEqual(stats['writes'], 1)
+        self.assertEqual(stats['merge_ratio'], 4.0)
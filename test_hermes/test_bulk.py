@@ -0,0 +1,127 @@
+from __future__ import absolute_import
+from datetime import datetime
+from decimal import Decimal
+from threading import Event
+from unittest import TestCase
+
+from mock import MagicMock
+
+from hermes.bulk import (
+    encode_value, encode_row, decode_row, CopyInStream, CopyOutStream
+)
+
+
+class CopyTextFormatTestCase(TestCase):
+    def test_encode_row(self):
+        self.assertEqual(
+            encode_row((1, None, True, False, 'a\tb\\c\nd', u'\xe9')),
+            '1\t\\N\tt\tf\ta\\tb\\\\c\\nd\t\xc3\xa9\n'
+        )
+
+    def test_floats_are_not_truncated(self):
+        self.assertEqual(encode_value(0.1 + 0.2), '0.30000000000000004')
+        self.assertEqual(encode_value(1e100), '1e+100')
+        self.assertEqual(encode_value(float('nan')), 'NaN')
+        self.assertEqual(encode_value(float('-inf')), '-Infinity')
+
+    def test_literal_types(self):
+        self.assertEqual(encode_value(10 ** 20), '100000000000000000000')
+        self.assertEqual(encode_value(Decimal('1.50')), '1.50')
+        self.assertEqual(encode_value(datetime(2016, 1, 2, 3, 4, 5)),
+                         '2016-01-02 03:04:05')
+
+    def test_sequences_are_encoded_as_arrays(self):
+        self.assertEqual(encode_value([1, None, 2.5]), '{"1",NULL,"2.5"}')
+        self.assertEqual(encode_value(((1, 2), (3, 4))),
+                         '{{"1","2"},{"3","4"}}')
+        self.assertEqual(encode_value([]), '{}')
+
+    def test_array_elements_are_escaped(self):
+        # Quotes and backslashes are escaped for the array, and the
+        # backslashes then escaped again for COPY
+        self.assertEqual(encode_value(['a"b', 'c\\d', 'e\tf', u'\xe9']),
+                         '{"a\\\\"b","c\\\\\\\\d","e\\tf","\xc3\xa9"}')
+
+    def test_unsupported_types_raise(self):
+        self.assertRaises(TypeError, encode_value, {'a': 1})
+        self.assertRaises(TypeError, encode_value, object())
+        self.assertRaises(TypeError, encode_value, [{'a': 1}])
+
+    def test_decode_row(self):
+        self.assertEqual(
+            decode_row('1\t\\N\ta\\tb\\\\c\\nd\t'),
+            ['1', None, 'a\tb\\c\nd', '']
+        )
+
+    def test_round_trip(self):
+        row = ['\\N', 'x\r\x08\x0c\x0by', '']
+        self.assertEqual(decode_row(encode_row(row)[:-1]), row)
+
+
+class CopyInStreamTestCase(TestCase):
+    def test_read_returns_at_most_size(self):
+        stream = CopyInStream([('aaaa', ), ('bbbb', ), ('cccc', )])
+
+        self.assertEqual(stream.read(7), 'aaaa\nbb')
+        self.assertEqual(stream.rows_read, 2)
+        self.assertEqual(stream.read(7), 'bb\ncccc')
+        self.assertEqual(stream.read(7), '\n')
+        self.assertEqual(stream.read(7), '')
+        self.assertEqual(stream.rows_read, 3)
+
+    def test_rows_are_encoded_lazily(self):
+        def rows():
+            yield ('a', )
+            raise AssertionError('Read too far')
+
+        self.assertEqual(CopyInStream(rows()).read(2), 'a\n')
+
+    def test_read_all(self):
+        stream = CopyInStream([(1, ), (2, )])
+        self.assertEqual(stream.read(), '1\n2\n')
+
+
+class CopyOutStreamTestCase(TestCase):
+    def _stream(self, writes, chunk_size=2):
+        cursor = MagicMock()
+
+        def copy_expert(sql, stream):
+            for data in writes:
+                stream.write(data)
+
+        cursor.copy_expert.side_effect = copy_expert
+        return cursor, CopyOutStream(cursor, 'COPY', chunk_size=chunk_size)
+
+    def test_rows_are_chunked(self):
+        _, stream = self._stream(['1\ta\n', '2\t\\N\n3\tc\n', '4\td\n'])
+        self.assertEqual(list(stream), [
+            [['1', 'a'], ['2', None]], [['3', 'c'], ['4', 'd']]
+        ])
+
+    def test_rows_split_across_writes(self):
+        _, stream = self._stream(['1\t', 'a\n2', '\tb\n'], chunk_size=5)
+        self.assertEqual(list(stream), [[['1', 'a'], ['2', 'b']]])
+
+    def test_errors_are_raised(self):
+        cursor, stream = self._stream([])
+        cursor.copy_expert.side_effect = ValueError
+        self.assertRaises(ValueError, list, stream)
+
+    def test_close_cancels_copy(self):
+        cursor = MagicMock()
+        cancelled = Event()
+
+        def copy_expert(sql, stream):
+            while not cancelled.is_set():
+                stream.write('1\n')
+            raise ValueError('Cancelled')
+
+        cursor.copy_expert.side_effect = copy_expert
+        cursor.connection.cancel.side_effect = cancelled.set
+
+        chunks = iter(CopyOutStream(cursor, 'COPY', chunk_size=1,
+                                    max_pending=1))
+        self.assertEqual(next(chunks), [['1']])
+        chunks.close()
+
+        cursor.connection.cancel.assert_called_once_with()
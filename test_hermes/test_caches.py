@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from mock import MagicMock, patch
+from psycopg2 import OperationalError
+
+from hermes.caches import QueryCache
+
+
+class QueryCacheTestCase(TestCase):
+    def setUp(self):
+        self.pg_connector = MagicMock()
+        self.cursor = self.pg_connector.pg_cursor
+        self.cursor.mogrify.side_effect = \
+            lambda query, params: query % (params or ())
+        self.cursor.fetchall.side_effect = lambda: [[len(
+            self.cursor.execute.call_args_list
+        )]]
+        self.cache = QueryCache(self.pg_connector, max_entries=2)
+
+    def test_results_are_cached_by_query_and_params(self):
+        first = self.cache.fetchall('SELECT %s;', (1, ))
+        self.assertIs(self.cache.fetchall('SELECT %s;', (1, )), first)
+        self.assertIsNot(self.cache.fetchall('SELECT %s;', (2, )), first)
+
+        self.assertEqual(self.cursor.execute.call_count, 2)
+        stats = self.cache.stats
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3.0)
+        self.assertGreater(stats['memory_bytes'], 0)
+
+    def test_entries_expire(self):
+        with patch('hermes.caches.time', return_value=100):
+            self.cache.fetchall('SELECT 1;')
+        with patch('hermes.caches.time', return_value=100 + 301):
+            self.cache.fetchall('SELECT 1;')
+        self.assertEqual(self.cursor.execute.call_count, 2)
+        self.assertEqual(self.cache.stats['entries'], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.fetchall('SELECT 1;')
+        self.cache.fetchall('SELECT 2;')
+        self.cache.fetchall('SELECT 1;')
+        self.cache.fetchall('SELECT 3;')
+
+        self.assertEqual(self.cache.stats['evictions'], 1)
+        self.assertEqual(self.cache._entries.keys(),
+                         ['SELECT 1;', 'SELECT 3;'])
+
+    def test_invalidate_by_tag(self):
+        self.cache.fetchall('SELECT 1;', tags=('a', ))
+        self.cache.fetchall('SELECT 2;', tags=('b', ))
+        self.cache.invalidate('a')
+
+        self.assertEqual(self.cache._entries.keys(), ['SELECT 2;'])
+        self.assertNotIn('a', self.cache._tags)
+
+    def test_invalidate_all(self):
+        self.cache.fetchall('SELECT 1;', tags=('a', ))
+        self.cache.invalidate()
+        self.assertEqual(self.cache.stats['entries'], 0)
+        self.assertEqual(self.cache.stats['memory_bytes'], 0)
+
+
+class QueryCacheInvalidationTestCase(TestCase):
+    def setUp(self):
+        with patch('hermes.caches.PostgresConnector') as mock_connector:
+            self.cache = QueryCache(MagicMock(), channel='query_cache')
+        self.listen_connector = mock_connector.return_value
+        self.cache.invalidate = MagicMock()
+        self.cache.clear = MagicMock()
+
+    def test_listens_on_first_poll(self):
+        self.cache.poll_invalidations()
+        self.listen_connector.listen.assert_called_once_with('query_cache')
+        self.assertEqual(self.listen_connector.poll_notifications.call_count,
+                         0)
+
+    def test_notifications_invalidate_tags(self):
+        self.listen_connector.poll_notifications.return_value = [
+            MagicMock(payload='languages'), MagicMock(payload='')
+        ]
+        self.cache.poll_invalidations()
+        self.cache.poll_invalidations()
+
+        self.assertEqual(
+            [call[0][0] for call in self.cache.invalidate.call_args_list],
+            ['languages', None]
+        )
+
+    def test_lost_connection_clears_cache(self):
+        self.cache.poll_invalidations()
+        self.listen_connector.poll_notifications.side_effect = \
+            OperationalError
+        self.cache.poll_invalidations()
+
+        self.cache.clear.assert_called_once_with()
+        self.listen_connector.disconnect.assert_called_once_with()
+
+        self.cache.poll_invalidations()
+        self.assertEqual(self.listen_connector.listen.call_count, 2)
@@ -1,21 +1,26 @@
 from __future__ import absolute_import
+from errno import EINTR
+from multiprocessing.queues import Queue
 from Queue import Empty
 from random import randint
-from time import sleep
+from time import sleep, time
 import os
 from unittest import TestCase, skipUnless
-from signal import SIGINT, SIGCHLD
+from signal import SIGINT, SIGCHLD, SIGKILL
 from select import error as select_error
 from os import getpid
 
 from mock import MagicMock, patch, PropertyMock
 from psycopg2 import OperationalError
 
+from hermes.backoff import ExponentialBackoff
 from hermes.client import Client
-from hermes.components import Component
+from hermes.errors import ErrorEvent
+from hermes.components import Component, TimerComponent
 from hermes.connectors import PostgresConnector
 from hermes.exceptions import InvalidConfigurationException
-from hermes.strategies import TERMINATE
+from hermes.pipelines import Pipeline
+from hermes.strategies import BACKOFF, TERMINATE
 
 
 _WATCH_PATH = '/tmp/hermes_test'
@@ -62,6 +67,8 @@ class RunningClientTestCase(TestCase):
         # Give the event time to emit
         sleep(3)
 
+        # The observer only asks the main loop for a role check
+        self.client._run_once()
         self.assertTrue(self.client._start_components.called)
 
         PostgresConnector.is_server_master = old_func
@@ -139,6 +146,16 @@ class ClientComponentTestCase(TestCase):
             MagicMock()))
         self.assertIsInstance(client._processor, Component)
 
+    def test_add_pipeline_throws_on_non_pipeline(self):
+        client = Client(MagicMock(), MagicMock())
+        self.assertRaises(InvalidConfigurationException,
+                          client.add_pipeline, MagicMock())
+
+    def test_add_pipeline_accepts_pipeline(self):
+        client = Client(MagicMock(), MagicMock())
+        client.add_pipeline(Pipeline(MagicMock(), MagicMock()))
+        self.assertIsInstance(client._pipeline, Pipeline)
+
 
 class ValidateComponentsTestCase(TestCase):
     def test_throws_on_non_listener(self):
@@ -153,6 +170,31 @@ class ValidateComponentsTestCase(TestCase):
         self.assertRaises(InvalidConfigurationException,
                           client._validate_components)
 
+    def test_timer_only_processor_needs_no_listener(self):
+        client = Client(MagicMock())
+        client._processor = TimerComponent([MagicMock()], MagicMock(),
+                                           MagicMock())
+        client._validate_components()
+
+        client._processor.notification_pipe = MagicMock()
+        self.assertRaises(InvalidConfigurationException,
+                          client._validate_components)
+
+    def test_throws_on_processor_and_pipeline(self):
+        client = Client(MagicMock())
+        client._listener = MagicMock()
+        client._processor = MagicMock()
+        client._pipeline = MagicMock()
+        self.assertRaises(InvalidConfigurationException,
+                          client._validate_components)
+
+    def test_throws_on_empty_pipeline(self):
+        client = Client(MagicMock())
+        client._listener = MagicMock()
+        client._pipeline = Pipeline(MagicMock(), client._listener.error_queue)
+        self.assertRaises(InvalidConfigurationException,
+                          client._validate_components)
+
     def test_throws_on_different_queue(self):
         client = Client(MagicMock())
 
@@ -264,6 +306,24 @@ class ClientStartupTestCase(TestCase):
         client._processor.join.assert_called_once_with()
 
 
+    def test_pipeline_stages_are_started_before_listener(self):
+        client = Client(MagicMock())
+        started = []
+
+        client._listener = MagicMock()
+        client._listener.is_alive.return_value = False
+        client._listener.start.side_effect = lambda: started.append('l')
+
+        client._pipeline = MagicMock()
+        client._pipeline.components = [MagicMock(), MagicMock()]
+        for index, stage in enumerate(client._pipeline.components):
+            stage.is_alive.return_value = False
+            stage.start.side_effect = lambda index=index: started.append(index)
+
+        client._start_components()
+        self.assertEqual(started, [1, 0, 'l'])
+
+
 class ClientShutdownTestCase(TestCase):
     def test_shutdown(self):
         client = Client(MagicMock())
@@ -296,6 +356,47 @@ class ClientShutdownTestCase(TestCase):
         client._listener.join.assert_called_once_with()
         client._processor.join.assert_called_once_with()
 
+    def test_stop_terminates_pipeline_stages(self):
+        client = Client(MagicMock())
+
+        client._pipeline = MagicMock()
+        client._pipeline.components = [MagicMock(), MagicMock()]
+        for stage in client._pipeline.components:
+            stage.is_alive.return_value = True
+
+        client._stop_components()
+
+        for stage in client._pipeline.components:
+            stage.terminate.assert_called_once_with()
+            stage.join.assert_called_once_with()
+
+    def test_stalled_component_is_killed(self):
+        client = Client(MagicMock())
+        client.log = MagicMock()
+
+        client._processor = MagicMock(execute_timeout=5, ident=1234)
+        client._processor.busy_time.return_value = 6
+        client._listener = MagicMock(execute_timeout=None)
+
+        with patch('hermes.client.os.kill') as mock_kill:
+            client._kill_stalled_components()
+
+        mock_kill.assert_called_once_with(1234, SIGKILL)
+        self.assertEqual(client.stats['stalls'], 1)
+        self.assertEqual(client.stats['stalled_seconds'], 6)
+
+    def test_busy_component_within_deadline_is_not_killed(self):
+        client = Client(MagicMock())
+
+        client._processor = MagicMock(execute_timeout=5, ident=1234)
+        client._processor.busy_time.return_value = 4
+
+        with patch('hermes.client.os.kill') as mock_kill:
+            client._kill_stalled_components()
+
+        self.assertEqual(mock_kill.call_count, 0)
+        self.assertEqual(client.stats['stalls'], 0)
+
     def test_handle_terminate_when_same_process(self):
         with patch('hermes.client.Client.ident',
                    new_callable=PropertyMock) as mock_ident:
@@ -304,7 +405,10 @@ class ClientShutdownTestCase(TestCase):
             mock_ident.return_value = getpid()
 
             client._handle_terminate(None, None)
-            client._shutdown.assert_called_once_with()
+
+            # Shutting down is left to the main loop
+            self.assertTrue(client._exit_requested)
+            self.assertEqual(client._shutdown.call_count, 0)
 
     def test_handle_terminate_when_different_process(self):
         with patch('hermes.client.Client.ident',
@@ -320,64 +424,244 @@ class ClientShutdownTestCase(TestCase):
             client._exit_queue.put_nowait.assert_called_once_with(True)
 
     def test_handle_sigchld_when_should_not_run(self):
+        client = Client(MagicMock())
+        client._should_run = False
+        client._handle_sigchld(SIGCHLD, None)
+        self.assertFalse(client._children_exited)
+
+    def test_handle_sigchld_wakes_main_loop(self):
         client = Client(MagicMock())
         client._processor = MagicMock()
+        client._wakeup_pipe = client._open_wakeup_pipe()
+        client._should_run = True
 
-        client._should_run = False
-        client._handle_sigchld(None, None)
+        client._handle_sigchld(SIGCHLD, None)
 
+        self.assertTrue(client._children_exited)
+        self.assertEqual(os.read(client._wakeup_pipe[0], 1), '\0')
+        # Nothing else is done within the signal handler
         self.assertEqual(
             client._processor.error_queue.get_nowait.call_count, 0
         )
 
-    def test_handle_sigchld_when_expected_error_and_terminate(self):
+    def test_wakeup_pipe_does_not_block_when_full(self):
         client = Client(MagicMock())
-        client._processor = MagicMock()
-        client.execute_role_based_procedure = MagicMock()
-        client._processor.error_queue.get_nowait.return_value = (
-            True, TERMINATE
-        )
+        client._wakeup_pipe = client._open_wakeup_pipe()
+        for _ in xrange(100000):
+            client._wake()
+        client._drain_wakeup_pipe()
+        self.assertRaises(OSError, os.read, client._wakeup_pipe[0], 1)
 
+    def test_request_role_check_is_run_by_main_loop(self):
+        client = Client(MagicMock())
+        client.execute_role_based_procedure = MagicMock()
         client._should_run = True
-        client._exception_raised = False
 
-        client._handle_sigchld(SIGCHLD, None)
-        client._processor.error_queue.get_nowait.assert_called_once_with()
-        self.assertTrue(client._exception_raised)
+        client.request_role_check()
+        client._run_once()
+
         client.execute_role_based_procedure.assert_called_once_with()
 
-    def test_handle_sigchld_when_not_expected(self):
+    def test_failover_file_event_requests_role_check(self):
+        client = Client(MagicMock(), failover_files=_FAILOVER_FILES)
+        client.request_role_check = MagicMock()
+        client.on_any_event(MagicMock(src_path='/data/recovery.conf'))
+        client.request_role_check.assert_called_once_with()
+
+
+class ClientMainLoopTestCase(TestCase):
+    def _client(self):
         client = Client(MagicMock())
         client.log = MagicMock()
-        client._processor = MagicMock()
-        client._shutdown = MagicMock()
-        client._processor.error_queue.get_nowait.return_value = (
-            False, TERMINATE
+        client._processor = MagicMock(error_queue=Queue(),
+                                      execute_timeout=None)
+        client._processor.is_alive.return_value = True
+        client._wakeup_pipe = client._open_wakeup_pipe()
+        client._schedule_restarts = MagicMock()
+        client._should_run = True
+        return client
+
+    def _report(self, client, *errors):
+        for error in errors:
+            client._processor.error_queue.put(error)
+        # Give the feeder thread time to write the errors
+        sleep(0.1)
+
+    def test_expected_error_runs_role_check(self):
+        client = self._client()
+        client.execute_role_based_procedure = MagicMock()
+        self._report(client, (True, TERMINATE))
+        client._handle_sigchld(SIGCHLD, None)
+
+        client._run_once()
+
+        client.execute_role_based_procedure.assert_called_once_with()
+        self.assertEqual(client._schedule_restarts.call_count, 0)
+
+    def test_unexpected_error_shuts_down(self):
+        client = self._client()
+        client._shutdown = MagicMock(
+            side_effect=lambda: setattr(client, '_should_run', False)
         )
+        self._report(client, (False, TERMINATE))
 
-        client._should_run = True
-        client._exception_raised = False
+        client._run_once()
+
+        client._shutdown.assert_called_once_with()
+
+    def test_errors_are_handled_together(self):
+        client = self._client()
+        client.execute_role_based_procedure = MagicMock()
+        self._report(client, (True, TERMINATE), (True, TERMINATE))
+
+        client._run_once()
+
+        client.execute_role_based_procedure.assert_called_once_with()
+        self.assertRaises(Empty, client._processor.error_queue.get_nowait)
+
+    def test_handled_errors_are_only_recorded(self):
+        client = self._client()
+        client.execute_role_based_procedure = MagicMock()
+        client.on_error = MagicMock()
+        event = ErrorEvent('Processor', 1234, 'OperationalError', 'gone',
+                           True, BACKOFF, sqlstate='57P01', occurred_at=time())
+        self._report(client, event, event)
+
+        client._run_once()
+
+        self.assertEqual(client.on_error.call_count, 2)
+        self.assertEqual(client.execute_role_based_procedure.call_count, 0)
+        self.assertEqual(client.error_rates.count('Processor'), 2)
+        self.assertEqual(client.stats['errors'], 2)
 
+    def test_exit_without_error_schedules_restarts(self):
+        client = self._client()
         client._handle_sigchld(SIGCHLD, None)
-        client._processor.error_queue.get_nowait.assert_called_once_with()
-        self.assertTrue(client._exception_raised)
+
+        client._run_once()
+
+        client._schedule_restarts.assert_called_once_with()
+        self.assertFalse(client._children_exited)
+
+    def test_exit_request_shuts_down(self):
+        client = self._client()
+        client._shutdown = MagicMock()
+        client._exit_requested = True
+        client._wake()
+
+        client._run_once()
+
         client._shutdown.assert_called_once_with()
 
-    def test_handle_sigchld_when_queue_is_empty(self):
+    def test_interrupted_select_keeps_running(self):
+        client = self._client()
+        with patch('select.select', side_effect=select_error(EINTR, '')):
+            client._run_once()
+        self.assertTrue(client._should_run)
+
+    def test_loop_waits_for_next_timer(self):
+        client = self._client()
+        client._pending_restarts[client._processor] = 110
+        client._role_check_due = 105
+        with patch('hermes.client.time', return_value=100):
+            self.assertEqual(client._loop_timeout(), 5)
+
+        client._role_check_due = None
+        client._processor.execute_timeout = 5
+        with patch('hermes.client.time', return_value=100):
+            self.assertEqual(client._loop_timeout(), 1)
+
+    def test_components_stopped_on_purpose_are_not_restarted(self):
         client = Client(MagicMock())
-        client._start_components = MagicMock()
         client._processor = MagicMock()
-        client._processor.error_queue.get_nowait.side_effect = Empty
+        client._processor.is_alive.return_value = False
 
-        client._should_run = True
-        client._exception_raised = False
+        client._stop_components()
+        client._schedule_restarts()
 
-        client._handle_sigchld(SIGCHLD, None)
+        self.assertEqual(client._pending_restarts, {})
 
-        client._processor.error_queue.get_nowait.assert_called_once_with()
-        self.assertFalse(client._exception_raised)
-        self.assertTrue(client._child_interrupted)
-        client._start_components.assert_called_once_with(restart=True)
+
+class ClientRestartTestCase(TestCase):
+    def _crashed_client(self, **kwargs):
+        client = Client(MagicMock(), **kwargs)
+        client.log = MagicMock()
+        client._shutdown = MagicMock()
+        client._processor = MagicMock(ident=1234)
+        client._processor.is_alive.return_value = False
+        return client
+
+    def test_restart_delay_grows_exponentially(self):
+        client = self._crashed_client(restart_delay=1, restart_delay_limit=4)
+
+        delays = []
+        with patch('hermes.client.uniform', lambda low, high: high):
+            for _ in xrange(4):
+                with patch('hermes.client.time', return_value=100):
+                    client._schedule_restarts()
+                delays.append(client._pending_restarts.pop(client._processor)
+                              - 100)
+
+        self.assertEqual(delays, [1, 2, 4, 4])
+        self.assertEqual(client.stats['restarts'], 4)
+        self.assertEqual(client.stats['restart_delay_seconds'], 11)
+
+    def test_restart_delay_is_jittered(self):
+        client = self._crashed_client(restart_delay=8)
+        with patch('hermes.client.time', return_value=100):
+            client._schedule_restarts()
+        self.assertTrue(
+            104 <= client._pending_restarts[client._processor] <= 108
+        )
+
+    def test_restart_runs_once_due(self):
+        client = self._crashed_client()
+        client._pending_restarts[client._processor] = 100
+
+        with patch('hermes.client.time', return_value=99):
+            client._run_due_restarts()
+        self.assertEqual(client._processor.start.call_count, 0)
+
+        with patch('hermes.client.time', return_value=100):
+            client._run_due_restarts()
+        client._processor.join.assert_called_once_with()
+        client._processor.start.assert_called_once_with()
+        self.assertEqual(client._pending_restarts, {})
+
+    def test_exceeded_restart_budget_terminates(self):
+        client = self._crashed_client(max_restarts=2)
+        for _ in xrange(3):
+            client._schedule_restarts()
+            client._pending_restarts.clear()
+
+        client._shutdown.assert_called_once_with()
+        self.assertEqual(client.stats['budgets_exceeded'], 1)
+
+    def test_exceeded_restart_budget_backs_off(self):
+        client = self._crashed_client(max_restarts=2, restart_window=60,
+                                      restart_escalation=BACKOFF)
+        with patch('hermes.client.uniform', lambda low, high: high):
+            for now in (100, 110, 120):
+                with patch('hermes.client.time', return_value=now):
+                    client._schedule_restarts()
+                due = client._pending_restarts.pop(client._processor)
+
+        # The first restart, at 101, leaves the window at 161
+        self.assertEqual(due, 161)
+        self.assertEqual(client._shutdown.call_count, 0)
+        self.assertEqual(client.stats['budgets_exceeded'], 1)
+
+    def test_restarts_leave_the_window(self):
+        client = self._crashed_client(max_restarts=1, restart_window=60)
+        with patch('hermes.client.time', return_value=100):
+            client._schedule_restarts()
+        client._pending_restarts.clear()
+
+        with patch('hermes.client.time', return_value=200):
+            client._schedule_restarts()
+
+        self.assertEqual(client._shutdown.call_count, 0)
+        self.assertIn(client._processor, client._pending_restarts)
 
 
 class ClientRunProcedureTestCase(TestCase):
@@ -403,9 +687,7 @@ class ClientRunProcedureTestCase(TestCase):
         with patch('hermes.log.get_logger'):
             with patch('hermes.client.signal'):
                 client = Client(MagicMock())
-
-                random_raised = randint(1, 10000)
-                client._exception_raised = random_raised
+                client._run_once = MagicMock()
 
                 client._start_observer = MagicMock()
                 client.execute_role_based_procedure = MagicMock(
@@ -415,23 +697,22 @@ class ClientRunProcedureTestCase(TestCase):
                 self.assertRaises(Exception, client.run)
 
                 client.execute_role_based_procedure.assert_called_once_with()
+                self.assertEqual(client._run_once.call_count, 0)
 
-                # Raised value should be the same as that which we set
-                self.assertEqual(client._exception_raised, random_raised)
-
-    def test_client_calls_terminate_on_exit_queue(self):
+    def test_client_shuts_down_on_exit_queue(self):
         with patch('hermes.log.get_logger'):
             with patch('hermes.client.signal'):
                 client = Client(MagicMock())
                 client.execute_role_based_procedure = MagicMock()
                 client._start_observer = MagicMock()
-                client.terminate = MagicMock(side_effect=Exception)
+                client._shutdown = MagicMock(side_effect=Exception)
 
                 self.assertRaises(Empty, client._exit_queue.get_nowait)
                 client._exit_queue.put(True)
+                client._exit_queue._reader.poll(1)
 
                 self.assertRaises(Exception, client.run)
-                client.terminate.assert_called_once_with()
+                client._shutdown.assert_called_once_with()
 
     def test_client_sets_run_flag_on_interrupt(self):
         with patch('hermes.log.get_logger'):
@@ -465,17 +746,42 @@ class RoleBasedProceduresTestCase(TestCase):
 
         client._stop_components.assert_called_once_with()
 
-    def test_when_server_is_down_and_no_backoff(self):
-        with patch('hermes.client.sleep') as mock_sleep:
-            mock_sleep.side_effect = Exception('Break out of loop')
+    def _unreachable_client(self):
+        client = Client(MagicMock())
+        client.log = MagicMock()
+        client._stop_components = MagicMock()
+        client.master_pg_conn = MagicMock()
+        client.master_pg_conn.is_server_master.side_effect = OperationalError
+        return client
 
-            client = Client(MagicMock())
-            client.log = MagicMock()
-            client._stop_components = MagicMock()
-            client.master_pg_conn = MagicMock()
-            client.master_pg_conn.is_server_master.side_effect = OperationalError
+    def test_when_server_is_down_retry_is_scheduled(self):
+        client = self._unreachable_client()
+        client.backoff = ExponentialBackoff()
+
+        with patch('hermes.client.time', return_value=100):
+            client.execute_role_based_procedure()
+
+        client._stop_components.assert_called_once_with()
+        self.assertEqual(client._role_check_due, 101)
+
+    def test_when_server_stays_down_gives_up(self):
+        client = self._unreachable_client()
+
+        for _ in xrange(6):
+            client.execute_role_based_procedure()
+        self.assertRaises(OperationalError,
+                          client.execute_role_based_procedure)
+
+        self.assertEqual(client._stop_components.call_count, 7)
+        self.assertEqual(client.backoff.attempts, 0)
+
+    def test_routine_role_check_is_scheduled(self):
+        client = Client(MagicMock(), role_check_interval=30)
+        client.log = MagicMock()
+        client.master_pg_conn = MagicMock()
+        client._start_components = MagicMock()
 
-            self.assertRaises(Exception, client.execute_role_based_procedure)
+        with patch('hermes.client.time', return_value=100):
+            client.execute_role_based_procedure()
 
-            client._stop_components.assert_called_once_with()
-            mock_sleep.assert_called_once_with(1)
+        self.assertEqual(client._role_check_due, 130)
@@ -0,0 +1,85 @@
+from __future__ import absolute_import
+import json
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from hermes.codecs import AbstractCodec, RawCodec, JsonCodec, MsgpackCodec
+from hermes.exceptions import (
+    InvalidConfigurationException, PayloadDecodeException
+)
+
+
+class AbstractCodecTestCase(TestCase):
+    def test_raises_not_implemented(self):
+        codec = AbstractCodec()
+        self.assertRaises(NotImplementedError, codec.encode, None)
+        self.assertRaises(NotImplementedError, codec.decode, None)
+
+
+class RawCodecTestCase(TestCase):
+    def test_payloads_are_untouched(self):
+        codec = RawCodec()
+        self.assertEqual(codec.encode('abc'), 'abc')
+        self.assertEqual(codec.decode('abc'), 'abc')
+        self.assertEqual(codec.decode_batch(['a', 'b']), ['a', 'b'])
+
+
+class JsonCodecTestCase(TestCase):
+    def setUp(self):
+        self.codec = JsonCodec(json)
+
+    def test_round_trip(self):
+        value = {'id': 1, 'tags': ['a', 'b']}
+        self.assertEqual(self.codec.decode(self.codec.encode(value)), value)
+
+    def test_malformed_payload_raises(self):
+        self.assertRaises(PayloadDecodeException, self.codec.decode, '{')
+
+    def test_batch_payloads_are_decoded_separately(self):
+        self.assertEqual(self.codec.decode_batch(['1', '{"a": 2}']),
+                         [1, {'a': 2}])
+
+    def test_empty_batch(self):
+        self.assertEqual(self.codec.decode_batch([]), [])
+
+    def test_batch_with_malformed_payload_raises(self):
+        self.assertRaises(PayloadDecodeException,
+                          self.codec.decode_batch, ['1', '{'])
+
+    def test_batch_payloads_split_across_items_raise(self):
+        # Joined, these form the valid array '[1,2,[3,4]]'
+        self.assertRaises(PayloadDecodeException,
+                          self.codec.decode_batch, ['1,2', '[3', '4]'])
+
+    def test_batch_payloads_cannot_merge(self):
+        # Joined, these form the valid array '[1],[2,3]'
+        self.assertRaises(PayloadDecodeException,
+                          self.codec.decode_batch, ['1],[2', '3'])
+        self.assertEqual(self.codec.decode_batch(['[1]', '[2,3]']),
+                         [[1], [2, 3]])
+
+
+class MsgpackCodecTestCase(TestCase):
+    def test_raises_if_not_installed(self):
+        with patch('hermes.codecs.msgpack', None):
+            self.assertRaises(InvalidConfigurationException, MsgpackCodec)
+
+    def test_round_trip(self):
+        mock_msgpack = MagicMock()
+        mock_msgpack.packb.return_value = '\x81\xa1a\x01'
+        mock_msgpack.unpackb.return_value = {'a': 1}
+
+        with patch('hermes.codecs.msgpack', mock_msgpack):
+            codec = MsgpackCodec()
+            payload = codec.encode({'a': 1})
+            self.assertEqual(codec.decode(payload), {'a': 1})
+
+        mock_msgpack.unpackb.assert_called_once_with('\x81\xa1a\x01')
+
+    def test_malformed_payload_raises(self):
+        mock_msgpack = MagicMock()
+        mock_msgpack.unpackb.side_effect = ValueError
+        with patch('hermes.codecs.msgpack', mock_msgpack):
+            codec = MsgpackCodec()
+            self.assertRaises(PayloadDecodeException, codec.decode, 'gqFhAQ==')
@@ -1,7 +1,6 @@
 from multiprocessing.queues import Queue
-from random import randint
 from unittest import TestCase
-from time import sleep
+from time import sleep, time
 import select
 import os
 import multiprocessing
@@ -10,10 +9,15 @@ from signal import SIGTERM, SIGINT
 from mock import MagicMock, patch
 from psycopg2._psycopg import InterfaceError
 
-from hermes.components import Component
+from hermes.backoff import DecorrelatedJitterBackoff, ExponentialBackoff
+from hermes.components import Component, TimerComponent
 from hermes.connectors import PostgresConnector
-from hermes.strategies import AbstractErrorStrategy, CommonErrorStrategy, \
-    TERMINATE, BACKOFF, CONTINUE
+from hermes.exceptions import (
+    ConnectionLostException, InvalidConfigurationException
+)
+from hermes.strategies import AbstractErrorStrategy, CircuitBreakerStrategy, \
+    CommonErrorStrategy, TERMINATE, BACKOFF, CONTINUE
+from hermes.triggers import FixedDelayTrigger, FixedRateTrigger
 from test_hermes.util import LimitedTrueBool
 import util
 
@@ -136,12 +140,16 @@ class ComponentTestCase(TestCase):
             sleep(1)
             self.notif_queue.put(True)
 
-            exception = self.error_queue.get(timeout=1)
+            event = self.error_queue.get(timeout=1)
 
-        self.assertEqual(mock_execption_return, exception)
+        self.assertEqual(mock_execption_return,
+                         (event.expected, event.action))
+        self.assertEqual(event.component, 'Component')
+        self.assertEqual(event.exception, 'Exception')
 
     def test_component_process_reuse(self):
         self.component.start()
+        name = self.component.name
         sleep(1)
         self.component.terminate()
         self.component.join()
@@ -149,6 +157,8 @@ class ComponentTestCase(TestCase):
         self.component.start()
         sleep(1)
         self.assertTrue(self.component.is_alive())
+        # Restarts are told apart from other Components by name
+        self.assertEqual(self.component.name, name)
 
     def test_isalive_is_false_on_attr_error(self):
         self.assertRaises(AttributeError, lambda: self.component._popen)
@@ -167,7 +177,7 @@ class ComponentTestCase(TestCase):
 
     def test_execute_gets_notification_and_calls_execute_funcs(self):
         self.component._should_run = LimitedTrueBool(1)
-        self.component._backoff_time = randint(1, 10000)
+        self.component.backoff.failed()
 
         self.component.execute = MagicMock()
         self.component.post_execute = MagicMock()
@@ -182,7 +192,117 @@ class ComponentTestCase(TestCase):
         self.assertEqual(self.component.execute.call_count, 1)
         self.assertEqual(self.component.pre_execute.call_count, 1)
 
-        self.assertEqual(self.component.__backoff_time__, 0)
+        self.assertEqual(self.component.backoff.attempts, 0)
+
+    def test_on_idle_called_on_select_timeout(self):
+        self.component._should_run = LimitedTrueBool(1)
+        self.component._idle_timeout = 0
+        self.component.execute = MagicMock()
+        self.component.on_idle = MagicMock()
+
+        self.component._execute()
+
+        self.component.on_idle.assert_called_once_with()
+        self.assertEqual(self.component.execute.call_count, 0)
+
+    def test_on_tick_called_while_notifications_arrive(self):
+        self.component._should_run = LimitedTrueBool(2)
+        self.component._tick_trigger = FixedRateTrigger(0.01)
+        # Each notification takes longer than the tick interval
+        self.component.execute = MagicMock(side_effect=lambda _: sleep(0.02))
+        self.component.on_tick = MagicMock()
+        self.notif_queue.put(True)
+        self.notif_queue._reader.poll(1)
+
+        self.component._execute()
+
+        self.assertEqual(self.component.execute.call_count, 2)
+        self.assertEqual(self.component.on_tick.call_count, 2)
+
+    def test_periodic_tasks_run_when_due(self):
+        self.component._should_run = LimitedTrueBool(3)
+        due, not_due = MagicMock(), MagicMock()
+        self.component.schedule_periodic(0.01, due)
+        self.component.schedule_periodic(3600, not_due)
+        self.component.execute = MagicMock()
+        self.component.on_idle = MagicMock()
+
+        self.component._execute()
+
+        self.assertEqual(due.call_count, 3)
+        self.assertEqual(not_due.call_count, 0)
+        self.assertEqual(self.component.on_idle.call_count, 0)
+
+    def test_tick_interval_must_be_positive(self):
+        self.assertRaises(InvalidConfigurationException, Component,
+                          MagicMock(), MagicMock(), MagicMock(),
+                          tick_interval=0)
+
+    def test_schedule_carries_on_after_restart(self):
+        func = MagicMock()
+        self.component.schedule(FixedDelayTrigger(3600), func)
+        self.component._should_run = LimitedTrueBool(0)
+        self.component._execute()
+        schedule = self.component._schedule
+
+        self.component._execute()
+
+        self.assertIs(self.component._schedule, schedule)
+        self.assertEqual(len(schedule), 1)
+
+    def test_failed_task_stays_scheduled(self):
+        failing, waiting = MagicMock(side_effect=ValueError), MagicMock()
+        due = time() - 1
+        schedule = [
+            (due, 0, due, FixedRateTrigger(1), failing),
+            (due, 1, due, FixedRateTrigger(1), waiting),
+        ]
+
+        self.assertRaises(ValueError, self.component._run_due_tasks,
+                          schedule)
+
+        self.assertEqual(len(schedule), 2)
+        self.assertEqual(waiting.call_count, 0)
+        self.assertEqual(self.component._run_due_tasks(schedule), 1)
+        waiting.assert_called_once_with()
+
+    def test_busy_time_while_executing(self):
+        self.component._should_run = LimitedTrueBool(1)
+        busy_times = []
+        self.component.execute = MagicMock(
+            side_effect=lambda _: busy_times.append(
+                self.component.busy_time()
+            )
+        )
+        self.notif_queue.put(True)
+
+        self.component._execute()
+
+        self.assertGreaterEqual(busy_times[0], 0)
+        self.assertLess(busy_times[0], 1)
+        self.assertEqual(self.component.busy_time(), 0)
+
+    def test_busy_time_is_reset_when_execute_raises(self):
+        self.component._should_run = LimitedTrueBool(1)
+        self.component.execute = MagicMock(side_effect=ValueError)
+        self.notif_queue.put(True)
+
+        self.assertRaises(ValueError, self.component._execute)
+        self.assertEqual(self.component.busy_time(), 0)
+
+    def test_busy_time_of_stuck_execute(self):
+        self.component._busy_since.value = time() - 10
+        self.assertGreaterEqual(self.component.busy_time(), 10)
+
+    def test_late_periodic_task_is_not_run_in_a_burst(self):
+        func = MagicMock()
+        due = time() - 10
+        schedule = [(due, 0, due, FixedRateTrigger(1), func)]
+
+        self.component._run_due_tasks(schedule)
+
+        self.assertEqual(func.call_count, 1)
+        self.assertGreater(schedule[0][0], time())
 
     def test_main_loop_is_called(self):
         with patch('hermes.log.get_logger'):
@@ -211,6 +331,49 @@ class ComponentTestCase(TestCase):
                 self.assertEqual(self.component.tear_down.call_count, 1)
 
 
+class TimerComponentTestCase(TestCase):
+    def setUp(self):
+        self.notif_queue = Queue(1)
+        self.trigger = FixedRateTrigger(0.01)
+        self.component = TimerComponent([self.trigger],
+                                        CommonErrorStrategy(),
+                                        Queue())
+        self.component.log = MagicMock()
+
+    def test_needs_a_trigger_or_notification_pipe(self):
+        self.assertRaises(InvalidConfigurationException, TimerComponent,
+                          [], CommonErrorStrategy(), Queue())
+
+    def test_execute_runs_when_trigger_fires(self):
+        self.component._should_run = LimitedTrueBool(2)
+        fired_by = []
+        self.component.execute = MagicMock(
+            side_effect=lambda _: fired_by.append(self.component.trigger)
+        )
+
+        self.component._execute()
+
+        self.assertEqual(fired_by, [self.trigger, self.trigger])
+        self.assertIsNone(self.component.trigger)
+
+    def test_execute_runs_on_notification_and_trigger(self):
+        self.component = TimerComponent([FixedDelayTrigger(3600)],
+                                        CommonErrorStrategy(),
+                                        Queue(),
+                                        self.notif_queue._reader)
+        self.component.log = MagicMock()
+        self.component._should_run = LimitedTrueBool(1)
+        fired_by = []
+        self.component.execute = MagicMock(
+            side_effect=lambda _: fired_by.append(self.component.trigger)
+        )
+        self.notif_queue.put(True)
+
+        self.component._execute()
+
+        self.assertEqual(fired_by, [None])
+
+
 class SignalHandlerTestCase(TestCase):
     def test_setup_signal_handlers(self):
         component = Component(MagicMock(), MagicMock(), MagicMock())
@@ -237,7 +400,8 @@ class RunExceptionHandlingTestCase(TestCase):
     def test_continue_re_runs_main_loop(self):
         with patch('hermes.log.get_logger'):
             with patch('multiprocessing.Process.start'):
-                component = Component(MagicMock(), MagicMock(), MagicMock())
+                component = Component(MagicMock(), AbstractErrorStrategy(),
+                                      MagicMock())
                 component.log = MagicMock()
 
                 component._execute = MagicMock(side_effect=Exception)
@@ -257,7 +421,8 @@ class RunExceptionHandlingTestCase(TestCase):
     def test_backoff_calls_backoff_function_and_continues(self):
         with patch('hermes.log.get_logger'):
             with patch('multiprocessing.Process.start'):
-                component = Component(MagicMock(), MagicMock(), MagicMock())
+                component = Component(MagicMock(), AbstractErrorStrategy(),
+                                      MagicMock())
                 component.log = MagicMock()
 
                 component._execute = MagicMock(side_effect=Exception)
@@ -278,7 +443,8 @@ class RunExceptionHandlingTestCase(TestCase):
     def test_expected_terminate_cancels_main_loop(self):
         with patch('hermes.log.get_logger'):
             with patch('multiprocessing.Process.start'):
-                component = Component(MagicMock(), MagicMock(), MagicMock())
+                component = Component(MagicMock(), AbstractErrorStrategy(),
+                                      MagicMock())
                 component.log = MagicMock()
 
                 component._execute = MagicMock(side_effect=Exception)
@@ -298,7 +464,8 @@ class RunExceptionHandlingTestCase(TestCase):
     def test_unexpected_terminate_cancels_main_loop(self):
         with patch('hermes.log.get_logger'):
             with patch('multiprocessing.Process.start'):
-                component = Component(MagicMock(), MagicMock(), MagicMock())
+                component = Component(MagicMock(), AbstractErrorStrategy(),
+                                      MagicMock())
                 component.log = MagicMock()
 
                 component._execute = MagicMock(side_effect=Exception)
@@ -316,37 +483,133 @@ class RunExceptionHandlingTestCase(TestCase):
                 self.assertFalse(component._should_run)
 
 
+class ErrorStrategyHooksTestCase(TestCase):
+    def setUp(self):
+        self.notif_queue = Queue(1)
+        self.strategy = AbstractErrorStrategy()
+        self.component = Component(self.notif_queue._reader, self.strategy,
+                                   MagicMock())
+        self.component.log = MagicMock()
+        self.component.execute = MagicMock()
+        self.strategy.handle_success = MagicMock()
+
+    def test_pauses_when_strategy_asks(self):
+        self.strategy.pause_time = MagicMock(side_effect=[3, 0])
+        self.component._should_run = True
+
+        with patch('hermes.components.interruptible_sleep') as mock_sleep:
+            self.assertTrue(self.component._pause())
+            self.assertFalse(self.component._pause())
+
+        self.assertEqual(mock_sleep.call_args[0][0], 3)
+
+    def test_success_after_error_is_reported_once(self):
+        self.component._recovering = True
+        self.component._should_run = LimitedTrueBool(2)
+        self.notif_queue.put(True)
+        self.notif_queue._reader.poll(1)
+
+        self.component._execute()
+
+        self.strategy.handle_success.assert_called_once_with()
+        self.assertFalse(self.component._recovering)
+
+    def test_success_after_pause_is_reported(self):
+        self.strategy.pause_time = MagicMock(return_value=3)
+        self.component._should_run = LimitedTrueBool(1)
+        self.notif_queue.put(True)
+        self.notif_queue._reader.poll(1)
+
+        with patch('hermes.components.interruptible_sleep'):
+            self.component._pause()
+        self.component._execute()
+
+        self.strategy.handle_success.assert_called_once_with()
+
+    def test_success_is_not_reported_without_error(self):
+        self.component._should_run = LimitedTrueBool(1)
+        self.notif_queue.put(True)
+        self.notif_queue._reader.poll(1)
+
+        self.component._execute()
+
+        self.assertEqual(self.strategy.handle_success.call_count, 0)
+
+
+class CircuitBreakerTrialTestCase(TestCase):
+    def setUp(self):
+        self.notif_queue = Queue(1)
+        self.breaker = CircuitBreakerStrategy(failure_threshold=1,
+                                              reset_timeout=0.5)
+        self.component = Component(self.notif_queue._reader, self.breaker,
+                                   Queue())
+        self.component.execute = MagicMock()
+        self.component.log = MagicMock()
+
+    def tearDown(self):
+        if self.component.is_alive():
+            self.component.terminate()
+            self.component.join()
+
+    def test_first_run_of_trial_closes_breaker(self):
+        self.breaker.handle_exception(ConnectionLostException(Exception()))
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.OPEN)
+        # A restarted Component is granted the try without pausing
+        sleep(0.5)
+
+        self.component.start()
+        self.notif_queue.put(True)
+        sleep(1)
+
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.CLOSED)
+
+
 class BackoffTimingTestCase(TestCase):
-    def test_backoff_is_one_on_zero(self):
-        with patch('hermes.components.sleep') as mock_sleep:
-            component = Component(MagicMock(), MagicMock(), MagicMock())
+    def test_default_backoff_is_jittered_up_to_limit(self):
+        component = Component(MagicMock(), MagicMock(), MagicMock(),
+                              backoff_limit=8)
+        self.assertIsInstance(component.backoff, DecorrelatedJitterBackoff)
+        self.assertEqual(component.backoff.limit, 8)
+
+    def test_backoff_sleeps_for_policy_delay(self):
+        with patch('hermes.components.interruptible_sleep') as mock_sleep:
+            component = Component(MagicMock(), MagicMock(), MagicMock(),
+                                  backoff=ExponentialBackoff())
             component.log = MagicMock()
+
+            component._backoff()
             component._backoff()
 
-            mock_sleep.assert_called_once_with(component.__backoff_time__)
-            self.assertEqual(component.__backoff_time__, 1)
+            self.assertEqual(mock_sleep.call_args_list[0][0][0], 1)
+            self.assertEqual(mock_sleep.call_args_list[1][0][0], 2)
 
-    def test_backoff_resets_to_one_when_over_limt(self):
-        with patch('hermes.components.sleep') as mock_sleep:
-            component = Component(MagicMock(), MagicMock(), MagicMock())
-            component.log = MagicMock()
+    def test_backoff_is_reset_by_success(self):
+        notif_queue = Queue(1)
+        component = Component(notif_queue._reader, AbstractErrorStrategy(),
+                              MagicMock(), backoff=ExponentialBackoff())
+        component.log = MagicMock()
+        # Succeeds once, then fails again without leaving the loop normally
+        component.execute = MagicMock(side_effect=[None, ValueError])
+        component._should_run = True
 
-            component.__backoff_time__ = component._backoff_limit + 1
+        with patch('hermes.components.interruptible_sleep') as mock_sleep:
+            component._backoff()
+            component._backoff()
+            component._recovering = True
+            notif_queue.put(True)
+            notif_queue._reader.poll(1)
+            self.assertRaises(ValueError, component._execute)
             component._backoff()
 
-            mock_sleep.assert_called_once_with(component.__backoff_time__)
-            self.assertEqual(component.__backoff_time__, 1)
+        self.assertEqual([call[0][0] for call in mock_sleep.call_args_list],
+                         [1, 2, 1])
 
-    def test_binary_backoff_implemented(self):
-        with patch('hermes.components.sleep') as mock_sleep:
+    def test_backoff_is_interrupted_by_stop(self):
+        with patch('hermes.backoff.sleep') as mock_sleep:
             component = Component(MagicMock(), MagicMock(), MagicMock())
             component.log = MagicMock()
-
-            component.__backoff_time__ = randint(1, 1000)
-            component._backoff_limit = component.__backoff_time__ << 3
-            expected_value = component.__backoff_time__ << 1
+            component._should_run = False
 
             component._backoff()
 
-            mock_sleep.assert_called_once_with(expected_value)
-            self.assertEqual(component.__backoff_time__, expected_value)
+            self.assertEqual(mock_sleep.call_count, 0)
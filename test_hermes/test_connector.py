@@ -1,9 +1,16 @@
 from __future__ import absolute_import
+import os
+import socket
+import sys
 import unittest
 
 from mock import MagicMock, patch, PropertyMock
+import psycopg2
+from psycopg2.extensions import POLL_OK, POLL_READ, POLL_WRITE
 
-from hermes.connectors import PostgresConnector
+from hermes.connectors import (
+    PostgresConnector, AsyncPostgresConnector, _TCP_USER_TIMEOUT
+)
 
 
 _POSTGRES_DSN = {
@@ -56,3 +63,369 @@ class ConnectorTestCase(unittest.TestCase):
 
             return_value = self.pg_connector.is_server_master()
             self.assertFalse(return_value)
+
+
+class KeepaliveTestCase(unittest.TestCase):
+    @patch('hermes.connectors.socket.fromfd')
+    @patch('hermes.connectors.psycopg2.connect')
+    def test_keepalives_are_configured(self, mock_connect, mock_fromfd):
+        pg_connector = PostgresConnector(_POSTGRES_DSN, keepalive=(10, 5, 3))
+        pg_connector.pg_connection
+
+        kwargs = mock_connect.call_args[1]
+        self.assertEqual(kwargs['database'], _POSTGRES_DSN['database'])
+        self.assertEqual(kwargs['keepalives'], 1)
+        self.assertEqual(kwargs['keepalives_idle'], 10)
+        self.assertEqual(kwargs['keepalives_interval'], 5)
+        self.assertEqual(kwargs['keepalives_count'], 3)
+        if sys.platform.startswith('linux'):
+            mock_fromfd.return_value.setsockopt.assert_called_once_with(
+                socket.IPPROTO_TCP, _TCP_USER_TIMEOUT, 25000
+            )
+
+    @patch('hermes.connectors.psycopg2.connect')
+    def test_keepalives_are_not_configured_by_default(self, mock_connect):
+        PostgresConnector(_POSTGRES_DSN).pg_connection
+        self.assertNotIn('keepalives', mock_connect.call_args[1])
+
+
+class StatementTimeoutTestCase(unittest.TestCase):
+    @patch('hermes.connectors.psycopg2.connect')
+    def test_statement_timeout_is_set(self, mock_connect):
+        dsn = dict(_POSTGRES_DSN, options='-c search_path=hermes')
+        PostgresConnector(dsn, statement_timeout=2.5).pg_connection
+        self.assertEqual(
+            mock_connect.call_args[1]['options'],
+            '-c search_path=hermes -c statement_timeout=2500'
+        )
+
+    @patch('hermes.connectors.psycopg2.connect')
+    def test_statement_timeout_is_not_set_by_default(self, mock_connect):
+        PostgresConnector(_POSTGRES_DSN).pg_connection
+        self.assertNotIn('options', mock_connect.call_args[1])
+
+
+class StreamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pg_connector = PostgresConnector(_POSTGRES_DSN)
+        self.connection = MagicMock(autocommit=True, closed=False)
+        self.pg_connector._pg_conn = self.connection
+        self.pg_connector._pid = os.getpid()
+        self.cursor = self.connection.cursor.return_value
+
+    def test_stream_yields_rows_through_named_cursor(self):
+        self.cursor.__iter__.return_value = iter([1, 2, 3])
+
+        rows = list(self.pg_connector.stream('SELECT 1;', itersize=10))
+
+        self.assertEqual(rows, [1, 2, 3])
+        self.assertEqual(self.cursor.itersize, 10)
+        self.assertIsNotNone(self.connection.cursor.call_args[0][0])
+        self.cursor.execute.assert_called_once_with('SELECT 1;', None)
+        self.cursor.close.assert_called_once_with()
+        self.connection.commit.assert_called_once_with()
+        self.assertTrue(self.connection.autocommit)
+
+    def test_stream_yields_batches(self):
+        self.cursor.fetchmany.side_effect = [[1, 2], [3], []]
+
+        batches = list(self.pg_connector.stream(
+            'SELECT 1;', itersize=2, batches=True
+        ))
+
+        self.assertEqual(batches, [[1, 2], [3]])
+        self.cursor.fetchmany.assert_called_with(2)
+
+    def test_stream_leaves_autocommit_while_running(self):
+        self.cursor.__iter__.return_value = iter([1])
+        stream = self.pg_connector.stream('SELECT 1;')
+
+        next(stream)
+        self.assertFalse(self.connection.autocommit)
+        stream.close()
+
+        self.assertTrue(self.connection.autocommit)
+        self.connection.rollback.assert_called_once_with()
+        self.assertEqual(self.connection.commit.call_count, 0)
+
+    def test_stream_rolls_back_on_error(self):
+        self.cursor.execute.side_effect = psycopg2.ProgrammingError
+
+        self.assertRaises(psycopg2.ProgrammingError, list,
+                          self.pg_connector.stream('SELECT;'))
+        self.connection.rollback.assert_called_once_with()
+        self.assertTrue(self.connection.autocommit)
+
+    def test_stream_uses_given_cursor_factory(self):
+        self.cursor.__iter__.return_value = iter([])
+        list(self.pg_connector.stream('SELECT 1;', cursor_factory=tuple))
+        self.assertEqual(
+            self.connection.cursor.call_args[1]['cursor_factory'], tuple
+        )
+
+
+class CopyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pg_connector = PostgresConnector(_POSTGRES_DSN)
+        self.pg_connector._pg_conn = MagicMock(closed=False)
+        self.pg_connector._pid = os.getpid()
+        self.cursor = self.pg_connector._pg_conn.cursor.return_value
+        self.cursor.closed = False
+
+    def test_copy_in_streams_rows(self):
+        def copy_expert(sql, stream, size):
+            self.assertEqual(stream.read(), '1\ta\n2\tb\n')
+
+        self.cursor.copy_expert.side_effect = copy_expert
+        loaded = self.pg_connector.copy_in(
+            'documents', iter([(1, 'a'), (2, 'b')]), columns=('id', 'name')
+        )
+
+        self.assertEqual(loaded, 2)
+        self.assertEqual(self.cursor.copy_expert.call_args[0][0],
+                         'COPY documents (id, name) FROM STDIN;')
+
+    def test_copy_out_uses_separate_connection(self):
+        with patch('hermes.connectors.psycopg2.connect') as mock_connect:
+            cursor = mock_connect.return_value.cursor.return_value
+            cursor.mogrify.return_value = 'SELECT 1;'
+            cursor.copy_expert.side_effect = \
+                lambda sql, stream: stream.write('1\n')
+
+            chunks = list(self.pg_connector.copy_out('SELECT 1;'))
+
+        self.assertEqual(chunks, [[['1']]])
+        self.assertEqual(cursor.copy_expert.call_args[0][0],
+                         'COPY (SELECT 1) TO STDOUT;')
+        mock_connect.return_value.close.assert_called_once_with()
+
+
+class PreparedStatementTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pg_connector = PostgresConnector(
+            _POSTGRES_DSN, prepared_cache_size=2
+        )
+        self.pg_connector._pg_conn = MagicMock(closed=False)
+        self.pg_connector._pid = os.getpid()
+        self.cursor = self.pg_connector._pg_conn.cursor.return_value
+        self.cursor.closed = False
+
+    def executed(self):
+        return [call[0] for call in self.cursor.execute.call_args_list]
+
+    def test_positional_query_is_prepared_once(self):
+        query = "SELECT * FROM t WHERE a = %s AND b LIKE 'x%%';"
+        self.pg_connector.execute_prepared(query, (1, ))
+        self.pg_connector.execute_prepared(query, (2, ))
+
+        self.assertEqual(self.executed(), [
+            ("PREPARE hermes_0 AS SELECT * FROM t WHERE a = $1 "
+             "AND b LIKE 'x%';", ),
+            ('EXECUTE hermes_0 (%s);', (1, )),
+            ('EXECUTE hermes_0 (%s);', (2, )),
+        ])
+        self.assertEqual(self.pg_connector.prepared_hits, 1)
+        self.assertEqual(self.pg_connector.prepared_misses, 1)
+
+    def test_named_parameters(self):
+        self.pg_connector.execute_prepared(
+            'SELECT %(b)s, %(a)s, %(b)s', {'a': 1, 'b': 2}
+        )
+        self.assertEqual(self.executed(), [
+            ('PREPARE hermes_0 AS SELECT $1, $2, $3;', ),
+            ('EXECUTE hermes_0 (%s, %s, %s);', [2, 1, 2]),
+        ])
+
+    def test_query_without_parameters(self):
+        self.pg_connector.execute_prepared('SELECT 1;')
+        self.assertEqual(self.executed()[-1], ('EXECUTE hermes_0;', ))
+
+    def test_least_recently_used_statement_is_deallocated(self):
+        self.pg_connector.execute_prepared('SELECT 1;')
+        self.pg_connector.execute_prepared('SELECT 2;')
+        self.pg_connector.execute_prepared('SELECT 1;')
+        self.pg_connector.execute_prepared('SELECT 3;')
+
+        self.assertIn(('DEALLOCATE hermes_1;', ), self.executed())
+        self.assertEqual(self.pg_connector._prepared.keys(),
+                         ['SELECT 1;', 'SELECT 3;'])
+
+    def test_cache_is_cleared_on_disconnect_and_reconnect(self):
+        self.pg_connector.execute_prepared('SELECT 1;')
+        self.pg_connector.disconnect()
+        self.assertEqual(len(self.pg_connector._prepared), 0)
+
+        self.pg_connector._prepared['SELECT 1;'] = ('hermes_0', None)
+        with patch('hermes.connectors.psycopg2.connect'):
+            self.pg_connector.pg_connection
+        self.assertEqual(len(self.pg_connector._prepared), 0)
+
+    def test_missing_statement_is_prepared_again(self):
+        self.pg_connector.execute_prepared('SELECT 1;')
+
+        error = psycopg2.ProgrammingError()
+        with patch.object(psycopg2.ProgrammingError, 'pgcode', '26000'):
+            self.cursor.execute.side_effect = [error, None, None]
+            self.pg_connector.execute_prepared('SELECT 1;')
+
+        self.assertEqual(self.executed()[-2:], [
+            ('PREPARE hermes_1 AS SELECT 1;', ), ('EXECUTE hermes_1;', )
+        ])
+
+    def test_disabled_cache_executes_directly(self):
+        self.pg_connector._prepared_cache_size = 0
+        self.pg_connector.execute_prepared('SELECT %s;', (1, ))
+        self.assertEqual(self.executed(), [('SELECT %s;', (1, ))])
+
+
+class NotificationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pg_connector = PostgresConnector(_POSTGRES_DSN)
+        self.pg_connector._pg_conn = MagicMock(closed=False)
+        self.pg_connector._pid = os.getpid()
+
+    def test_listen(self):
+        self.pg_connector._pg_cursor = MagicMock(closed=False)
+        self.pg_connector.listen('channel')
+        self.pg_connector._pg_cursor.execute.assert_called_once_with(
+            'LISTEN channel;'
+        )
+
+    def test_poll_notifications_drains_in_order(self):
+        connection = self.pg_connector._pg_conn
+        connection.notifies = [1, 2]
+
+        self.assertEqual(self.pg_connector.poll_notifications(), [1, 2])
+        connection.poll.assert_called_once_with()
+        self.assertEqual(connection.notifies, [])
+
+
+class AsyncConnectorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.connections = []
+
+        def connect(**kwargs):
+            self.assertEqual(kwargs['async'], 1)
+            connection = MagicMock(closed=False)
+            # Connecting needs one write, each query one read
+            connection.poll.side_effect = self._poll_states(connection)
+            self.connections.append(connection)
+            return connection
+
+        patcher = patch('hermes.connectors.psycopg2.connect',
+                        side_effect=connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        select_patcher = patch('hermes.connectors.select.select',
+                               side_effect=lambda r, w, x, t: (r, w, x))
+        self.mock_select = select_patcher.start()
+        self.addCleanup(select_patcher.stop)
+
+        self.connector = AsyncPostgresConnector(
+            _POSTGRES_DSN, max_connections=2
+        )
+
+    def _poll_states(self, connection):
+        yield POLL_WRITE
+        yield POLL_OK
+        while True:
+            yield POLL_READ
+            cursor = connection.cursor.return_value
+            if isinstance(cursor.execute.side_effect, Exception):
+                raise cursor.execute.side_effect
+            yield POLL_OK
+
+    def test_run_all_returns_results_in_order(self):
+        results = self.connector.run_all(
+            ['SELECT 1;', ('SELECT %s;', (2, )), 'SELECT 3;']
+        )
+
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual(len(results), 3)
+        cursors = [conn.cursor.return_value for conn in self.connections]
+        executed = [call[0] for cursor in cursors
+                    for call in cursor.execute.call_args_list]
+        self.assertEqual(sorted(executed), [
+            ('SELECT %s;', (2, )), ('SELECT 1;', None), ('SELECT 3;', None)
+        ])
+
+    def test_queries_run_concurrently(self):
+        first = self.connector.submit('SELECT 1;')
+        second = self.connector.submit('SELECT 2;')
+
+        readers, writers = self.connector.waiting()
+        self.assertEqual(len(writers), 2)
+        self.assertFalse(first.done or second.done)
+
+        self.assertTrue(self.connector.gather())
+        self.assertTrue(first.done and second.done)
+        # Both connections are waited on in the same select
+        self.assertEqual(len(self.mock_select.call_args_list[0][0][1]), 2)
+
+    def test_gather_times_out(self):
+        self.mock_select.side_effect = lambda r, w, x, t: ([], [], [])
+        query = self.connector.submit('SELECT 1;')
+        with patch('hermes.connectors.time', side_effect=[0, 0, 2]):
+            self.assertFalse(self.connector.gather([query], timeout=1))
+
+    def test_query_errors_are_raised_by_result(self):
+        self.connector.submit('SELECT 1;')
+        self.connector.gather()
+        cursor = self.connections[0].cursor.return_value
+        cursor.execute.side_effect = psycopg2.ProgrammingError()
+
+        query = self.connector.submit('SELEC 1;')
+        self.connector.gather()
+
+        self.assertRaises(psycopg2.ProgrammingError, query.result)
+        self.assertEqual(self.connector._idle, self.connections)
+
+    def test_close_fails_pending_queries(self):
+        query = self.connector.submit('SELECT 1;')
+        self.connector.close()
+
+        self.assertRaises(psycopg2.InterfaceError, query.result)
+        self.connections[0].close.assert_called_once_with()
+
+
+class ForkSafetyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pg_connector = PostgresConnector(_POSTGRES_DSN)
+        self.inherited = MagicMock(closed=False)
+        self.pg_connector._pg_conn = self.inherited
+        self.pg_connector._pg_cursor = self.inherited.cursor.return_value
+        self.pg_connector._pid = os.getpid() - 1
+
+    def test_inherited_connection_is_replaced_not_closed(self):
+        with patch('hermes.connectors.psycopg2.connect') as mock_connect:
+            connection = self.pg_connector.pg_connection
+
+        self.assertIs(connection, mock_connect.return_value)
+        self.assertEqual(self.pg_connector._pid, os.getpid())
+        self.assertEqual(self.inherited.close.call_count, 0)
+
+    def test_inherited_cursor_is_not_reused(self):
+        with patch('hermes.connectors.psycopg2.connect') as mock_connect:
+            cursor = self.pg_connector.pg_cursor
+        self.assertIs(cursor, mock_connect.return_value.cursor.return_value)
+
+    def test_disconnect_does_not_close_inherited_connection(self):
+        self.pg_connector.disconnect()
+        self.assertEqual(self.inherited.close.call_count, 0)
+        self.assertEqual(self.inherited.cursor.return_value.close.call_count,
+                         0)
+        self.assertIsNone(self.pg_connector._pg_conn)
+
+    def test_async_connector_forgets_inherited_connections(self):
+        connector = AsyncPostgresConnector(_POSTGRES_DSN)
+        connector._idle = [self.inherited]
+        connector._pid = os.getpid() - 1
+
+        with patch('hermes.connectors.psycopg2.connect') as mock_connect:
+            mock_connect.return_value.poll.return_value = POLL_WRITE
+            connector.submit('SELECT 1;')
+
+        self.assertEqual(connector._idle, [])
+        self.assertEqual(connector._busy.keys(), [mock_connect.return_value])
+        self.assertEqual(self.inherited.cursor.call_count, 0)
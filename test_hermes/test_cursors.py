@@ -0,0 +1,130 @@
+from __future__ import absolute_import
+from contextlib import closing
+import pickle
+import unittest
+
+from hermes.connectors import PostgresConnector
+from psycopg2.extensions import cursor as _cursor
+
+from hermes.cursors import CompactCursor, CompactRow, get_row_class
+
+
+_POSTGRES_DSN = {
+    'database': 'test_hermes'
+}
+_DESCRIPTION = (('id', ), ('name', ), ('count', ), ('class', ))
+
+
+class CompactRowTestCase(unittest.TestCase):
+    def setUp(self):
+        self.row_class = get_row_class(_DESCRIPTION)
+        self.row = self.row_class((1, 'name', 2, 3))
+
+    def test_row_class_is_cached_by_fields(self):
+        self.assertIs(get_row_class(list(_DESCRIPTION)), self.row_class)
+        self.assertTrue(issubclass(self.row_class, CompactRow))
+
+    def test_row_is_a_tuple(self):
+        self.assertIsInstance(self.row, tuple)
+        self.assertEqual(self.row, (1, 'name', 2, 3))
+        self.assertEqual(self.row[1:3], ('name', 2))
+
+    def test_access_by_name_and_attribute(self):
+        self.assertEqual(self.row['name'], 'name')
+        self.assertEqual(self.row.id, 1)
+        self.assertEqual(self.row.get('missing', 5), 5)
+        self.assertRaises(KeyError, lambda: self.row['missing'])
+
+    def test_clashing_names_are_not_attributes(self):
+        self.assertEqual(self.row['count'], 2)
+        self.assertEqual(self.row.count(2), 1)
+        self.assertEqual(self.row['class'], 3)
+
+    def test_mappings(self):
+        self.assertEqual(self.row.keys(), ['id', 'name', 'count', 'class'])
+        self.assertEqual(self.row._asdict(),
+                         {'id': 1, 'name': 'name', 'count': 2, 'class': 3})
+
+    def test_rows_can_be_pickled(self):
+        row = pickle.loads(pickle.dumps(self.row, 2))
+        self.assertEqual(row, self.row)
+        self.assertEqual(row.name, 'name')
+
+
+class _StubBaseCursor(_cursor):
+    """
+    Stands in for the named base cursor beneath :class:`CompactCursor`,
+    returning rows from a list instead of a connection and recording the
+    size of each fetch, as each would be a round trip.
+    """
+    rows = ()
+    description = _DESCRIPTION
+    name = 'hermes_stream_1'
+
+    def fetchone(self):
+        self.fetches.append(1)
+        if not self.rows:
+            return None
+        row, self.rows = self.rows[0], self.rows[1:]
+        return row
+
+    def fetchmany(self, size=None):
+        self.fetches.append(size)
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+class _StubCursor(CompactCursor, _StubBaseCursor):
+    pass
+
+
+class CompactCursorIterationTestCase(unittest.TestCase):
+    def _cursor(self, rows, itersize=2000):
+        cursor = _StubCursor.__new__(_StubCursor)
+        cursor.rows = rows
+        cursor.itersize = itersize
+        cursor.fetches = []
+        cursor._row_class = None
+        return cursor
+
+    def test_iteration_yields_compact_rows(self):
+        cursor = self._cursor([(1, 'a', 2, 'x'), (2, 'b', 3, 'y')])
+
+        rows = list(cursor)
+
+        self.assertEqual(rows, [(1, 'a', 2, 'x'), (2, 'b', 3, 'y')])
+        self.assertTrue(all(isinstance(row, CompactRow) for row in rows))
+        self.assertEqual(rows[1].name, 'b')
+
+    def test_iteration_fetches_itersize_rows_at_a_time(self):
+        cursor = self._cursor([(i, 'a', 0, 'x') for i in xrange(5)],
+                              itersize=2)
+
+        self.assertEqual([row.id for row in cursor], range(5))
+        # Three chunks, then an empty one ending the iteration
+        self.assertEqual(cursor.fetches, [2, 2, 2, 2])
+
+    def test_iteration_of_no_rows_ends(self):
+        cursor = self._cursor([])
+
+        self.assertEqual(list(cursor), [])
+        self.assertEqual(cursor.fetches, [2000])
+
+
+class CompactCursorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pg_connector = PostgresConnector(_POSTGRES_DSN)
+
+    def tearDown(self):
+        self.pg_connector.disconnect()
+
+    def test_cursor_returns_compact_rows(self):
+        connection = self.pg_connector.pg_connection
+        with closing(connection.cursor(cursor_factory=CompactCursor)) as cur:
+            cur.execute('SELECT i AS id FROM generate_series(1, 3) AS i;')
+            self.assertEqual(cur.fetchone().id, 1)
+            self.assertEqual([row['id'] for row in cur.fetchmany(1)], [2])
+            self.assertEqual([row.id for row in cur.fetchall()], [3])
+
+            cur.execute('SELECT 1 AS other;')
+            self.assertEqual([row.other for row in cur], [1])
@@ -0,0 +1,111 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from hermes.dedup import Deduplicator, _BloomFilter
+
+
+class BloomFilterTestCase(TestCase):
+    def test_added_keys_are_contained(self):
+        bloom = _BloomFilter(1000, 0.001)
+        for key in xrange(1000):
+            bloom.add(str(key))
+        self.assertTrue(all(str(key) in bloom for key in xrange(1000)))
+
+    def test_false_positive_rate(self):
+        bloom = _BloomFilter(1000, 0.01)
+        for key in xrange(1000):
+            bloom.add(str(key))
+        false_positives = sum(
+            1 for key in xrange(1000, 11000) if str(key) in bloom
+        )
+        self.assertLess(false_positives, 300)
+
+
+class InMemoryDeduplicatorTestCase(TestCase):
+    def setUp(self):
+        self.dedup = Deduplicator(max_entries=2)
+
+    def test_unhandled_ids_are_returned_in_order(self):
+        self.dedup.mark(2)
+        self.assertEqual(self.dedup.filter([3, 2, 1, 3]), [3, 1])
+        self.assertEqual(self.dedup.stats['duplicates'], 1)
+
+    def test_seen(self):
+        self.assertFalse(self.dedup.seen(u'\xe9v\xe9nement'))
+        self.dedup.mark(u'\xe9v\xe9nement')
+        self.assertTrue(self.dedup.seen(u'\xe9v\xe9nement'))
+
+    def test_lru_is_bounded(self):
+        self.dedup.mark(1, 2, 3)
+        self.assertEqual(self.dedup._recent.keys(), ['2', '3'])
+
+    def test_bloom_filter_remembers_evicted_ids(self):
+        self.dedup.mark(1, 2, 3)
+        self.assertEqual(self.dedup.filter([1]), [])
+
+    def test_ids_are_forgotten_after_two_windows(self):
+        with patch('hermes.dedup.time', return_value=0):
+            self.dedup = Deduplicator(max_entries=1, window=10)
+            self.dedup.mark(1, 2)
+        with patch('hermes.dedup.time', return_value=15):
+            self.assertEqual(self.dedup.filter([1]), [])
+        with patch('hermes.dedup.time', return_value=25):
+            self.assertEqual(self.dedup.filter([1]), [1])
+
+
+class TableDeduplicatorTestCase(TestCase):
+    def setUp(self):
+        self.pg_connector = MagicMock()
+        self.cursor = self.pg_connector.pg_cursor
+        self.lookup = self.pg_connector.pg_connection.cursor.return_value
+        self.lookup.__iter__.return_value = iter([])
+        self.lookup.fetchall.return_value = []
+        self.dedup = Deduplicator(self.pg_connector, table='dedup',
+                                  max_entries=1, batch_size=3)
+
+    def test_marked_ids_are_upserted_in_bulk(self):
+        self.dedup.mark(1, 2)
+        self.assertEqual(self.cursor.execute.call_count, 0)
+
+        self.dedup.mark(3)
+        self.cursor.execute.assert_called_once_with(
+            self.cursor.execute.call_args[0][0], (['1', '2', '3'], )
+        )
+        self.assertEqual(self.dedup.flush(), 0)
+
+    def test_new_ids_skip_the_table(self):
+        self.assertEqual(self.dedup.filter([1, 2]), [1, 2])
+        self.assertEqual(self.dedup.stats['table_lookups'], 0)
+
+    def test_pending_ids_skip_the_table(self):
+        self.dedup.mark(1, 2)
+        self.assertEqual(self.dedup.filter([1, 2, 3]), [3])
+        self.assertEqual(self.dedup.stats['table_lookups'], 0)
+
+    def test_possible_duplicates_are_checked_in_one_query(self):
+        self.dedup.mark(1, 2, 3)
+        self.lookup.fetchall.return_value = [('1', )]
+
+        self.assertEqual(self.dedup.filter([1, 2, 4]), [2, 4])
+        self.assertEqual(self.dedup.stats['table_lookups'], 1)
+        self.lookup.execute.assert_called_with(
+            self.lookup.execute.call_args[0][0], (['1', '2'], )
+        )
+
+    def test_non_ascii_ids_read_back_as_unicode_match(self):
+        self.dedup.mark(u'caf\xe9', u'th\xe9', 'x')
+        self.lookup.fetchall.return_value = [(u'caf\xe9', ), (u'th\xe9', )]
+
+        self.assertEqual(self.dedup.filter([u'caf\xe9', u'th\xe9', 'y']),
+                         ['y'])
+        self.assertEqual(self.dedup.stats['table_lookups'], 1)
+
+    def test_recently_handled_ids_are_loaded_once(self):
+        self.lookup.__iter__.return_value = iter([('1', )])
+        self.lookup.fetchall.return_value = [('1', )]
+
+        self.assertEqual(self.dedup.filter([1, 2]), [2])
+        self.dedup.filter([3])
+        self.assertEqual(self.lookup.execute.call_count, 2)
@@ -0,0 +1,119 @@
+from __future__ import absolute_import
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from unittest import TestCase
+
+from mock import MagicMock, patch
+from psycopg2 import OperationalError
+
+from hermes.errors import ErrorEvent, ErrorRates
+from hermes.strategies import BACKOFF, CONTINUE, TERMINATE
+
+
+class Processor(object):
+    pid = 1234
+    name = 'Processor-2'
+
+
+class ErrorEventTestCase(TestCase):
+    def test_from_exception(self):
+        error = OperationalError('server closed the connection')
+        with patch('hermes.errors.time', return_value=105):
+            event = ErrorEvent.from_exception(Processor(), error, True,
+                                              TERMINATE, occurred_at=100)
+
+        self.assertEqual(event.component, 'Processor')
+        self.assertEqual(event.name, 'Processor-2')
+        self.assertEqual(event.key, 'Processor-2')
+        self.assertEqual(event.pid, 1234)
+        self.assertEqual(event.exception, 'OperationalError')
+        self.assertEqual(event.message, 'server closed the connection')
+        self.assertIsNone(event.sqlstate)
+        self.assertEqual(event.occurred_at, 100)
+        self.assertEqual(event.reported_at, 105)
+
+    def test_unicode_message(self):
+        event = ErrorEvent.from_exception(Processor(), ValueError(u'caf\xe9'),
+                                          True, BACKOFF)
+        self.assertEqual(event.message, 'caf\xc3\xa9')
+
+    def test_encoded_message_is_kept(self):
+        event = ErrorEvent.from_exception(
+            Processor(), OperationalError('caf\xc3\xa9'), True, BACKOFF
+        )
+        self.assertEqual(event.message, 'caf\xc3\xa9')
+
+    def test_unprintable_message_falls_back_to_repr(self):
+        class Unprintable(Exception):
+            def __str__(self):
+                raise UnicodeEncodeError('ascii', u'', 0, 1, 'bad')
+
+            def __unicode__(self):
+                raise ValueError
+
+        event = ErrorEvent.from_exception(Processor(), Unprintable(), True,
+                                          BACKOFF)
+        self.assertEqual(event.message, 'Unprintable()')
+
+    def test_sqlstate_is_taken_from_pgcode(self):
+        error = MagicMock(spec=Exception, pgcode='40P01')
+        event = ErrorEvent.from_exception(Processor(), error, True, BACKOFF)
+        self.assertEqual(event.sqlstate, '40P01')
+
+    def test_coerces_legacy_tuple(self):
+        event = ErrorEvent.coerce((False, TERMINATE))
+        self.assertFalse(event.expected)
+        self.assertEqual(event.action, TERMINATE)
+        self.assertIs(ErrorEvent.coerce(event), event)
+
+    def test_terminal(self):
+        self.assertTrue(ErrorEvent.coerce((True, TERMINATE)).terminal)
+        self.assertFalse(ErrorEvent.coerce((True, BACKOFF)).terminal)
+        self.assertFalse(ErrorEvent.coerce((True, CONTINUE)).terminal)
+
+    def test_survives_pickling(self):
+        event = ErrorEvent('Processor', 1, 'KeyError', 'x', True, TERMINATE)
+        self.assertEqual(loads(dumps(event, HIGHEST_PROTOCOL)).exception,
+                         'KeyError')
+
+
+class ErrorRatesTestCase(TestCase):
+    def _event(self, component, occurred_at, name=None):
+        return ErrorEvent(component, 1, 'KeyError', 'x', True, CONTINUE,
+                          sqlstate='23505', occurred_at=occurred_at,
+                          name=name)
+
+    def test_rate_is_counted_within_window(self):
+        rates = ErrorRates(window=10)
+        with patch('hermes.errors.time', return_value=100):
+            for occurred_at in (85, 95, 99):
+                rates.record(self._event('Processor', occurred_at))
+            self.assertEqual(rates.count('Processor'), 2)
+            self.assertEqual(rates.rate('Processor'), 0.2)
+            self.assertEqual(rates.count('Listener'), 0)
+
+    def test_stats_per_component(self):
+        rates = ErrorRates(window=10)
+        with patch('hermes.errors.time', return_value=100):
+            rates.record(self._event('Processor', 95))
+            rates.record(self._event('Listener', 99))
+        with patch('hermes.errors.time', return_value=107):
+            stats = rates.stats
+
+        self.assertEqual(stats['Processor']['errors'], 1)
+        self.assertEqual(stats['Processor']['recent'], 0)
+        self.assertEqual(stats['Listener']['recent'], 1)
+        self.assertEqual(stats['Listener']['last_sqlstate'], '23505')
+
+    def test_components_of_the_same_class_are_counted_apart(self):
+        rates = ErrorRates(window=10)
+        with patch('hermes.errors.time', return_value=100):
+            rates.record(self._event('Writer', 95, name='Writer-3'))
+            rates.record(self._event('Writer', 96, name='Writer-3'))
+            rates.record(self._event('Writer', 97, name='Writer-4'))
+
+            self.assertEqual(rates.count('Writer-3'), 2)
+            self.assertEqual(rates.count('Writer-4'), 1)
+            self.assertEqual(rates.count('Writer'), 0)
+            stats = rates.stats
+
+        self.assertEqual(stats['Writer-4']['component'], 'Writer')
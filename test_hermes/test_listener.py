@@ -7,10 +7,16 @@ from time import sleep
 from unittest import TestCase
 
 from mock import MagicMock, patch
+from psycopg2 import OperationalError
 
+from hermes.codecs import JsonCodec
 from hermes.connectors import PostgresConnector
+from hermes.exceptions import (
+    ConnectionLostException, InvalidConfigurationException,
+    PayloadDecodeException
+)
 from hermes.listeners import PostgresNotificationListener
-from hermes.strategies import CommonErrorStrategy
+from hermes.strategies import CommonErrorStrategy, CONTINUE, TERMINATE
 from test_hermes.util import LimitedTrueBool
 
 
@@ -94,6 +100,14 @@ class FunctionalListenerTestCase(TestCase):
     def tearDown(self):
         self.listener = None
 
+    def test_init_does_not_connect(self):
+        pg_connector = MagicMock()
+        listener = PostgresNotificationListener(
+            pg_connector, MagicMock(), MagicMock(), MagicMock(), MagicMock()
+        )
+        self.assertIsNone(listener.notification_pipe)
+        self.assertEqual(pg_connector.mock_calls, [])
+
     def test_setup_executes_listen_command(self):
         self.listener.set_up()
 
@@ -143,6 +157,133 @@ class FunctionalListenerTestCase(TestCase):
 
         self.listener.notif_queue.put_nowait.assert_called_once_with(True)
 
+    def test_execute_forwards_payloads_in_order(self):
+        self.listener._forward_payloads = True
+        self.listener.pg_connector.poll_notifications.return_value = [
+            MagicMock(payload='first'), MagicMock(payload='second')
+        ]
+
+        self.listener.execute(None)
+
+        put_calls = self.listener.notif_queue.put.call_args_list
+        self.assertEqual([call[0][0] for call in put_calls],
+                         ['first', 'second'])
+
+    def test_execute_resolves_spilled_payloads(self):
+        self.listener._forward_payloads = True
+        self.listener._spill_table = 'spill'
+        self.listener.pg_connector.poll_notifications.return_value = [
+            MagicMock(payload='reference')
+        ]
+
+        with patch('hermes.listeners.resolve_spilled_payloads',
+                   return_value=['resolved']) as mock_resolve:
+            self.listener.execute(None)
+
+        mock_resolve.assert_called_once_with(
+            self.listener.pg_connector, 'spill', ['reference']
+        )
+        self.listener.notif_queue.put.assert_called_once_with('resolved')
+
+    def test_codec_requires_forwarded_payloads(self):
+        self.assertRaises(
+            InvalidConfigurationException, PostgresNotificationListener,
+            MagicMock(), MagicMock(), MagicMock(), MagicMock(), MagicMock(),
+            codec=JsonCodec()
+        )
+        self.assertRaises(
+            InvalidConfigurationException, PostgresNotificationListener,
+            MagicMock(), MagicMock(), MagicMock(), MagicMock(), MagicMock(),
+            batch=True
+        )
+
+    def _set_payloads(self, *payloads):
+        self.listener._forward_payloads = True
+        self.listener._codec = JsonCodec()
+        self.listener.log = MagicMock()
+        self.listener.pg_connector.poll_notifications.return_value = [
+            MagicMock(payload=payload) for payload in payloads
+        ]
+
+    def test_execute_decodes_payloads(self):
+        self._set_payloads('{"id": 1}', '[2]')
+        self.listener.execute(None)
+
+        put_calls = self.listener.notif_queue.put.call_args_list
+        self.assertEqual([call[0][0] for call in put_calls],
+                         [{'id': 1}, [2]])
+
+    def test_execute_batches_payloads(self):
+        self._set_payloads('1', '2', '3')
+        self.listener._batch = True
+        self.listener.execute(None)
+        self.listener.notif_queue.put.assert_called_once_with([1, 2, 3])
+
+    def test_execute_does_not_put_empty_batch(self):
+        self._set_payloads()
+        self.listener._batch = True
+        self.listener.execute(None)
+        self.assertEqual(self.listener.notif_queue.put.call_count, 0)
+
+    def test_malformed_payload_is_dropped(self):
+        self._set_payloads('1', '{', '3')
+        self.listener.execute(None)
+
+        put_calls = self.listener.notif_queue.put.call_args_list
+        self.assertEqual([call[0][0] for call in put_calls], [1, 3])
+        self.assertEqual(self.listener.log.warning.call_count, 1)
+
+    def test_malformed_payload_is_reported_once(self):
+        self._set_payloads('{')
+        self.listener.execute(None)
+
+        self.assertEqual(
+            self.listener.error_strategy.handle_exception.call_count, 0
+        )
+        event = self.listener.error_queue.put.call_args[0][0]
+        self.assertEqual(event.exception, 'PayloadDecodeException')
+        self.assertEqual(event.action, CONTINUE)
+
+    def test_heartbeat_interval_is_idle_timeout(self):
+        listener = PostgresNotificationListener(
+            MagicMock(), MagicMock(), MagicMock(), MagicMock(), MagicMock(),
+            heartbeat_interval=30
+        )
+        self.assertEqual(listener._idle_timeout, 30)
+
+    def test_on_idle_runs_heartbeat_query(self):
+        self.listener.notification_pipe = MagicMock(notifies=[])
+        self.listener.execute = MagicMock()
+
+        self.listener.on_idle()
+
+        cursor = self.listener.notification_pipe.cursor.return_value
+        cursor.execute.assert_called_once_with('SELECT 1;')
+        self.assertEqual(self.listener.execute.call_count, 0)
+
+    def test_on_idle_reads_notifications_received_with_heartbeat(self):
+        self.listener.notification_pipe = MagicMock(notifies=[MagicMock()])
+        self.listener.execute = MagicMock()
+
+        self.listener.on_idle()
+
+        self.assertEqual(self.listener.execute.call_count, 1)
+
+    def test_failed_heartbeat_raises_connection_lost(self):
+        self.listener.notification_pipe = MagicMock()
+        cursor = self.listener.notification_pipe.cursor.return_value
+        cursor.execute.side_effect = OperationalError
+
+        self.assertRaises(ConnectionLostException, self.listener.on_idle)
+
+    def test_execute_raises_connection_lost_on_closed_pipe(self):
+        self.listener.notification_pipe = MagicMock(closed=2)
+        self.listener.pg_connector.pg_connection.poll.side_effect = \
+            OperationalError
+
+        self.assertRaises(ConnectionLostException, self.listener.execute,
+                          None)
+
     def test_tear_down_calls_super(self):
         with patch('hermes.components.Component.tear_down') as mock_tear:
             self.listener.tear_down()
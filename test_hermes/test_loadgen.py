@@ -0,0 +1,89 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from hermes import loadgen
+
+
+class LoadgenParserTestCase(TestCase):
+    def test_defaults(self):
+        options = loadgen.build_parser().parse_args([])
+        self.assertEqual(options.rate, 1000)
+        self.assertEqual(options.batch_size, 1)
+        self.assertEqual(options.concurrency, 1)
+        self.assertIsNone(options.count)
+
+    def test_options_are_parsed(self):
+        options = loadgen.build_parser().parse_args(
+            ['-r', '50', '-s', '128', '-c', '4', '-b', '10', '-j', '2',
+             '-d', '3', '-n', '500']
+        )
+        self.assertEqual(options.rate, 50)
+        self.assertEqual(options.payload_size, 128)
+        self.assertEqual(options.channels, 4)
+        self.assertEqual(options.batch_size, 10)
+        self.assertEqual(options.concurrency, 2)
+        self.assertEqual(options.duration, 3)
+        self.assertEqual(options.count, 500)
+
+
+class MakePayloadTestCase(TestCase):
+    def test_payload_is_padded_to_size(self):
+        payload = loadgen.make_payload('0-1', 64)
+        self.assertEqual(len(payload), 64)
+        self.assertTrue(payload.startswith('0-1:'))
+
+    def test_payload_is_never_truncated(self):
+        payload = loadgen.make_payload('0-123456', 2)
+        self.assertEqual(payload, '0-123456:')
+
+
+class SendNotificationsTestCase(TestCase):
+    def _send(self, args, worker_no=0):
+        options = loadgen.build_parser().parse_args(args)
+        result_queue = MagicMock()
+        with patch('hermes.loadgen.PostgresConnector'):
+            with patch('hermes.loadgen.NotificationPublisher') as mock_pub:
+                with patch('hermes.loadgen.sleep'):
+                    loadgen.send_notifications(
+                        {}, options, worker_no, result_queue
+                    )
+        return mock_pub.return_value, result_queue
+
+    def test_count_is_split_between_workers(self):
+        args = ['-n', '7', '-j', '2', '-b', '3', '-r', '0']
+        publisher, result_queue = self._send(args, worker_no=0)
+
+        sent, _ = result_queue.put.call_args[0][0]
+        self.assertEqual(sent, 4)
+        self.assertEqual(publisher.publish.call_count, 4)
+        self.assertEqual(publisher.flush.call_count, 2)
+
+        _, result_queue = self._send(args, worker_no=1)
+        sent, _ = result_queue.put.call_args[0][0]
+        self.assertEqual(sent, 3)
+
+    def test_batches_are_fanned_out(self):
+        publisher, _ = self._send(
+            ['-n', '4', '-b', '4', '-c', '2', '-s', '16']
+        )
+        publisher.flush.assert_called_once_with()
+
+        channels = [call[0][0] for call in publisher.publish.call_args_list]
+        payloads = [call[0][1] for call in publisher.publish.call_args_list]
+        self.assertEqual(channels, ['hermes_load_0', 'hermes_load_1'] * 2)
+        self.assertEqual(len(set(payloads)), 4)
+        self.assertTrue(all(len(payload) == 16 for payload in payloads))
+
+    def test_result_reported_on_error(self):
+        options = loadgen.build_parser().parse_args(['-n', '1'])
+        result_queue = MagicMock()
+        with patch('hermes.loadgen.PostgresConnector'):
+            with patch('hermes.loadgen.NotificationPublisher') as mock_pub:
+                mock_pub.return_value.flush.side_effect = Exception
+                self.assertRaises(Exception, loadgen.send_notifications,
+                                  {}, options, 0, result_queue)
+        self.assertEqual(result_queue.put.call_count, 1)
+        sent, _ = result_queue.put.call_args[0][0]
+        self.assertEqual(sent, 0)
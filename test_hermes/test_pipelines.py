@@ -0,0 +1,129 @@
+from __future__ import absolute_import
+from Queue import Full
+from multiprocessing.queues import Queue
+from time import sleep, time
+from unittest import TestCase
+
+from mock import MagicMock
+
+from hermes.exceptions import InvalidConfigurationException
+from hermes.pipelines import Pipeline, Stage
+from hermes.strategies import CommonErrorStrategy
+from test_hermes.util import LimitedTrueBool
+
+
+class Doubler(Stage):
+    def process(self, item):
+        return item * 2
+
+
+class StageTestCase(TestCase):
+    def setUp(self):
+        self.input_queue = Queue(1)
+        self.output_queue = Queue(1)
+        self.stage = Doubler(self.input_queue, self.output_queue,
+                             CommonErrorStrategy(), Queue())
+        self.stage.log = MagicMock()
+
+    def test_raises_not_implemented(self):
+        stage = Stage(self.input_queue, None, CommonErrorStrategy(), Queue())
+        self.assertRaises(NotImplementedError, stage.process, None)
+
+    def test_result_is_put_onto_output_queue(self):
+        self.input_queue.put(2)
+
+        self.stage._should_run = LimitedTrueBool(2)
+        self.stage._execute()
+
+        self.assertEqual(self.output_queue.get(timeout=1), 4)
+
+    def test_empty_input_queue_is_ignored(self):
+        self.stage.process = MagicMock()
+        self.stage.execute(None)
+        self.assertEqual(self.stage.process.call_count, 0)
+
+    def test_none_is_not_passed_on(self):
+        self.stage.output_queue = MagicMock()
+        self.stage.process = MagicMock(return_value=None)
+        self.input_queue.put(1)
+
+        self.stage._should_run = LimitedTrueBool(1)
+        self.stage._execute()
+
+        self.stage.process.assert_called_once_with(1)
+        self.assertEqual(self.stage.output_queue.put.call_count, 0)
+
+    def test_blocked_put_gives_up_when_stopped(self):
+        self.stage.output_queue = MagicMock()
+        self.stage.output_queue.put.side_effect = Full
+        self.stage._should_run = LimitedTrueBool(2)
+
+        self.stage._put(1)
+
+        self.assertEqual(self.stage.output_queue.put.call_count, 2)
+
+    def test_blocked_put_is_not_busy(self):
+        busy_times = []
+        self.stage.output_queue = MagicMock()
+        self.stage.output_queue.put.side_effect = \
+            lambda *args, **kwargs: busy_times.append(self.stage.busy_time())
+        self.stage._should_run = True
+        self.stage._busy_since.value = 100
+
+        self.stage._put(1)
+
+        self.assertEqual(busy_times, [0])
+        self.assertAlmostEqual(self.stage._busy_since.value, 100, places=1)
+
+    def test_blocked_time_is_not_busy_afterwards(self):
+        self.stage = Doubler(self.input_queue, self.output_queue,
+                             CommonErrorStrategy(), Queue(),
+                             execute_timeout=1)
+        self.stage.output_queue = MagicMock()
+        self.stage.output_queue.put.side_effect = \
+            lambda *args, **kwargs: sleep(1.5)
+        self.stage._should_run = True
+        self.stage._busy_since.value = time()
+
+        self.stage._put(1)
+
+        self.assertLess(self.stage.busy_time(), self.stage.execute_timeout)
+
+
+class PipelineTestCase(TestCase):
+    def setUp(self):
+        self.input_queue = Queue(1)
+        self.error_queue = Queue()
+        self.pipeline = Pipeline(self.input_queue, self.error_queue,
+                                 queue_size=5)
+
+    def test_stages_are_chained_by_queues(self):
+        self.pipeline.add_stage(Doubler, CommonErrorStrategy(), workers=2)
+        self.pipeline.add_stage(Doubler, CommonErrorStrategy(),
+                                backoff_limit=32)
+
+        first, second, last = self.pipeline.components
+
+        self.assertIs(first.input_queue, self.input_queue)
+        self.assertIs(second.input_queue, self.input_queue)
+        self.assertIs(first.output_queue, second.output_queue)
+        self.assertIs(last.input_queue, first.output_queue)
+        self.assertIsNone(last.output_queue)
+        self.assertEqual(last._backoff_limit, 32)
+        for component in self.pipeline.components:
+            self.assertIs(component.error_queue, self.error_queue)
+
+    def test_components_are_built_once(self):
+        self.pipeline.add_stage(Doubler, CommonErrorStrategy())
+        self.assertIs(self.pipeline.components[0],
+                      self.pipeline.components[0])
+
+    def test_add_stage_throws_on_non_stage(self):
+        self.assertRaises(InvalidConfigurationException,
+                          self.pipeline.add_stage, object,
+                          CommonErrorStrategy())
+
+    def test_add_stage_throws_without_workers(self):
+        self.assertRaises(InvalidConfigurationException,
+                          self.pipeline.add_stage, Doubler,
+                          CommonErrorStrategy(), workers=0)
@@ -0,0 +1,120 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from mock import MagicMock
+
+from hermes.publishers import (
+    NotificationPublisher, resolve_spilled_payloads, SPILL_PREFIX
+)
+
+
+class NotificationPublisherTestCase(TestCase):
+    def setUp(self):
+        self.pg_connector = MagicMock()
+        self.cursor = self.pg_connector.pg_cursor
+        self.cursor.mogrify.side_effect = lambda sql, params: sql
+        self.publisher = NotificationPublisher(
+            self.pg_connector, batch_size=3, max_payload_size=10
+        )
+
+    def test_flush_without_notifications_does_nothing(self):
+        self.assertEqual(self.publisher.flush(), 0)
+        self.assertEqual(self.cursor.execute.call_count, 0)
+
+    def test_publish_buffers_until_batch_size(self):
+        self.publisher.publish('channel', 'a')
+        self.publisher.publish('channel', 'b')
+        self.assertEqual(self.cursor.execute.call_count, 0)
+
+        self.publisher.publish('channel', 'c')
+        self.assertEqual(self.cursor.execute.call_count, 1)
+        self.cursor.mogrify.assert_called_once_with(
+            self.cursor.mogrify.call_args[0][0],
+            (['channel'] * 3, ['a', 'b', 'c'])
+        )
+
+    def test_batch_is_sent_in_a_single_execute(self):
+        self.publisher.publish('first', 'a')
+        self.publisher.publish('second', 'b')
+        self.assertEqual(self.publisher.flush(), 2)
+
+        self.assertEqual(self.cursor.execute.call_count, 1)
+        self.assertIn('pg_notify', self.cursor.execute.call_args[0][0])
+        self.assertEqual(self.publisher.flush(), 0)
+
+    def test_oversized_payloads_are_spilled(self):
+        self.publisher.publish('channel', 'x' * 11)
+        self.publisher.flush()
+
+        sql = self.cursor.execute.call_args[0][0]
+        self.assertTrue(sql.startswith('INSERT INTO {}'.format(
+            self.publisher.spill_table
+        )))
+
+        spill_params = self.cursor.mogrify.call_args_list[1][0][1]
+        notify_params = self.cursor.mogrify.call_args_list[0][0][1]
+        keys, payloads = spill_params
+        self.assertEqual(payloads, ['x' * 11])
+        self.assertEqual(notify_params[1], [SPILL_PREFIX + keys[0]])
+
+    def test_unicode_payload_size_is_measured_in_bytes(self):
+        self.publisher.publish('channel', u'\xe9' * 6)
+        self.publisher.flush()
+        self.assertEqual(self.cursor.mogrify.call_count, 2)
+
+    def test_oversized_payload_without_spill_table_raises(self):
+        self.publisher.spill_table = None
+        self.assertRaises(ValueError, self.publisher.publish,
+                          'channel', 'x' * 11)
+
+    def test_payloads_are_encoded_by_codec(self):
+        self.publisher._codec = MagicMock()
+        self.publisher._codec.encode.return_value = 'encoded'
+        self.publisher.publish('channel', {'id': 1})
+        self.publisher.flush()
+
+        self.publisher._codec.encode.assert_called_once_with({'id': 1})
+        notify_params = self.cursor.mogrify.call_args[0][1]
+        self.assertEqual(notify_params[1], ['encoded'])
+
+    def test_context_manager_flushes_on_success(self):
+        with self.publisher:
+            self.publisher.publish('channel', 'a')
+        self.assertEqual(self.cursor.execute.call_count, 1)
+
+    def test_context_manager_discards_on_error(self):
+        try:
+            with self.publisher:
+                self.publisher.publish('channel', 'a')
+                raise KeyError
+        except KeyError:
+            pass
+        self.assertEqual(self.cursor.execute.call_count, 0)
+        self.assertEqual(self.publisher.flush(), 0)
+
+
+class ResolveSpilledPayloadsTestCase(TestCase):
+    def setUp(self):
+        self.pg_connector = MagicMock()
+        self.cursor = self.pg_connector.pg_connection.cursor.return_value
+
+    def test_no_query_without_references(self):
+        payloads = ['a', 'b']
+        self.assertEqual(
+            resolve_spilled_payloads(self.pg_connector, 'spill', payloads),
+            payloads
+        )
+        self.assertEqual(self.cursor.execute.call_count, 0)
+
+    def test_references_are_resolved_in_one_query(self):
+        self.cursor.fetchall.return_value = [('k1', 'big1'), ('k2', 'big2')]
+        payloads = [SPILL_PREFIX + 'k1', 'small', SPILL_PREFIX + 'k2']
+
+        resolved = resolve_spilled_payloads(
+            self.pg_connector, 'spill', payloads
+        )
+
+        self.assertEqual(resolved, ['big1', 'small', 'big2'])
+        self.cursor.execute.assert_called_once_with(
+            self.cursor.execute.call_args[0][0], (['k1', 'k2'], )
+        )
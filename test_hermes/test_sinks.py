@@ -0,0 +1,288 @@
+from __future__ import absolute_import
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import json
+from multiprocessing.queues import Queue
+from threading import Thread
+from time import sleep, time
+from unittest import TestCase
+import zlib
+
+from mock import MagicMock
+
+from hermes.exceptions import (
+    BulkRequestException, InvalidConfigurationException
+)
+from hermes.sinks import BatchingSink, HttpBulkSink
+from hermes.strategies import CommonErrorStrategy
+from test_hermes.util import LimitedTrueBool
+
+
+class StubSink(BatchingSink):
+    """
+    Records the batches it writes, failing the next ``failures`` writes.
+    """
+    failures = 0
+
+    def write(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise IOError('Target unavailable')
+        self.written.append(list(batch))
+
+
+class QueueSink(BatchingSink):
+    """
+    Puts the batches it writes onto the ``written`` queue, so they can be
+    seen from outside the sink's process.
+    """
+
+    def write(self, batch):
+        self.written.put(list(batch))
+
+
+class BatchingSinkTestCase(TestCase):
+    def setUp(self):
+        self.input_queue = Queue(1)
+        self.sink = self._sink()
+
+    def _sink(self, **kwargs):
+        sink = StubSink(self.input_queue, None, CommonErrorStrategy(),
+                        Queue(), **kwargs)
+        sink.log = MagicMock()
+        sink.written = []
+        sink.acknowledge = MagicMock()
+        return sink
+
+    def test_raises_not_implemented(self):
+        sink = BatchingSink(self.input_queue, None, CommonErrorStrategy(),
+                            Queue())
+        self.assertRaises(NotImplementedError, sink.write, [])
+
+    def test_max_items_must_be_positive(self):
+        self.assertRaises(InvalidConfigurationException,
+                          self._sink, max_items=0)
+
+    def test_flushes_on_max_items(self):
+        self.sink = self._sink(max_items=2)
+        for item in ('a', 'b', 'c'):
+            self.sink.process(item)
+
+        self.assertEqual(self.sink.written, [['a', 'b']])
+        self.sink.acknowledge.assert_called_once_with(['a', 'b'])
+
+    def test_flushes_on_max_bytes(self):
+        self.sink = self._sink(max_bytes=4)
+        self.sink.process('abc')
+        self.assertEqual(self.sink.written, [])
+
+        self.sink.process('de')
+        self.assertEqual(self.sink.written, [['abc', 'de']])
+
+    def test_flushes_on_max_age(self):
+        self.sink.process('a')
+        self.sink._flush_expired()
+        self.assertEqual(self.sink.written, [])
+
+        self.sink._buffered_since = time() - 1
+        self.sink._flush_expired()
+        self.assertEqual(self.sink.written, [['a']])
+
+    def test_deadline_follows_oldest_item(self):
+        self.assertEqual(self.sink._flush_deadline(100), 101)
+        self.sink.process('a')
+        self.sink._buffered_since = 50
+        self.assertEqual(self.sink._flush_deadline(100), 51)
+
+    def test_failed_batch_is_retried_before_the_next(self):
+        self.sink = self._sink(max_items=1)
+        self.sink.failures = 1
+
+        self.assertRaises(IOError, self.sink.process, 'a')
+        self.assertEqual(self.sink.acknowledge.call_count, 0)
+
+        self.sink.process('b')
+        self.assertEqual(self.sink.written, [['a'], ['b']])
+        self.assertEqual(self.sink.acknowledge.call_count, 2)
+
+    def test_failed_batch_is_retried_on_set_up(self):
+        self.sink = self._sink(max_items=1)
+        self.sink.failures = 1
+        self.assertRaises(IOError, self.sink.process, 'a')
+
+        self.sink.set_up()
+        self.assertEqual(self.sink.written, [['a']])
+
+    def test_pipelined_flush_error_is_raised_on_next_flush(self):
+        self.sink = self._sink(max_items=1, pipelined=True)
+        self.sink.failures = 1
+
+        self.sink.process('a')
+        self.assertRaises(IOError, self.sink.flush)
+
+        self.sink.process('b')
+        self.sink.flush()
+        self.assertEqual(self.sink.written, [['a'], ['b']])
+
+    def test_buffer_is_flushed_when_stopped(self):
+        self.sink.process('a')
+        self.sink._should_run = LimitedTrueBool(0)
+
+        self.sink._execute()
+
+        self.assertEqual(self.sink.written, [['a']])
+
+    def test_buffer_is_flushed_on_sigterm(self):
+        sink = QueueSink(self.input_queue, None, CommonErrorStrategy(),
+                         Queue(), max_age=None)
+        sink.written = Queue()
+        sink.start()
+        try:
+            self.input_queue.put('a')
+            # Let the sink buffer the item and go back to waiting on select
+            sleep(1)
+            sink.terminate()
+
+            self.assertEqual(sink.written.get(timeout=5), ['a'])
+        finally:
+            sink.join(timeout=5)
+
+    def test_written_batch_is_passed_on(self):
+        output_queue = Queue()
+        sink = StubSink(self.input_queue, output_queue,
+                        CommonErrorStrategy(), Queue(), max_items=1)
+        sink.written = []
+        sink._should_run = True
+
+        sink.process('a')
+
+        self.assertEqual(output_queue.get(timeout=1), ['a'])
+
+
+class StubBulkHandler(BaseHTTPRequestHandler):
+    """
+    Records each request body and replies with the server's next response.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        self.server.bodies.append(body)
+
+        status, response = self.server.responses.pop(0) \
+            if self.server.responses else (200, '{"errors": false}')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubBulkServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class HttpBulkSinkTestCase(TestCase):
+    def setUp(self):
+        self.server = StubBulkServer(('127.0.0.1', 0), StubBulkHandler)
+        self.server.bodies = []
+        self.server.responses = []
+        self.server.connections = 0
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/_bulk'.format(self.server.server_port)
+        self.sinks = []
+
+    def tearDown(self):
+        for sink in self.sinks:
+            sink.tear_down()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _sink(self, **kwargs):
+        sink = HttpBulkSink(Queue(1), None, CommonErrorStrategy(), Queue(),
+                            self.url, **kwargs)
+        sink.log = MagicMock()
+        self.sinks.append(sink)
+        return sink
+
+    def test_rejects_non_http_url(self):
+        self.url = 'ftp://127.0.0.1/'
+        self.assertRaises(InvalidConfigurationException, self._sink)
+
+    def test_batch_is_sent_as_ndjson(self):
+        sink = self._sink()
+        sink.write([{'id': 1}, {'id': 2}])
+
+        self.assertEqual(
+            [json.loads(line)
+             for line in self.server.bodies[0].splitlines()],
+            [{'id': 1}, {'id': 2}]
+        )
+        self.assertTrue(self.server.bodies[0].endswith('\n'))
+
+    def test_lines_can_add_action_lines(self):
+        sink = self._sink()
+        sink.lines = lambda item: [{'index': {'_id': item['id']}}, item]
+        sink.write([{'id': 1}])
+
+        self.assertEqual(len(self.server.bodies[0].splitlines()), 2)
+
+    def test_connection_is_kept_alive(self):
+        sink = self._sink()
+        sink.write(['a'])
+        sink.write(['b'])
+        self.assertEqual(len(self.server.bodies), 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_compressed_body(self):
+        sink = self._sink(compress=True)
+        sink.write(['a'])
+        self.assertEqual(self.server.bodies, ['"a"\n'])
+
+    def test_batch_is_split_over_concurrent_requests(self):
+        sink = self._sink(concurrency=2, request_items=2)
+        sink.write(['a', 'b', 'c', 'd', 'e'])
+
+        self.assertEqual(
+            sorted(self.server.bodies),
+            ['"a"\n"b"\n', '"c"\n"d"\n', '"e"\n']
+        )
+
+    def test_error_status_raises(self):
+        self.server.responses.append((503, 'Unavailable'))
+        sink = self._sink()
+        try:
+            sink.write(['a'])
+        except BulkRequestException as e:
+            self.assertEqual(e.status, 503)
+            self.assertEqual(e.body, 'Unavailable')
+        else:
+            self.fail('BulkRequestException not raised')
+
+    def test_rejected_items_are_passed_to_on_item_error(self):
+        rejected = {'index': {'status': 400, 'error': 'mapper_parsing'}}
+        self.server.responses.append((200, json.dumps({
+            'errors': True,
+            'items': [{'index': {'status': 201}}, rejected]
+        })))
+        sink = self._sink()
+        sink.on_item_error = MagicMock()
+
+        sink.write(['a', 'b'])
+
+        sink.on_item_error.assert_called_once_with('b', rejected)
+
+    def test_connection_error_raises(self):
+        self.url = 'http://127.0.0.1:1/_bulk'
+        sink = self._sink()
+        self.assertRaises(BulkRequestException, sink.write, ['a'])
@@ -1,10 +1,16 @@
+from multiprocessing import Process
 from random import choice
 from unittest import TestCase
 
+from mock import patch
 from psycopg2 import InterfaceError, DatabaseError, OperationalError
 
+from hermes.exceptions import (
+    BulkRequestException, ConnectionLostException, PayloadDecodeException
+)
 from hermes.strategies import (
-    AbstractErrorStrategy, CommonErrorStrategy, TERMINATE, BACKOFF
+    AbstractErrorStrategy, CircuitBreakerStrategy, CommonErrorStrategy,
+    TERMINATE, BACKOFF, CONTINUE
 )
 
 
@@ -26,6 +32,12 @@ class CommonErrorStrategyTestCase(TestCase):
 
         OperationalError(): (True, TERMINATE),
 
+        PayloadDecodeException('{', ValueError()): (True, CONTINUE),
+
+        ConnectionLostException(OperationalError()): (True, BACKOFF),
+
+        BulkRequestException('Service Unavailable', 503): (True, BACKOFF),
+
         Exception(): (False, TERMINATE)
     }
 
@@ -36,3 +48,167 @@ class CommonErrorStrategyTestCase(TestCase):
         for exception, value in self.exception_to_vaue_dict.iteritems():
             return_value = self.strat.handle_exception(exception)
             self.assertEqual(return_value, value)
+
+
+class SerializationFailure(OperationalError):
+    pgcode = '40001'
+
+
+class AdminShutdown(OperationalError):
+    pgcode = '57P01'
+
+
+class UniqueViolation(DatabaseError):
+    pgcode = '23505'
+
+
+class SqlStateClassificationTestCase(TestCase):
+    def setUp(self):
+        self.strat = CommonErrorStrategy()
+
+    def test_transaction_rollback_is_retried(self):
+        self.assertEqual(self.strat.handle_exception(SerializationFailure()),
+                         (True, CONTINUE))
+
+    def test_specific_code_is_backed_off(self):
+        self.assertEqual(self.strat.handle_exception(AdminShutdown()),
+                         (True, BACKOFF))
+
+    def test_unknown_sqlstate_terminates(self):
+        self.assertEqual(self.strat.handle_exception(UniqueViolation()),
+                         (True, TERMINATE))
+
+    def test_terminated_abnormally_is_backed_off(self):
+        error = OperationalError(
+            'server closed the connection unexpectedly\n\tThis probably '
+            'means the server terminated abnormally'
+        )
+        self.assertEqual(self.strat.handle_exception(error), (True, BACKOFF))
+
+    def test_mapping_is_configurable(self):
+        class ReindexRequired(Exception):
+            pass
+
+        strat = CommonErrorStrategy(
+            exception_actions=[(ReindexRequired, BACKOFF)],
+            sqlstate_actions={'23505': CONTINUE, '40': BACKOFF}
+        )
+        self.assertEqual(strat.handle_exception(ReindexRequired()),
+                         (True, BACKOFF))
+        self.assertEqual(strat.handle_exception(UniqueViolation()),
+                         (True, CONTINUE))
+        self.assertEqual(strat.handle_exception(SerializationFailure()),
+                         (True, BACKOFF))
+
+    def test_decisions_are_cached_per_type_and_sqlstate(self):
+        self.strat.handle_exception(SerializationFailure())
+        self.strat.handle_exception(SerializationFailure())
+        self.strat.handle_exception(KeyError())
+        self.assertEqual(
+            self.strat._decisions,
+            {(SerializationFailure, '40001'): (True, CONTINUE),
+             (KeyError, None): (False, TERMINATE)}
+        )
+
+
+class CircuitBreakerStrategyTestCase(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreakerStrategy(failure_threshold=3, window=10,
+                                              reset_timeout=5)
+        self.error = ConnectionLostException(OperationalError())
+
+    def _fail(self, now):
+        with patch('hermes.strategies.time', return_value=now):
+            return self.breaker.handle_exception(self.error)
+
+    def _pause_time(self, now):
+        with patch('hermes.strategies.time', return_value=now):
+            return self.breaker.pause_time()
+
+    def test_backs_off_below_threshold(self):
+        self.assertEqual(self._fail(100), (True, BACKOFF))
+        self.assertEqual(self._fail(101), (True, BACKOFF))
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.CLOSED)
+        self.assertEqual(self._pause_time(101), 0)
+
+    def test_opens_at_threshold_and_pauses(self):
+        for now in (100, 101, 102):
+            decision = self._fail(now)
+
+        self.assertEqual(decision, (True, CONTINUE))
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.OPEN)
+        self.assertEqual(self._pause_time(103), 4)
+        self.assertEqual(self.breaker.stats['opens'], 1)
+
+    def test_failures_slide_out_of_window(self):
+        self._fail(100)
+        self._fail(101)
+        self.assertEqual(self._fail(115), (True, BACKOFF))
+        with patch('hermes.strategies.time', return_value=115):
+            self.assertEqual(self.breaker.stats['failures'], 1)
+
+    def test_half_open_lets_one_component_try(self):
+        for now in (100, 101, 102):
+            self._fail(now)
+
+        self.assertEqual(self._pause_time(107), 0)
+        self.assertEqual(self.breaker.state,
+                         CircuitBreakerStrategy.HALF_OPEN)
+        # The others wait for its outcome
+        self.assertEqual(self._pause_time(108), 4)
+
+    def test_success_closes(self):
+        for now in (100, 101, 102):
+            self._fail(now)
+        self._pause_time(107)
+
+        self.breaker.handle_success()
+
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.CLOSED)
+        self.assertEqual(self._fail(108), (True, BACKOFF))
+
+    def test_success_of_other_component_does_not_close(self):
+        for now in (100, 101, 102):
+            self._fail(now)
+        with patch('hermes.strategies.getpid', return_value=1):
+            self._pause_time(107)
+
+        with patch('hermes.strategies.getpid', return_value=2):
+            self.breaker.handle_success()
+
+        self.assertEqual(self.breaker.state,
+                         CircuitBreakerStrategy.HALF_OPEN)
+
+    def test_success_while_open_does_not_close(self):
+        for now in (100, 101, 102):
+            self._fail(now)
+
+        self.breaker.handle_success()
+
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.OPEN)
+
+    def test_failed_try_opens_again(self):
+        for now in (100, 101, 102):
+            self._fail(now)
+        self._pause_time(107)
+
+        self.assertEqual(self._fail(108), (True, CONTINUE))
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.OPEN)
+        self.assertEqual(self._pause_time(108), 5)
+
+    def test_other_errors_do_not_trip(self):
+        for _ in xrange(5):
+            self.assertEqual(self.breaker.handle_exception(KeyError()),
+                             (False, TERMINATE))
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.CLOSED)
+
+    def test_state_is_shared_across_processes(self):
+        def fail():
+            for _ in xrange(3):
+                self.breaker.handle_exception(self.error)
+
+        process = Process(target=fail)
+        process.start()
+        process.join()
+
+        self.assertEqual(self.breaker.state, CircuitBreakerStrategy.OPEN)
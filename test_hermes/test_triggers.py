@@ -0,0 +1,121 @@
+from __future__ import absolute_import
+from datetime import datetime
+from time import mktime
+from unittest import TestCase
+
+from hermes.exceptions import InvalidConfigurationException
+from hermes.triggers import (
+    AbstractTrigger, CronTrigger, DeadlineTrigger, FixedDelayTrigger,
+    FixedRateTrigger
+)
+
+
+def _timestamp(*args):
+    return mktime(datetime(*args).timetuple())
+
+
+class AbstractTriggerTestCase(TestCase):
+    def test_raises_not_implemented(self):
+        self.assertRaises(NotImplementedError,
+                          AbstractTrigger().next_due, None, 0)
+
+    def test_negative_jitter_raises(self):
+        self.assertRaises(InvalidConfigurationException,
+                          AbstractTrigger, -1)
+
+    def test_jitter_delays_fire_time(self):
+        trigger = AbstractTrigger(jitter=5)
+        for _ in xrange(20):
+            self.assertTrue(100 <= trigger.fire_time(100) <= 105)
+        self.assertEqual(AbstractTrigger().fire_time(100), 100)
+
+
+class FixedRateTriggerTestCase(TestCase):
+    def test_first_run_is_an_interval_away(self):
+        self.assertEqual(FixedRateTrigger(10).next_due(None, 100), 110)
+
+    def test_does_not_drift_with_run_time(self):
+        self.assertEqual(FixedRateTrigger(10).next_due(110, 113), 120)
+
+    def test_skips_missed_runs_keeping_phase(self):
+        self.assertEqual(FixedRateTrigger(10).next_due(110, 145), 150)
+        self.assertEqual(FixedRateTrigger(10).next_due(110, 150), 160)
+
+    def test_non_positive_interval_raises(self):
+        self.assertRaises(InvalidConfigurationException,
+                          FixedRateTrigger, -1)
+        self.assertRaises(InvalidConfigurationException,
+                          FixedRateTrigger, 0)
+
+
+class FixedDelayTriggerTestCase(TestCase):
+    def test_non_positive_delay_raises(self):
+        self.assertRaises(InvalidConfigurationException,
+                          FixedDelayTrigger, 0)
+
+    def test_runs_delay_after_finishing(self):
+        trigger = FixedDelayTrigger(10)
+        self.assertEqual(trigger.next_due(None, 100), 110)
+        self.assertEqual(trigger.next_due(110, 125), 135)
+
+
+class DeadlineTriggerTestCase(TestCase):
+    def test_asks_deadline_function(self):
+        trigger = DeadlineTrigger(lambda now: now + 5)
+        self.assertEqual(trigger.next_due(None, 100), 105)
+        self.assertEqual(trigger.next_due(105, 107), 112)
+
+
+class CronTriggerTestCase(TestCase):
+    def test_every_quarter_hour(self):
+        trigger = CronTrigger('*/15 * * * *')
+        self.assertEqual(
+            trigger.next_due(None, _timestamp(2015, 3, 24, 10, 7, 30)),
+            _timestamp(2015, 3, 24, 10, 15)
+        )
+
+    def test_never_fires_twice_in_the_same_minute(self):
+        trigger = CronTrigger('0 3 * * *')
+        self.assertEqual(
+            trigger.next_due(None, _timestamp(2015, 3, 24, 3, 0, 10)),
+            _timestamp(2015, 3, 25, 3, 0)
+        )
+
+    def test_rolls_over_the_year(self):
+        trigger = CronTrigger('30 1 1 1 *')
+        self.assertEqual(
+            trigger.next_due(None, _timestamp(2015, 3, 24)),
+            _timestamp(2016, 1, 1, 1, 30)
+        )
+
+    def test_day_of_week(self):
+        # 2015-03-24 is a Tuesday, both 0 and 7 mean Sunday
+        for expression in ('0 9 * * 0', '0 9 * * 7'):
+            self.assertEqual(
+                CronTrigger(expression).next_due(
+                    None, _timestamp(2015, 3, 24)
+                ),
+                _timestamp(2015, 3, 29, 9, 0)
+            )
+
+    def test_day_of_month_or_day_of_week(self):
+        trigger = CronTrigger('0 0 28 * 5')
+        self.assertEqual(
+            trigger.next_due(None, _timestamp(2015, 3, 24)),
+            _timestamp(2015, 3, 27)
+        )
+        self.assertEqual(
+            trigger.next_due(None, _timestamp(2015, 3, 27, 12)),
+            _timestamp(2015, 3, 28)
+        )
+
+    def test_invalid_expressions_raise(self):
+        for expression in ('* * * *', '60 * * * *', '* * * * mon',
+                           '*/0 * * * *', '5-1 * * * *'):
+            self.assertRaises(InvalidConfigurationException,
+                              CronTrigger, expression)
+
+    def test_impossible_date_raises(self):
+        trigger = CronTrigger('0 0 30 2 *')
+        self.assertRaises(InvalidConfigurationException,
+                          trigger.next_due, None, _timestamp(2015, 3, 24))